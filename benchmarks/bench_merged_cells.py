@@ -0,0 +1,107 @@
+"""
+合并单元格查询的基准测试：逐个遍历合并区域（原实现）与MergedCellIndex对比
+
+生成一个含大量2×2合并区域的工作表，在随机位置上分别执行两种查询：
+- 单元格是否位于合并区域内（标题查找在每一行都要判断）
+- 同一列向上最近的合并单元格（查找表格名称）
+并检查两种实现的结果一致
+
+用法（在仓库根目录）:
+    python benchmarks/bench_merged_cells.py --ranges 5000 --probes 300 --above-probes 5
+
+原实现每次判断都要遍历全部区域，向上查找还要逐行判断，在5000个区域上每次向上查找需要数秒，
+因此向上查找默认只取少量位置
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+
+from src.utils.sheet_index import MergedCellIndex
+
+
+def build_sheet(range_count, columns=50):
+    """
+    生成工作表：2×2合并区域按columns个一行排成网格，区域之间隔一行一列
+
+    Returns:
+        tuple: (工作表, 最大行号, 最大列号)
+    """
+    ws = Workbook().active
+    for i in range(range_count):
+        row, col = 1 + 3 * (i // columns), 1 + 3 * (i % columns)
+        ws.merge_cells(start_row=row, start_column=col, end_row=row + 1, end_column=col + 1)
+    rows = 3 * ((range_count + columns - 1) // columns)
+    return ws, rows, 3 * min(range_count, columns)
+
+
+def linear_find(ranges, row, col):
+    """原实现：逐个判断单元格是否在合并区域内"""
+    coordinate = f'{get_column_letter(col)}{row}'
+    for merged_range in ranges:
+        if coordinate in merged_range:
+            return merged_range.min_row, merged_range.min_col
+    return None
+
+
+def linear_nearest_above(ranges, row, col):
+    """原实现（_find_table_name）：逐行向上，每行都遍历全部合并区域"""
+    for r in range(row - 1, 0, -1):
+        anchor = linear_find(ranges, r, col)
+        if anchor is not None:
+            return (r,) + anchor
+    return None
+
+
+def timed(function, probes):
+    start = time.perf_counter()
+    results = [function(row, col) for row, col in probes]
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='合并单元格查询基准测试')
+    parser.add_argument('--ranges', type=int, default=5000, help='合并区域数 (默认: 5000)')
+    parser.add_argument('--probes', type=int, default=300, help='是否合并的查询位置数 (默认: 300)')
+    parser.add_argument('--above-probes', type=int, default=5, help='向上查找的查询位置数 (默认: 5)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    ws, max_row, max_col = build_sheet(args.ranges)
+    ranges = list(ws.merged_cells.ranges)
+    rng = random.Random(args.seed)
+    probes = [(rng.randint(1, max_row), rng.randint(1, max_col)) for _ in range(args.probes)]
+    above_probes = probes[:args.above_probes]
+    print(f'工作表: {len(ranges)} 个合并区域，{max_row} 行 × {max_col} 列')
+
+    start = time.perf_counter()
+    index = MergedCellIndex.from_worksheet(ws)
+    build_time = time.perf_counter() - start
+
+    old_find, old_found = timed(lambda row, col: linear_find(ranges, row, col), probes)
+    new_find, new_found = timed(index.find, probes)
+    old_above, old_nearest = timed(lambda row, col: linear_nearest_above(ranges, row, col), above_probes)
+    new_above, new_nearest = timed(index.nearest_above, above_probes)
+
+    assert old_found == new_found, '是否合并的查询结果不一致'
+    assert old_nearest == new_nearest, '向上最近合并单元格的查询结果不一致'
+
+    print(f'构建索引: {build_time * 1000:.1f} 毫秒')
+    print(f'{"查询":<12}{"位置数":>8}{"逐个遍历(秒)":>14}{"索引(秒)":>12}{"加速":>10}')
+    for label, count, old, new in (
+        ('是否合并', len(probes), old_find, new_find),
+        ('向上最近合并', len(above_probes), old_above, new_above),
+    ):
+        print(f'{label:<12}{count:>8}{old:>14.3f}{new:>12.4f}{old / max(new, 1e-9):>9.0f}x')
+    print('两种实现的查询结果一致')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+按工作表并行计算标题缓存的基准测试
+
+生成一个多工作表的模型（每个工作表有合并的表格名称、列标题、行标题、数值和公式），
+分别以不同的--workers计算标题缓存并计时，同时检查并行结果与串行结果完全一致：
+标题缓存（含单元格顺序）、输入单元格和输出单元格
+
+用法（在仓库根目录）:
+    python benchmarks/bench_parallel_headers.py --sheets 16 --rows 2000 --workers 1 2 4 8
+
+加速比取决于CPU核数：单核机器上并行只会多出进程池和传输的开销
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook
+from openpyxl.styles import PatternFill
+
+from src.extractors.formula_extractor import FormulaExtractor
+from src.loaders.workbook_loader import load_workbook_with_values
+
+
+def build_workbook(path, sheets, rows, columns):
+    """
+    生成多工作表模型，每个工作表是若干个带合并表头的表格
+
+    Args:
+        path (str): 保存路径
+        sheets (int): 工作表数
+        rows (int): 每个工作表的行数
+        columns (int): 每个表格的数值列数
+    """
+    yellow = PatternFill('solid', fgColor='FFFFFF00')
+    wb = Workbook()
+    wb.remove(wb.active)
+    for s in range(sheets):
+        ws = wb.create_sheet(f'表{s + 1}')
+        # 每50行一个表格：合并的表格名称、列标题，之后是行标题和数据
+        for top in range(1, rows + 1, 50):
+            ws.cell(top, 1, f'表格{top // 50 + 1}')
+            ws.merge_cells(start_row=top, start_column=1, end_row=top, end_column=columns + 1)
+            for c in range(columns):
+                ws.cell(top + 1, c + 2, f'{2020 + c}年')
+            for r in range(top + 2, min(top + 50, rows + 1)):
+                ws.cell(r, 1, f'项目{r}')
+                ws.cell(r, 2, r * 1.5).fill = yellow
+                for c in range(3, columns + 2):
+                    ws.cell(r, c, f'={ws.cell(r, c - 1).coordinate}*1.05')
+    output = wb.create_sheet('测算结果输出')
+    output['A1'], output['B1'] = '指标', '数值'
+    for s in range(sheets):
+        output.cell(s + 2, 1, f'表{s + 1}合计')
+        output.cell(s + 2, 2, f'=表{s + 1}!C3+表{s + 1}!D4')
+    wb.save(path)
+
+
+def extract(path, workers):
+    """
+    以给定进程数加载并提取，返回用时和用于比较的结果
+
+    Returns:
+        tuple: (提取用时：标题缓存和输入/输出单元格扫描, 可比较的结果)
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        loaded = load_workbook_with_values(path)
+        start = time.perf_counter()
+        extractor = FormulaExtractor(loaded.workbook, path, loaded.cached_values, workers=workers)
+        elapsed = time.perf_counter() - start
+    strip = lambda items: [{k: v for k, v in item.items() if k != 'cell'} for item in items]
+    result = (
+        [(sheet, list(cache.items())) for sheet, cache in extractor.header_cache.items()],
+        strip(extractor.input_cells),
+        strip(extractor.output_cells),
+    )
+    return elapsed, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='并行计算标题缓存的基准测试')
+    parser.add_argument('--sheets', type=int, default=16, help='工作表数 (默认: 16)')
+    parser.add_argument('--rows', type=int, default=2000, help='每个工作表的行数 (默认: 2000)')
+    parser.add_argument('--columns', type=int, default=6, help='每个表格的数值列数 (默认: 6)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help='要比较的进程数 (默认: 1 2 4)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'many_sheets.xlsx')
+        build_workbook(path, args.sheets, args.rows, args.columns)
+        counts = sorted(set(args.workers) | {1})
+        timings = {}
+        serial = None
+        for workers in counts:
+            timings[workers], result = extract(path, workers)
+            if serial is None:
+                serial = result
+            else:
+                assert result == serial, f'workers={workers}的结果与串行不一致'
+
+    cells = sum(len(cache) for _, cache in serial[0])
+    print(f'{args.sheets + 1} 个工作表，{cells} 个单元格，CPU核数 {os.cpu_count()}')
+    print(f'{"进程数":>6}{"用时(秒)":>12}{"加速":>8}')
+    for workers in counts:
+        print(f'{workers:>6}{timings[workers]:>12.3f}{timings[1] / timings[workers]:>7.2f}x')
+    print('并行结果与串行一致（标题缓存、输入单元格、输出单元格）')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+依赖追踪的基准测试：大量输出单元格共享同一段公式链
+
+生成一个模型：计算表中有一段逐行递推的折现系数链，每个输出单元格都引用链的末端，
+因此各输出单元格的依赖树大部分相同。逐个追踪全部输出单元格并计时。
+
+当前代码在首次追踪时构建工作簿级依赖图，之后所有输出单元格共用；要与之前逐个输出单元格
+重新解析公式的实现对比，在另一个目录检出引入依赖图之前的提交，用--repo指向它：
+
+    git worktree add /tmp/before-graph 43b4331^
+    git worktree add /tmp/with-graph 43b4331
+    python benchmarks/bench_shared_subtrees.py --repo /tmp/before-graph
+    python benchmarks/bench_shared_subtrees.py --repo /tmp/with-graph
+    python benchmarks/bench_shared_subtrees.py
+
+前两次运行打印的合并公式摘要相同，说明引入依赖图前后追踪的结果一致；
+之后的提交改变了合并公式的写法（如去掉绝对引用的$），当前代码的摘要与它们不同
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def build_workbook(path, outputs, chain):
+    """
+    生成共享公式链的模型
+
+    Args:
+        path (str): 保存路径
+        outputs (int): 输出单元格数
+        chain (int): 折现系数链的长度
+    """
+    from openpyxl import Workbook
+    from openpyxl.styles import PatternFill
+
+    yellow = PatternFill('solid', fgColor='FFFFFF00')
+    wb = Workbook()
+    params = wb.active
+    params.title = '参数'
+    params['A1'], params['B1'] = '项目', '数值'
+    for row, (name, value) in enumerate([('折现率', 0.08), ('年现金流', 1000)], start=2):
+        params.cell(row, 1, name)
+        params.cell(row, 2, value).fill = yellow
+
+    calc = wb.create_sheet('计算')
+    calc['A1'], calc['B1'], calc['C1'] = '年份', '折现系数', '现值'
+    for i in range(chain):
+        row = i + 2
+        calc.cell(row, 1, f'第{i + 1}年')
+        previous = '1' if i == 0 else f'B{row - 1}'
+        calc.cell(row, 2, f'={previous}/(1+参数!$B$2)')
+        calc.cell(row, 3, f'=参数!$B$3*B{row}')
+
+    output = wb.create_sheet('测算结果输出')
+    output['A1'], output['B1'] = '指标', '数值'
+    last = chain + 1
+    for k in range(outputs):
+        row = k + 2
+        output.cell(row, 1, f'情景{k + 1}')
+        output.cell(row, 2, f'=计算!C{last}*{k + 1}+计算!B{2 + k % chain}')
+    wb.save(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='共享公式链的依赖追踪基准测试')
+    parser.add_argument('--outputs', type=int, default=200, help='输出单元格数 (默认: 200)')
+    parser.add_argument('--chain', type=int, default=40, help='折现系数链的长度 (默认: 40)')
+    parser.add_argument('--repo', default=ROOT, help='被测代码所在的仓库目录 (默认: 当前仓库)')
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.abspath(args.repo))
+    from src.extractors.formula_extractor import FormulaExtractor
+    from src.loaders.workbook_loader import load_workbook_with_values
+    # 较早的版本在追踪时直接写出公式树页面，计时只比较追踪本身，也不在当前目录留下文件
+    FormulaExtractor.visualize_interactive_formula_tree = lambda self, root_node, output_path: None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'shared_chain.xlsx')
+        build_workbook(path, args.outputs, args.chain)
+        # 提取过程逐个工作表、逐个节点打印进度，计时期间不输出
+        with contextlib.redirect_stdout(io.StringIO()):
+            loaded = load_workbook_with_values(path)
+            extractor = FormulaExtractor(loaded.workbook, path, loaded.cached_values)
+            cells = [item['cell'] for item in extractor.output_cells]
+
+            start = time.perf_counter()
+            graph_time = 0.0
+            if hasattr(extractor, '_get_dependency_graph'):
+                extractor._get_dependency_graph()
+                graph_time = time.perf_counter() - start
+            digest = hashlib.sha256()
+            node_count = 0
+            for cell in cells:
+                _, new_formula, tree, _ = extractor._trace_formula_dependencies(
+                    cell.parent, cell.value, cell, cell.row, cell.column
+                )
+                node_count += len(tree)
+                digest.update(f'{cell.coordinate}={new_formula}\n'.encode('utf-8'))
+            total = time.perf_counter() - start
+
+    print(f'代码目录: {os.path.abspath(args.repo)}')
+    print(f'{len(cells)} 个输出单元格，公式链长度 {args.chain}，依赖树共 {node_count} 个节点')
+    if graph_time:
+        print(f'追踪用时: {total:.3f} 秒（其中构建依赖图 {graph_time:.3f} 秒）')
+    else:
+        print(f'追踪用时: {total:.3f} 秒')
+    print(f'合并公式摘要: {digest.hexdigest()[:16]}')
+
+
+if __name__ == '__main__':
+    main()
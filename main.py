@@ -1,6 +1,5 @@
 """Excel公式分析主程序"""
 
-import pandas as pd
 from openpyxl import load_workbook
 from openpyxl.utils import get_column_letter
 from src.extractors.formula_extractor import FormulaExtractor
@@ -10,7 +9,22 @@ import os
 import argparse
 import traceback
 from openpyxl import load_workbook
-from src.extractors.formula_extractor import FormulaExtractor
+from src.extractors.formula_extractor import FormulaExtractor, formula_to_json
+from src.loaders.workbook_loader import load_workbook_with_values
+from src.extractors.streaming_extractor import StreamingExtractor
+from src.cache.analysis_cache import AnalysisCache
+from src.analyzers.dependency_graph import annotate_range_sizes
+from src.analyzers.batch_engine import BatchEngine
+from src.analyzers.sensitivity import compute_sensitivity
+from src.analyzers.goal_seek import goal_seek
+from src.analyzers.excel_functions import ExcelError
+from src.server.analysis_server import AnalysisServer
+from src.server.analysis_snapshot import AnalysisSnapshot
+from src.utils.header_index import HeaderIndex
+from src.extractors.tree_bundle import FormulaTreeBundle, open_in_browser, write_formula_tree_bundle
+import json
+import time
+import asyncio
 
 
 def save_input_cells_to_text(input_cells, output_file='input_cells.txt'):
@@ -90,38 +104,528 @@ def save_output_cells_to_text(output_cells, output_file='output_cells.txt'):
     print(f"\n找到 {len(output_cells)} 个输出单元格")
     print(f"输出单元格信息已保存到: {output_file}")
 
-def process_excel_formulas(input_file, output_file):
+def show_range_size(formula_info):
+    """
+    在一个分析结果的合并公式的区域引用后标注单元格数量
+    
+    Args:
+        formula_info (dict): 公式依赖分析结果
+        
+    Returns:
+        dict: 标注后的分析结果
+    """
+    return dict(formula_info, 合并公式=annotate_range_sizes(formula_info['合并公式']))
+
+def show_range_sizes(formulas):
+    """
+    在合并公式的区域引用后标注单元格数量
+    
+    Args:
+        formulas (list): 公式依赖分析结果
+        
+    Returns:
+        list: 标注后的分析结果
+    """
+    return [show_range_size(item) for item in formulas]
+
+def load_formula_extractor(input_file, analysis_cache=None, workers=1):
+    """
+    加载工作簿并提取公式，同时保存输入/输出单元格信息
+    
+    Args:
+        input_file (str): 输入Excel文件路径
+        analysis_cache: 可选的AnalysisCache
+        workers (int): 计算标题缓存、追踪依赖和生成公式树页面的进程数
+        
+    Returns:
+        FormulaExtractor: 公式提取器
+    """
+    # 加载工作簿，一次解析同时得到公式和缓存的计算结果
+    print('正在加载Excel文件...')
+    loaded = load_workbook_with_values(input_file)
+    
+    # 提取公式
+    print('正在提取公式...')
+    formula_extractor = FormulaExtractor(
+        loaded.workbook, input_file, loaded.cached_values, analysis_cache, workers=workers
+    )
+    
+    # 保存输入单元格信息到文本文件
+    save_input_cells_to_text(formula_extractor.input_cells)
+    
+    # 保存输出单元格信息到文本文件
+    save_output_cells_to_text(formula_extractor.output_cells)
+    return formula_extractor
+
+def load_cached_run(analysis_cache):
+    """
+    文件未变化时读取上次运行的结果，并保存输入/输出单元格信息
+    
+    Args:
+        analysis_cache: AnalysisCache，为None时不读取
+        
+    Returns:
+        dict: load_run的返回值，无可用结果时返回None
+    """
+    if analysis_cache is None:
+        return None
+    run = analysis_cache.load_run()
+    if run is not None:
+        print(f'工作簿未变化，使用缓存的分析结果: {analysis_cache.cache_path}')
+        save_input_cells_to_text(run['input_cells'])
+        save_output_cells_to_text(run['output_cells'])
+    return run
+
+def process_excel_formulas(input_file, output_file, use_cache=True, range_size=False, workers=1,
+                           tree_bundle=None, open_browser=False):
     """
     处理Excel文件中的公式
     
     Args:
         input_file (str): 输入Excel文件路径
         output_file (str): 输出Excel文件路径
+        use_cache (bool): 是否使用分析缓存
+        range_size (bool): 是否在合并公式的区域后标注单元格数量
+        workers (int): 计算标题缓存、追踪依赖和生成公式树页面的进程数
+        tree_bundle (str): 可选，公式树页面包目录。给出时所有公式树写入一个页面包，
+                           不再逐个生成页面和打开浏览器
+        open_browser (bool): 是否在浏览器中打开页面包的索引页
     """
+    analysis_cache = None
     try:
-        # 加载工作簿
-        print('正在加载Excel文件...')
-        workbook = load_workbook(input_file, data_only=False)
+        analysis_cache = AnalysisCache(input_file) if use_cache else None
         
-        # 提取公式
-        print('正在提取公式...')
-        formula_extractor = FormulaExtractor(workbook, input_file)
+        # 文件未变化时直接使用上次的分析结果，无需加载工作簿
+        run = load_cached_run(analysis_cache)
+        if run is not None:
+            formulas = list(analysis_cache.iter_run_formulas(run))
+            if tree_bundle:
+                write_formula_tree_bundle(formulas, tree_bundle, open_browser=open_browser)
+            return show_range_sizes(formulas) if range_size else formulas
         
-        #if formulas:
-        if formula_extractor:
-            
-            # 保存输入单元格信息到文本文件
-            save_input_cells_to_text(formula_extractor.input_cells)
-            
-            # 保存输出单元格信息到文本文件
-            save_output_cells_to_text(formula_extractor.output_cells)
-            
-            
-            formula_extractor._analyze_formula_dependencies(formula_extractor.output_cells)
+        formula_extractor = load_formula_extractor(input_file, analysis_cache, workers)
+        formulas = formula_extractor._analyze_formula_dependencies(
+            formula_extractor.output_cells, render_trees=not tree_bundle
+        )
+        if tree_bundle:
+            formula_extractor.render_formula_tree_bundle(formulas, tree_bundle, open_browser=open_browser)
+        
+        if analysis_cache is not None:
+            analysis_cache.save_run(
+                formula_extractor.input_cells, formula_extractor.output_cells, formula_extractor.get_header_index()
+            )
+        return show_range_sizes(formulas) if range_size else formulas
             
+    except Exception as e:
+        print(f'处理过程出现错误: {str(e)}')
+        print('\n详细错误信息:')
+        print(traceback.format_exc())
+    finally:
+        if analysis_cache is not None:
+            analysis_cache.close()
+
+def iter_excel_formulas(input_file, use_cache=True, range_size=False, workers=1, render_trees=True):
+    """
+    逐个产出Excel文件中输出单元格的公式依赖分析结果
+    
+    每个输出单元格分析完成后立即产出，不在内存中保留全部结果，适合输出单元格很多的工作簿；
+    只有完整迭代结束后才保存分析缓存，中途停止时缓存保持上次运行的状态
+    
+    Args:
+        input_file (str): 输入Excel文件路径
+        use_cache (bool): 是否使用分析缓存
+        range_size (bool): 是否在合并公式的区域后标注单元格数量
+        workers (int): 计算标题缓存和追踪依赖的进程数
+        render_trees (bool): 是否为新追踪的输出单元格生成并打开公式树页面
+        
+    Yields:
+        dict: 按输出单元格顺序的分析结果
+    """
+    analysis_cache = AnalysisCache(input_file) if use_cache else None
+    try:
+        # 文件未变化时直接逐个读取上次的分析结果，无需加载工作簿
+        run = load_cached_run(analysis_cache)
+        if run is not None:
+            for formula_info in analysis_cache.iter_run_formulas(run):
+                yield show_range_size(formula_info) if range_size else formula_info
+            return
+        
+        formula_extractor = load_formula_extractor(input_file, analysis_cache, workers)
+        for formula_info in formula_extractor.iter_formula_dependencies(
+            formula_extractor.output_cells, render_trees=render_trees
+        ):
+            yield show_range_size(formula_info) if range_size else formula_info
+        
+        if analysis_cache is not None:
+            analysis_cache.save_run(
+                formula_extractor.input_cells, formula_extractor.output_cells, formula_extractor.get_header_index()
+            )
+    finally:
+        if analysis_cache is not None:
+            analysis_cache.close()
+
+def save_formulas_to_jsonl(formulas, output_file='formula_analysis.jsonl'):
+    """
+    逐条把分析结果写入JSON Lines文件，每行一个输出单元格
+    
+    Args:
+        formulas: 可迭代的分析结果，可以是iter_excel_formulas返回的生成器
+        output_file (str): 输出文件路径
+    """
+    count = 0
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for formula_info in formulas:
+            f.write(json.dumps(formula_to_json(formula_info), ensure_ascii=False, default=str) + '\n')
+            f.flush()
+            count += 1
+    print(f"\n共 {count} 个输出单元格的分析结果，已保存到: {output_file}")
+
+def iter_into_tree_bundle(formulas, bundle):
+    """
+    把经过的分析结果逐个加入公式树页面包，迭代结束后写出页面包
+    
+    Args:
+        formulas: 可迭代的分析结果
+        bundle (FormulaTreeBundle): 公式树页面包
+        
+    Yields:
+        dict: 原样产出的分析结果
+    """
+    for formula_info in formulas:
+        bundle.add(formula_info)
+        yield formula_info
+    bundle.write()
+
+def process_excel_formulas_to_jsonl(input_file, jsonl_file, use_cache=True, range_size=False, workers=1,
+                                    tree_bundle=None, open_browser=False):
+    """
+    以生成器方式处理Excel文件中的公式，分析结果逐条写入JSON Lines文件
+    
+    Args:
+        input_file (str): 输入Excel文件路径
+        jsonl_file (str): JSON Lines输出路径
+        use_cache (bool): 是否使用分析缓存
+        range_size (bool): 是否在合并公式的区域后标注单元格数量
+        workers (int): 计算标题缓存和追踪依赖的进程数
+        tree_bundle (str): 可选，公式树页面包目录，给出时不再逐个生成页面和打开浏览器
+        open_browser (bool): 是否在浏览器中打开页面包的索引页
+    """
+    try:
+        formulas = iter_excel_formulas(
+            input_file, use_cache=use_cache, range_size=range_size, workers=workers, render_trees=not tree_bundle
+        )
+        if tree_bundle:
+            bundle = FormulaTreeBundle(tree_bundle)
+            formulas = iter_into_tree_bundle(formulas, bundle)
+        save_formulas_to_jsonl(formulas, jsonl_file)
+        if tree_bundle and open_browser:
+            open_in_browser(bundle.index_path)
+    except Exception as e:
+        print(f'处理过程出现错误: {str(e)}')
+        print('\n详细错误信息:')
+        print(traceback.format_exc())
+    
+
+def parse_what_if(assignment):
+    """
+    解析命令行中的输入单元格赋值
+    
+    Args:
+        assignment (str): 如'Sheet1!B2=0.08'，值可以是数字、TRUE/FALSE或文本
+        
+    Returns:
+        tuple: (单元格名称, 值)
+    """
+    name, _, text = assignment.partition('=')
+    if not text:
+        raise ValueError(f'无效的赋值（应为 工作表!单元格=值）: {assignment}')
+    if text.upper() in ('TRUE', 'FALSE'):
+        return name.strip(), text.upper() == 'TRUE'
+    try:
+        return name.strip(), float(text)
+    except ValueError:
+        return name.strip(), text
+
+def process_excel_what_if(input_file, assignments, workers=1):
+    """
+    编译输出单元格的重算引擎，与缓存的计算结果核对后修改输入单元格并重算输出
+    
+    Args:
+        input_file (str): 输入Excel文件路径
+        assignments (list): 输入单元格赋值，如['Sheet1!B2=0.08']
+        workers (int): 计算标题缓存的进程数
+        
+    Returns:
+        dict: 值发生变化的输出单元格名称 -> (原值, 新值)
+    """
+    try:
+        changes = dict(parse_what_if(assignment) for assignment in assignments)
+        formula_extractor = load_formula_extractor(input_file, workers=workers)
+        engine = formula_extractor.get_recalc_engine()
+        
+        validation = engine.validate()
+        print(f"\n与缓存值核对：{validation['checked']} 个公式单元格，{validation['matched']} 个一致，"
+              f"{len(validation['mismatches'])} 个不一致，{validation['missing']} 个没有缓存值")
+        for name, expected, actual in validation['mismatches'][:20]:
+            print(f'  {name}: 缓存值 {expected!r}，重算值 {actual!r}')
+        
+        full_time = engine.recalculate()
+        before = engine.output_values()
+        change_time = engine.set_inputs(changes)
+        after = engine.output_values()
+        print(f'全部重算用时 {full_time * 1000:.2f} 毫秒，修改 {len(changes)} 个输入单元格后重算 '
+              f'{len(engine.affected_formulas(engine.input_slot(name) for name in changes))} 个公式用时 '
+              f'{change_time * 1000:.2f} 毫秒')
+        
+        changed = {name: (before[name], value) for name, value in after.items() if value != before[name]}
+        print(f'\n{len(changed)} 个输出单元格的值发生变化:')
+        for name, (old, new) in changed.items():
+            print(f'  {name}: {old!r} -> {new!r}')
+        return changed
+        
+    except Exception as e:
+        print(f'处理过程出现错误: {str(e)}')
+        print('\n详细错误信息:')
+        print(traceback.format_exc())
+
+def process_excel_scenarios(input_file, scenario_file, output_file='scenario_results.csv', workers=1):
+    """
+    按情景表批量计算输出单元格
+    
+    情景表为CSV文件，每列对应一个输入单元格（列名如'参数!B3'，与input_cells.txt中的位置一致），
+    每行是一个情景；结果表在情景表的列之后追加每个输出单元格一列，
+    逐情景计算的错误值写为错误代码，按数组计算时出错的情景为空
+    
+    Args:
+        input_file (str): 输入Excel文件路径
+        scenario_file (str): 情景表路径
+        output_file (str): 结果表路径
+        workers (int): 计算标题缓存的进程数
+        
+    Returns:
+        pandas.DataFrame: 结果表
+    """
+    # pandas只在情景计算时导入，不拖慢其他命令的启动
+    import pandas as pd
+
+    try:
+        scenarios = pd.read_csv(scenario_file)
+        print(f'读取情景表: {scenario_file}（{len(scenarios)} 个情景，{len(scenarios.columns)} 个输入单元格）')
+        formula_extractor = load_formula_extractor(input_file, workers=workers)
+        engine = formula_extractor.get_recalc_engine()
+        engine.recalculate()
+        
+        results, _ = BatchEngine(engine).run(
+            {name: scenarios[name].to_numpy(dtype=float) for name in scenarios.columns}
+        )
+        table = scenarios.copy()
+        for name, values in results.items():
+            table[name] = [str(value) if isinstance(value, ExcelError) else value for value in values]
+        table.to_csv(output_file, index=False, encoding='utf-8-sig')
+        print(f'情景计算结果已保存到: {output_file}')
+        return table
+        
+    except Exception as e:
+        print(f'处理过程出现错误: {str(e)}')
+        print('\n详细错误信息:')
+        print(traceback.format_exc())
+
+def process_excel_sensitivity(input_file, output_file='sensitivity.csv', workers=1, top=3):
+    """
+    计算全部输出单元格对输入单元格的敏感度，按影响大小排名后保存
+    
+    Args:
+        input_file (str): 输入Excel文件路径
+        output_file (str): 敏感度表路径，每行为一个输出单元格依赖的一个输入单元格
+        workers (int): 计算标题缓存的进程数
+        top (int): 每个输出单元格打印的输入单元格数
+        
+    Returns:
+        SensitivityMatrix: 敏感度矩阵
+    """
+    import pandas as pd
+
+    try:
+        formula_extractor = load_formula_extractor(input_file, workers=workers)
+        matrix = compute_sensitivity(formula_extractor.get_recalc_engine())
+        
+        pd.DataFrame(list(matrix.iter_rows())).to_csv(output_file, index=False, encoding='utf-8-sig')
+        for output in matrix.outputs:
+            ranked = matrix.ranked(output)[:top]
+            if ranked:
+                print(f'  {output}: ' + '，'.join(f'{name}（弹性 {elasticity:.3g}）' for name, _, elasticity in ranked))
+        print(f'敏感度表已保存到: {output_file}')
+        return matrix
+        
+    except Exception as e:
+        print(f'处理过程出现错误: {str(e)}')
+        print('\n详细错误信息:')
+        print(traceback.format_exc())
+
+def process_excel_goal_seek(input_file, goal, inputs, workers=1):
+    """
+    调整输入单元格使输出单元格达到目标值
+    
+    Args:
+        input_file (str): 输入Excel文件路径
+        goal (str): 目标，如'测算结果输出!B5=0.08'
+        inputs (list): 可调整的输入单元格，如['参数!B3']
+        workers (int): 计算标题缓存的进程数
+        
+    Returns:
+        dict: goal_seek的返回值
+    """
+    try:
+        output, target = parse_what_if(goal)
+        if isinstance(target, (bool, str)):
+            raise ValueError(f'目标值必须是数字: {goal}')
+        formula_extractor = load_formula_extractor(input_file, workers=workers)
+        engine = formula_extractor.get_recalc_engine()
+        engine.recalculate()
+        
+        result = goal_seek(engine, output, target, inputs)
+        print(f"\n{output} = {result['value']!r}" + ('' if result['converged'] else '（未达到目标值）'))
+        for name, value in result['inputs'].items():
+            print(f'  {name}: {engine.get_value(name)!r} -> {value!r}')
+        return result
+        
+    except Exception as e:
+        print(f'处理过程出现错误: {str(e)}')
+        print('\n详细错误信息:')
+        print(traceback.format_exc())
+
+def process_excel_search(input_file, query, limit=10, use_cache=True, workers=1):
+    """
+    按标题名称查找输入/输出单元格，打印按得分排列的候选单元格
+
+    文件未变化时直接使用上次运行保存的标题索引，无需加载工作簿
+
+    Args:
+        input_file (str): 输入Excel文件路径
+        query (str): 查询文本，如'营业收入 2025'
+        limit (int): 最多列出的单元格数
+        use_cache (bool): 是否使用分析缓存
+        workers (int): 计算标题缓存的进程数
+
+    Returns:
+        list: 候选单元格信息和得分
+    """
+    analysis_cache = None
+    try:
+        analysis_cache = AnalysisCache(input_file) if use_cache else None
+        run = load_cached_run(analysis_cache)
+        if run is not None:
+            # 旧版本保存的结果中没有标题索引，按保存的输入/输出单元格重新构建
+            header_index = run.get('header_index') or HeaderIndex.from_cells(run['input_cells'], run['output_cells'])
         else:
-            print('未找到任何公式')
-            
+            header_index = load_formula_extractor(input_file, workers=workers).get_header_index()
+        
+        start = time.perf_counter()
+        results = header_index.search(query, limit)
+        print(f'\n查找 "{query}"：{len(header_index)} 个单元格中找到 {len(results)} 个候选，'
+              f'用时 {(time.perf_counter() - start) * 1000:.3f} 毫秒')
+        for item in results:
+            print(f"  {item['得分']:.3f}  {item['工作表']}!{item['单元格']}  [{item['类型']}] "
+                  f"{item['表格名称'] or ''} / {item['标题组合']}  当前值: {item['当前值']}")
+        return results
+        
+    except Exception as e:
+        print(f'处理过程出现错误: {str(e)}')
+        print('\n详细错误信息:')
+        print(traceback.format_exc())
+    finally:
+        if analysis_cache is not None:
+            analysis_cache.close()
+
+def load_analysis_snapshot(input_file, use_cache=True, workers=1):
+    """
+    加载工作簿并分析全部输出单元格，冻结为不可变的快照
+
+    Args:
+        input_file (str): 输入Excel文件路径
+        use_cache (bool): 是否使用分析缓存，只重新分析变化影响的输出单元格
+        workers (int): 计算标题缓存和追踪依赖的进程数
+
+    Returns:
+        tuple: (AnalysisSnapshot, FormulaExtractor)，提取器用于追踪快照之外的单元格
+    """
+    analysis_cache = AnalysisCache(input_file) if use_cache else None
+    try:
+        formula_extractor = load_formula_extractor(input_file, analysis_cache, workers)
+        version = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(os.path.getmtime(input_file)))
+        snapshot = AnalysisSnapshot.from_extractor(
+            formula_extractor,
+            formula_extractor.iter_formula_dependencies(formula_extractor.output_cells, render_trees=False),
+            version
+        )
+        if analysis_cache is not None:
+            analysis_cache.save_run(
+                formula_extractor.input_cells, formula_extractor.output_cells, formula_extractor.get_header_index()
+            )
+            # 缓存在返回前关闭，之后追踪快照之外的单元格时不再读写缓存
+            formula_extractor.analysis_cache = None
+        return snapshot, formula_extractor
+    finally:
+        if analysis_cache is not None:
+            analysis_cache.close()
+
+def process_excel_serve(input_file, host='127.0.0.1', port=8765, socket_path=None, use_cache=True, workers=1):
+    """
+    加载工作簿后启动常驻的本地分析服务，直到按Ctrl+C停止
+
+    工作簿文件更新后，请求/reload重新加载，加载完成前其他请求继续使用当前的分析结果
+
+    工作簿在线程池中加载，此时进程中已有事件循环和其他线程在运行，fork出的子进程
+    只复制当前线程，可能继承其他线程持有的锁而死锁，因此服务始终以单进程加载
+
+    Args:
+        input_file (str): 输入Excel文件路径
+        host (str): 监听地址
+        port (int): 监听端口
+        socket_path (str): 可选，改为监听Unix套接字
+        use_cache (bool): 是否使用分析缓存
+        workers (int): 命令行给出的进程数，大于1时提示并改为1
+    """
+    if workers > 1:
+        print('分析服务在线程中加载工作簿，不能创建子进程，--workers改为1')
+    try:
+        server = AnalysisServer(lambda: load_analysis_snapshot(input_file, use_cache, workers=1))
+        asyncio.run(server.serve(host, port, socket_path))
+
+    except KeyboardInterrupt:
+        print('\n分析服务已停止')
+    except Exception as e:
+        print(f'处理过程出现错误: {str(e)}')
+        print('\n详细错误信息:')
+        print(traceback.format_exc())
+
+def process_excel_streaming(input_file, header_file='header_cache.jsonl'):
+    """
+    以流式模式处理超大Excel文件，内存占用与行数无关
+    
+    只计算标题缓存和输入/输出单元格，不追踪公式依赖（依赖追踪需要随机访问单元格）
+    
+    Args:
+        input_file (str): 输入Excel文件路径
+        header_file (str): 标题缓存输出路径，每行一个JSON对象
+    """
+    try:
+        print('正在以流式模式加载Excel文件...')
+        extractor = StreamingExtractor(input_file)
+        
+        count = 0
+        with open(header_file, 'w', encoding='utf-8') as f:
+            for sheet_name, cell_key, entry in extractor.iter_header_cache():
+                record = {'工作表': sheet_name, '单元格': cell_key, **entry}
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+                count += 1
+        extractor.close()
+        print(f"\n标题缓存共 {count} 个单元格，已保存到: {header_file}")
+        
+        # 保存输入/输出单元格信息到文本文件
+        save_input_cells_to_text(extractor.input_cells)
+        save_output_cells_to_text(extractor.output_cells)
+        
     except Exception as e:
         print(f'处理过程出现错误: {str(e)}')
         print('\n详细错误信息:')
@@ -140,6 +644,42 @@ def main():
     parser.add_argument('--output', '-o', 
                        default='formula_analysis_result.xlsx',
                        help='输出Excel文件路径 (默认: formula_analysis_result.xlsx)')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='不使用分析缓存（保存在当前用户的缓存目录中）')
+    parser.add_argument('--streaming', action='store_true',
+                        help='流式模式：以有限内存处理超大工作表，只输出标题缓存和输入/输出单元格')
+    parser.add_argument('--range-size', action='store_true',
+                        help='在合并公式的区域引用后标注单元格数量，如SUM(Sheet1!A1:A100[100])')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='并行进程数：按工作表计算标题缓存，按输出单元格追踪依赖和生成公式树页面 (默认: 1)')
+    parser.add_argument('--tree-bundle', metavar='DIR',
+                        help='把所有公式树写入一个目录（索引页+共享节点表），不逐个生成页面、不打开浏览器')
+    parser.add_argument('--open-browser', action='store_true',
+                        help='生成公式树页面包后在浏览器中打开索引页')
+    parser.add_argument('--jsonl', metavar='PATH',
+                        help='逐条输出分析结果到JSON Lines文件，每个输出单元格分析完成后立即写入')
+    parser.add_argument('--what-if', metavar='CELL=VALUE', action='append',
+                        help='修改输入单元格后重算全部输出单元格并列出变化，如--what-if Sheet1!B2=0.08，可重复')
+    parser.add_argument('--scenarios', metavar='CSV',
+                        help='情景表（每列一个输入单元格，如参数!B3；每行一个情景），批量计算全部输出单元格')
+    parser.add_argument('--scenario-output', metavar='CSV', default='scenario_results.csv',
+                        help='情景计算结果的保存路径 (默认: scenario_results.csv)')
+    parser.add_argument('--goal-seek', metavar='CELL=TARGET',
+                        help='单变量求解：调整--by指定的输入单元格使输出单元格达到目标值，如--goal-seek 测算结果输出!B6=0.08')
+    parser.add_argument('--by', metavar='CELL', action='append',
+                        help='单变量求解时可调整的输入单元格，可重复')
+    parser.add_argument('--sensitivity', metavar='CSV', nargs='?', const='sensitivity.csv',
+                        help='计算每个输出单元格对各输入单元格的偏导数和弹性，按影响大小排名保存 (默认: sensitivity.csv)')
+    parser.add_argument('--search', metavar='QUERY',
+                        help='按标题名称查找输入/输出单元格，如--search "营业收入 2025"')
+    parser.add_argument('--limit', type=int, default=10,
+                        help='--search最多列出的单元格数 (默认: 10)')
+    parser.add_argument('--serve', metavar='PORT', type=int, nargs='?', const=8765,
+                        help='加载工作簿后作为本地分析服务常驻，按HTTP请求追踪和解释单元格 (默认端口: 8765)')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='分析服务的监听地址 (默认: 127.0.0.1)')
+    parser.add_argument('--socket', metavar='PATH',
+                        help='分析服务改为监听Unix套接字')
     
     # 解析命令行参数
     args = parser.parse_args()
@@ -152,7 +692,37 @@ def main():
     
     try:
         # 处理Excel公式
-        process_excel_formulas(args.input_file, args.output)
+        if args.streaming:
+            process_excel_streaming(args.input_file)
+        elif args.search:
+            process_excel_search(
+                args.input_file, args.search, args.limit, use_cache=not args.no_cache, workers=args.workers
+            )
+        elif args.serve is not None or args.socket:
+            process_excel_serve(
+                args.input_file, args.host, args.serve or 8765, socket_path=args.socket,
+                use_cache=not args.no_cache, workers=args.workers
+            )
+        elif args.goal_seek:
+            if not args.by:
+                parser.error('--goal-seek需要至少一个--by输入单元格')
+            process_excel_goal_seek(args.input_file, args.goal_seek, args.by, workers=args.workers)
+        elif args.sensitivity:
+            process_excel_sensitivity(args.input_file, args.sensitivity, workers=args.workers)
+        elif args.scenarios:
+            process_excel_scenarios(args.input_file, args.scenarios, args.scenario_output, workers=args.workers)
+        elif args.what_if:
+            process_excel_what_if(args.input_file, args.what_if, workers=args.workers)
+        elif args.jsonl:
+            process_excel_formulas_to_jsonl(
+                args.input_file, args.jsonl, use_cache=not args.no_cache, range_size=args.range_size,
+                workers=args.workers, tree_bundle=args.tree_bundle, open_browser=args.open_browser
+            )
+        else:
+            process_excel_formulas(
+                args.input_file, args.output, use_cache=not args.no_cache, range_size=args.range_size,
+                workers=args.workers, tree_bundle=args.tree_bundle, open_browser=args.open_browser
+            )
     except Exception as e:
         print(f'程序执行出错: {str(e)}')
         print('\n详细错误信息:')
@@ -0,0 +1,201 @@
+"""工作簿级公式依赖图，所有输出单元格共享同一份解析结果"""
+
+from array import array
+
+from openpyxl.utils import get_column_letter
+
+from ..parsers.formula_parser import FormulaParser, render
+
+# 引用边的类型，与FormulaExtractor._classify_cell_reference的结果一一对应
+EDGE_INPUT = 0  # 黄色输入单元格，不再展开
+EDGE_FORMULA = 1  # 公式单元格，需要继续展开
+EDGE_BASIC = 2  # 普通数值单元格，只记入基础单元格
+EDGE_INVALID_SHEET = 3  # 引用了不存在的工作表
+EDGE_INVALID_CELL = 4  # 引用超出工作表范围
+EDGE_ERROR = 5  # 处理引用时出错
+EDGE_RANGE = 6  # 单元格区域，作为一个节点展开其中的公式和输入单元格
+
+
+def annotate_range_sizes(formula, formula_parser=None):
+    """
+    在公式中的区域引用后标注单元格数量，如'SUM(Sheet1!A1:A100)'变为'SUM(Sheet1!A1:A100[100])'
+
+    Args:
+        formula (str): 合并公式，不含等号
+        formula_parser: 可选的FormulaParser，用于复用解析缓存
+
+    Returns:
+        str: 标注后的公式
+    """
+    def annotate(ref):
+        min_col, min_row, max_col, max_row = ref.bounds
+        if not ref.is_range or None in ref.bounds:
+            return ref.text
+        return f"{ref.text}[{(max_row - min_row + 1) * (max_col - min_col + 1)}]"
+
+    parsed = (formula_parser or FormulaParser()).parse(formula)
+    if parsed.error:
+        return formula
+    return render(parsed.items, annotate)
+
+
+class DependencyGraph:
+    def __init__(self):
+        """
+        初始化依赖图
+
+        单元格名称（如'Sheet1!A1'）统一映射为整数编号；每个公式单元格的引用边
+        以CSR形式存放在紧凑数组中：第i个公式单元格的边为
+        kinds/targets/labels[indptr[i]:indptr[i+1]]
+        """
+        self.names = []  # 编号 -> 名称
+        self.ids = {}  # 名称 -> 编号
+        self.locations = []  # 编号 -> (工作表名, 行号, 列号)，非单元格名称为None
+        self.formula_rows = {}  # 公式单元格编号 -> CSR行号
+        self.decomposed = []  # CSR行号 -> 分解后的公式
+        self.failures = {}  # 公式单元格编号 -> 分解公式时的异常
+        self.ranges = {}  # 区域编号 -> (工作表名, 起始行, 起始列, 结束行, 结束列)
+        self.error_messages = {}  # 边序号 -> 出错信息
+        self.indptr = array('l', [0])
+        self.kinds = array('b')
+        self.targets = array('l')  # 引用的单元格编号（无效引用为原始引用文本的编号）
+        self.labels = array('l')  # 基础单元格使用的引用文本编号
+        self.stale_edges = 0  # 已移除的单元格仍留在数组中的引用边数量
+
+    def intern(self, name, location=None):
+        """
+        获取名称对应的整数编号，不存在时分配新编号
+
+        Args:
+            name (str): 单元格名称或引用文本
+            location (tuple): 可选的(工作表名, 行号, 列号)
+
+        Returns:
+            int: 编号
+        """
+        node_id = self.ids.get(name)
+        if node_id is None:
+            node_id = len(self.names)
+            self.ids[name] = node_id
+            self.names.append(name)
+            self.locations.append(location)
+        elif location is not None and self.locations[node_id] is None:
+            self.locations[node_id] = location
+        return node_id
+
+    def add_formula_cell(self, cell_id, decomposed, edges, error_messages=None):
+        """
+        添加一个公式单元格及其全部引用边
+
+        Args:
+            cell_id (int): 公式单元格编号
+            decomposed (str): 分解后的公式
+            edges (list): [(边类型, 目标编号, 引用文本编号), ...]，按引用在公式中出现的顺序
+            error_messages (dict): 可选，边在edges中的位置 -> 出错信息
+        """
+        self.formula_rows[cell_id] = len(self.decomposed)
+        self.decomposed.append(decomposed)
+        start = len(self.kinds)
+        for kind, target, label in edges:
+            self.kinds.append(kind)
+            self.targets.append(target)
+            self.labels.append(label)
+        for position, message in (error_messages or {}).items():
+            self.error_messages[start + position] = message
+        self.indptr.append(len(self.kinds))
+
+    def add_range(self, range_id, bounds, edges):
+        """
+        添加一个单元格区域，区域只记录其中的公式单元格和输入单元格，其余成员按需枚举
+
+        Args:
+            range_id (int): 区域编号
+            bounds (tuple): (工作表名, 起始行, 起始列, 结束行, 结束列)
+            edges (list): 区域内公式单元格和输入单元格的引用边，按行优先顺序
+        """
+        self.ranges[range_id] = bounds
+        self.add_formula_cell(range_id, None, edges)
+
+    def range_size(self, range_id):
+        """
+        获取区域包含的单元格数量
+
+        Args:
+            range_id (int): 区域编号
+
+        Returns:
+            int: 单元格数量
+        """
+        _, min_row, min_col, max_row, max_col = self.ranges[range_id]
+        return (max_row - min_row + 1) * (max_col - min_col + 1)
+
+    def iter_range_members(self, range_id):
+        """
+        按行优先顺序枚举区域中的全部单元格名称
+
+        Args:
+            range_id (int): 区域编号
+
+        Yields:
+            str: 单元格名称，如'Sheet1!A1'
+        """
+        sheet_name, min_row, min_col, max_row, max_col = self.ranges[range_id]
+        letters = [get_column_letter(col) for col in range(min_col, max_col + 1)]
+        for row in range(min_row, max_row + 1):
+            for letter in letters:
+                yield f"{sheet_name}!{letter}{row}"
+
+    def discard(self, cell_id):
+        """
+        移除公式单元格或区域，之后可以重新添加
+
+        原有的引用边仍留在数组中但不再可达，计入stale_edges
+
+        Args:
+            cell_id (int): 公式单元格或区域编号
+        """
+        row = self.formula_rows.pop(cell_id, None)
+        if row is not None:
+            self.stale_edges += self.indptr[row + 1] - self.indptr[row]
+            self.decomposed[row] = None
+        self.failures.pop(cell_id, None)
+        self.ranges.pop(cell_id, None)
+
+    def add_failed_cell(self, cell_id, error):
+        """记录分解公式失败的单元格，追踪到该单元格时重新抛出异常"""
+        self.failures[cell_id] = error
+
+    def get_decomposed(self, cell_id):
+        """
+        获取公式单元格分解后的公式
+
+        Args:
+            cell_id (int): 公式单元格编号
+
+        Returns:
+            str: 分解后的公式
+        """
+        if cell_id in self.failures:
+            raise self.failures[cell_id]
+        return self.decomposed[self.formula_rows[cell_id]]
+
+    def iter_edges(self, cell_id):
+        """
+        按公式中的出现顺序遍历公式单元格的引用边
+
+        Args:
+            cell_id (int): 公式单元格编号
+
+        Yields:
+            tuple: (边序号, 边类型, 目标编号, 引用文本编号)
+        """
+        row = self.formula_rows[cell_id]
+        for edge in range(self.indptr[row], self.indptr[row + 1]):
+            yield edge, self.kinds[edge], self.targets[edge], self.labels[edge]
+
+    def __contains__(self, cell_id):
+        return cell_id in self.formula_rows or cell_id in self.failures
+
+    @property
+    def edge_count(self):
+        return len(self.kinds)
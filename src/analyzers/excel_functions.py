@@ -0,0 +1,494 @@
+"""重算引擎使用的Excel值规则和工作表函数实现"""
+
+import math
+from datetime import date, datetime, time
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP, ROUND_UP
+
+from openpyxl.utils.datetime import to_excel
+
+
+class ExcelError(Exception):
+    def __init__(self, code):
+        """
+        Excel错误值，既作为单元格的值保存，也作为异常在公式中传播
+
+        Args:
+            code (str): 错误代码，如'#DIV/0!'
+        """
+        super().__init__(code)
+        self.code = code
+
+    def __eq__(self, other):
+        return isinstance(other, ExcelError) and other.code == self.code
+
+    def __hash__(self):
+        return hash(self.code)
+
+    def __str__(self):
+        return self.code
+
+    def __repr__(self):
+        return f"ExcelError({self.code!r})"
+
+
+ERRORS = {code: ExcelError(code) for code in ('#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!', '#N/A')}
+DIV0 = ERRORS['#DIV/0!']
+VALUE = ERRORS['#VALUE!']
+REF = ERRORS['#REF!']
+NUM = ERRORS['#NUM!']
+
+
+class UnsupportedFormula(Exception):
+    """公式中包含重算引擎不支持的函数、名称或运算符"""
+
+
+class RangeValue(tuple):
+    """区域引用的值，按行主序展开的单元格值；函数参数中单独的单元格引用也按一个单元格的区域传入"""
+
+    __slots__ = ()
+
+
+def to_cell_value(value):
+    """
+    把外部给出的值（如numpy数值）规范为单元格中保存的类型，区域中只有int和float按数值处理
+
+    Args:
+        value: 数值、逻辑值、文本或None
+
+    Returns:
+        规范后的值
+    """
+    if isinstance(value, bool) or value is None or isinstance(value, (str, ExcelError)):
+        return value
+    if isinstance(value, int) and type(value) is not int:
+        return int(value)
+    if isinstance(value, float) and type(value) is not float:
+        return float(value)
+    if hasattr(value, 'item'):
+        # numpy标量
+        return to_cell_value(value.item())
+    return value
+
+
+def to_number(value):
+    """
+    按Excel的规则把值转换为数值：空值为0，逻辑值为0/1，数字文本转换为数值
+
+    Raises:
+        ExcelError: 值本身是错误值，或无法转换（#VALUE!）
+    """
+    value_type = type(value)
+    if value_type is float or value_type is int:
+        return value
+    if value is None:
+        return 0
+    if value_type is bool:
+        return int(value)
+    if value_type is RangeValue:
+        if len(value) == 1:
+            return to_number(value[0])
+        raise VALUE
+    if isinstance(value, ExcelError):
+        raise value
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            raise VALUE
+    if isinstance(value, (datetime, date, time)):
+        return to_excel(value)
+    if isinstance(value, (int, float)):
+        return value
+    raise VALUE
+
+
+def to_text(value):
+    """按Excel的规则把值转换为文本，用于&运算"""
+    if type(value) is RangeValue:
+        if len(value) != 1:
+            raise VALUE
+        value = value[0]
+    if value is None:
+        return ''
+    if isinstance(value, ExcelError):
+        raise value
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, float):
+        if value.is_integer():
+            return str(int(value))
+        return format(value, '.15g')
+    return str(value)
+
+
+def to_bool(value):
+    """按Excel的规则把值转换为逻辑值，用于IF、AND等函数"""
+    if type(value) is RangeValue:
+        if len(value) != 1:
+            raise VALUE
+        value = value[0]
+    if value is None:
+        return False
+    if isinstance(value, ExcelError):
+        raise value
+    if isinstance(value, str):
+        upper = value.upper()
+        if upper in ('TRUE', 'FALSE'):
+            return upper == 'TRUE'
+        raise VALUE
+    return bool(to_number(value))
+
+
+def _compare_key(value):
+    """比较时的排序键：数值 < 文本 < 逻辑值，文本不区分大小写"""
+    if isinstance(value, bool):
+        return 2, value
+    if isinstance(value, str):
+        return 1, value.lower()
+    return 0, to_number(value)
+
+
+def compare(left, right):
+    """
+    按Excel的规则比较两个值，空值按另一侧的类型视为0、空文本或FALSE
+
+    Returns:
+        int: -1、0或1
+    """
+    if type(left) is RangeValue:
+        left = to_number(left) if len(left) != 1 else left[0]
+    if type(right) is RangeValue:
+        right = to_number(right) if len(right) != 1 else right[0]
+    for value in (left, right):
+        if isinstance(value, ExcelError):
+            raise value
+    if left is None:
+        left = '' if isinstance(right, str) else False if isinstance(right, bool) else 0
+    if right is None:
+        right = '' if isinstance(left, str) else False if isinstance(left, bool) else 0
+    left_key, right_key = _compare_key(left), _compare_key(right)
+    return (left_key > right_key) - (left_key < right_key)
+
+
+def power(base, exponent):
+    """乘方：0的负数次方为#DIV/0!，负数的小数次方为#NUM!"""
+    if base == 0 and exponent < 0:
+        raise DIV0
+    result = base ** exponent
+    if isinstance(result, complex):
+        raise NUM
+    return result
+
+
+def cell_result(value):
+    """公式的最终结果：空值显示为0，多个单元格的区域无法放入一个单元格（#VALUE!）"""
+    if value is None:
+        return 0
+    if type(value) is RangeValue:
+        if len(value) != 1:
+            raise VALUE
+        return cell_result(value[0])
+    return value
+
+
+def iter_numbers(args):
+    """
+    遍历函数参数中的数值：区域中只取数值（忽略文本、逻辑值和空值），直接给出的参数按to_number转换
+
+    Raises:
+        ExcelError: 参数或区域中有错误值
+    """
+    for arg in args:
+        if type(arg) is RangeValue:
+            for value in arg:
+                value_type = type(value)
+                if value_type is float or value_type is int:
+                    yield value
+                elif isinstance(value, ExcelError):
+                    raise value
+        else:
+            yield to_number(arg)
+
+
+def fn_sum(*args):
+    return sum(iter_numbers(args))
+
+
+def fn_average(*args):
+    numbers = list(iter_numbers(args))
+    if not numbers:
+        raise DIV0
+    return sum(numbers) / len(numbers)
+
+
+def fn_min(*args):
+    return min(iter_numbers(args), default=0)
+
+
+def fn_max(*args):
+    return max(iter_numbers(args), default=0)
+
+
+def fn_product(*args):
+    return math.prod(iter_numbers(args))
+
+
+def fn_count(*args):
+    count = 0
+    for arg in args:
+        if type(arg) is RangeValue:
+            count += sum(1 for value in arg if type(value) in (int, float))
+        else:
+            try:
+                to_number(arg)
+                count += 1
+            except ExcelError:
+                pass
+    return count
+
+
+def fn_counta(*args):
+    count = 0
+    for arg in args:
+        if type(arg) is RangeValue:
+            count += sum(1 for value in arg if value is not None)
+        else:
+            count += 1
+    return count
+
+
+def fn_sumproduct(*arrays):
+    if not arrays:
+        raise VALUE
+    arrays = [arg if type(arg) is RangeValue else RangeValue((arg,)) for arg in arrays]
+    if len({len(array) for array in arrays}) != 1:
+        raise VALUE
+    total = 0
+    for values in zip(*arrays):
+        product = 1
+        for value in values:
+            if isinstance(value, ExcelError):
+                raise value
+            product *= value if type(value) in (int, float) else 0
+        total += product
+    return total
+
+
+def fn_abs(number):
+    return abs(to_number(number))
+
+
+def _round(number, digits, rounding):
+    number, digits = to_number(number), int(to_number(digits))
+    quantum = Decimal(1).scaleb(-digits)
+    return float(Decimal(repr(float(number))).quantize(quantum, rounding=rounding))
+
+
+def fn_round(number, digits=0):
+    return _round(number, digits, ROUND_HALF_UP)
+
+
+def fn_roundup(number, digits=0):
+    return _round(number, digits, ROUND_UP)
+
+
+def fn_rounddown(number, digits=0):
+    return _round(number, digits, ROUND_DOWN)
+
+
+def fn_int(number):
+    return math.floor(to_number(number))
+
+
+def fn_mod(number, divisor):
+    number, divisor = to_number(number), to_number(divisor)
+    if divisor == 0:
+        raise DIV0
+    return number % divisor
+
+
+def fn_power(number, exponent):
+    return power(to_number(number), to_number(exponent))
+
+
+def fn_sqrt(number):
+    number = to_number(number)
+    if number < 0:
+        raise NUM
+    return math.sqrt(number)
+
+
+def fn_exp(number):
+    return math.exp(to_number(number))
+
+
+def fn_ln(number):
+    number = to_number(number)
+    if number <= 0:
+        raise NUM
+    return math.log(number)
+
+
+def fn_log(number, base=10):
+    number, base = to_number(number), to_number(base)
+    if number <= 0 or base <= 0:
+        raise NUM
+    if base == 1:
+        raise DIV0
+    return math.log(number, base)
+
+
+def fn_log10(number):
+    return fn_log(number, 10)
+
+
+def fn_and(*args):
+    return all([to_bool(value) for value in _iter_logicals(args)])
+
+
+def fn_or(*args):
+    return any([to_bool(value) for value in _iter_logicals(args)])
+
+
+def fn_not(value):
+    return not to_bool(value)
+
+
+def _iter_logicals(args):
+    """AND/OR的参数：区域中忽略文本和空值"""
+    for arg in args:
+        if type(arg) is RangeValue:
+            for value in arg:
+                if value is None or isinstance(value, str):
+                    continue
+                yield value
+        else:
+            yield arg
+
+
+def fn_npv(rate, *values):
+    rate = to_number(rate)
+    if rate == -1:
+        raise DIV0
+    return sum(value / (1 + rate) ** period for period, value in enumerate(iter_numbers(values), 1))
+
+
+def irr(values, guess=0.1, tolerance=1e-10, max_iterations=100):
+    """
+    内部收益率：先用牛顿法从guess迭代，不收敛时在(-1, 1e6)内二分查找
+
+    Args:
+        values (list): 各期现金流，至少包含一个正值和一个负值
+        guess (float): 初始估计值
+
+    Returns:
+        float: 使净现值为0的折现率
+
+    Raises:
+        ExcelError: 无解或不收敛（#NUM!）
+    """
+    if not any(value > 0 for value in values) or not any(value < 0 for value in values):
+        raise NUM
+
+    def npv(rate):
+        return sum(value / (1 + rate) ** period for period, value in enumerate(values))
+
+    def derivative(rate):
+        return sum(-period * value / (1 + rate) ** (period + 1) for period, value in enumerate(values))
+
+    rate = guess
+    for _ in range(max_iterations):
+        try:
+            slope = derivative(rate)
+            if slope == 0:
+                break
+            step = npv(rate) / slope
+        except (ZeroDivisionError, OverflowError):
+            break
+        rate -= step
+        if rate <= -1:
+            break
+        if abs(step) < tolerance:
+            return rate
+
+    # 牛顿法失败时在净现值变号的区间内二分
+    low, high = -1 + 1e-9, 1.0
+    try:
+        while npv(low) * npv(high) > 0 and high < 1e6:
+            high *= 2
+        if npv(low) * npv(high) > 0:
+            raise NUM
+        for _ in range(200):
+            middle = (low + high) / 2
+            if npv(low) * npv(middle) <= 0:
+                high = middle
+            else:
+                low = middle
+            if high - low < tolerance:
+                return (low + high) / 2
+    except (ZeroDivisionError, OverflowError):
+        pass
+    raise NUM
+
+
+def fn_irr(values, guess=0.1):
+    return irr(list(iter_numbers([values])), to_number(guess))
+
+
+def fn_pmt(rate, nper, pv, fv=0, when=0):
+    rate, nper, pv, fv, when = (to_number(value) for value in (rate, nper, pv, fv, when))
+    if nper == 0:
+        raise NUM
+    if rate == 0:
+        return -(pv + fv) / nper
+    factor = (1 + rate) ** nper
+    return -(rate * (pv * factor + fv)) / ((1 + rate * (1 if when else 0)) * (factor - 1))
+
+
+def fn_pv(rate, nper, pmt, fv=0, when=0):
+    rate, nper, pmt, fv, when = (to_number(value) for value in (rate, nper, pmt, fv, when))
+    if rate == 0:
+        return -(fv + pmt * nper)
+    factor = (1 + rate) ** nper
+    return -(fv + pmt * (1 + rate * (1 if when else 0)) * (factor - 1) / rate) / factor
+
+
+def fn_fv(rate, nper, pmt, pv=0, when=0):
+    rate, nper, pmt, pv, when = (to_number(value) for value in (rate, nper, pmt, pv, when))
+    if rate == 0:
+        return -(pv + pmt * nper)
+    factor = (1 + rate) ** nper
+    return -(pv * factor + pmt * (1 + rate * (1 if when else 0)) * (factor - 1) / rate)
+
+
+# 函数名 -> 实现，IF、IFERROR在编译时展开为惰性求值的表达式
+FUNCTIONS = {
+    'SUM': fn_sum,
+    'AVERAGE': fn_average,
+    'MIN': fn_min,
+    'MAX': fn_max,
+    'PRODUCT': fn_product,
+    'COUNT': fn_count,
+    'COUNTA': fn_counta,
+    'SUMPRODUCT': fn_sumproduct,
+    'ABS': fn_abs,
+    'ROUND': fn_round,
+    'ROUNDUP': fn_roundup,
+    'ROUNDDOWN': fn_rounddown,
+    'INT': fn_int,
+    'MOD': fn_mod,
+    'POWER': fn_power,
+    'SQRT': fn_sqrt,
+    'EXP': fn_exp,
+    'LN': fn_ln,
+    'LOG': fn_log,
+    'LOG10': fn_log10,
+    'AND': fn_and,
+    'OR': fn_or,
+    'NOT': fn_not,
+    'NPV': fn_npv,
+    'IRR': fn_irr,
+    'PMT': fn_pmt,
+    'PV': fn_pv,
+    'FV': fn_fv,
+}
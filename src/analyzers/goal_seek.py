@@ -0,0 +1,181 @@
+"""单变量求解：调整输入单元格使输出单元格达到目标值，只重算连接输入和输出的公式"""
+
+import time
+
+import numpy as np
+
+from .batch_engine import BatchEngine
+from .excel_functions import to_cell_value
+
+# 有限差分求导的相对步长
+DERIVATIVE_STEP = 1e-7
+# 沿牛顿方向的步长最多减半的次数，仍不能减小误差时停止
+MAX_HALVINGS = 30
+
+
+def goal_seek(engine, output, target, inputs, tolerance=1e-9, max_iterations=100, apply=False):
+    """
+    调整一个或多个输入单元格，使输出单元格的值等于目标值
+
+    使用带步长减半的牛顿法，导数由有限差分得到；多个输入单元格时每一步取相对改变量（按当前值的比例）
+    最小的方向，各输入单元格按相近的百分比调整。
+    每次求值只重算受这些输入影响、且输出单元格依赖的公式
+
+    Args:
+        engine (RecalcEngine): 重算引擎，从其当前值开始求解
+        output (str): 目标单元格名称，如'测算结果输出!B5'
+        target (float): 目标值
+        inputs (str或list): 可调整的输入单元格名称
+        tolerance (float): 允许的误差，相对于max(1, |target|)
+        max_iterations (int): 最大迭代次数
+        apply (bool): 是否把求得的输入值写入重算引擎（同时重算全部受影响的输出），默认恢复原值
+
+    Returns:
+        dict: inputs（输入单元格名称 -> 求得的值）、value（此时的输出值）、converged、
+              iterations、evaluations（求值次数）、formulas（每次求值重算的公式数）
+
+    Raises:
+        KeyError: 单元格不是输入单元格或不在依赖锥中
+        ValueError: 输出不依赖这些输入单元格，或在起始点无法求值
+    """
+    start = time.perf_counter()
+    names = [inputs] if isinstance(inputs, str) else list(inputs)
+    slots = [engine.input_slot(name) for name in names]
+    output_slot = engine.cell_slot(output)
+    formulas = engine.cone_formulas(slots, [output_slot])
+    if not formulas:
+        raise ValueError(f"{output} 不依赖 {', '.join(names)}")
+
+    original = [engine.values[slot] for slot in slots]
+    evaluations = 0
+
+    def residual(point):
+        nonlocal evaluations
+        evaluations += 1
+        for slot, value in zip(slots, point):
+            engine.values[slot] = to_cell_value(value)
+        engine._run(formulas)
+        value = engine.values[output_slot]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return np.nan
+        return value - target
+
+    x = np.array([float(value) for value in original])
+    error = residual(x)
+    if np.isnan(error):
+        raise ValueError(f"{output} 在起始点无法求值: {engine.values[output_slot]}")
+    limit = tolerance * max(1.0, abs(target))
+    iterations = 0
+    try:
+        while abs(error) > limit and iterations < max_iterations:
+            iterations += 1
+            steps = DERIVATIVE_STEP * np.maximum(np.abs(x), 1.0)
+            gradient = np.array([
+                (residual(x + np.eye(len(x))[index] * steps[index]) - error) / steps[index]
+                for index in range(len(x))
+            ])
+            # 按各输入单元格当前值的比例衡量改变量，使量纲不同的输入按相近的百分比调整
+            scale = np.where(x != 0, np.abs(x), 1.0)
+            scaled_gradient = gradient * scale
+            norm = scaled_gradient @ scaled_gradient
+            if not np.isfinite(norm) or norm == 0:
+                break
+            step = -error * scaled_gradient * scale / norm
+            for _ in range(MAX_HALVINGS):
+                candidate = x + step
+                candidate_error = residual(candidate)
+                if abs(candidate_error) < abs(error):
+                    x, error = candidate, candidate_error
+                    break
+                step = step / 2
+            else:
+                break
+        converged = bool(abs(error) <= limit)
+        solution = dict(zip(names, (to_cell_value(value) for value in x)))
+        value = error + target
+    finally:
+        # 恢复原来的输入值，只有本次修改过的公式需要重算
+        for slot, value_before in zip(slots, original):
+            engine.values[slot] = value_before
+        engine._run(formulas)
+    if apply:
+        engine.set_inputs(solution)
+
+    print(f'单变量求解：{output} = {target}，调整 {len(names)} 个输入单元格，'
+          f'{"已收敛" if converged else "未收敛"}，{iterations} 次迭代、{evaluations} 次求值'
+          f'（每次 {len(formulas)} 个公式），用时 {(time.perf_counter() - start) * 1000:.1f} 毫秒')
+    return {
+        'inputs': solution, 'value': value, 'converged': converged,
+        'iterations': iterations, 'evaluations': evaluations, 'formulas': len(formulas),
+    }
+
+
+def goal_seek_many(engine, output, targets, input_name, tolerance=1e-9, max_iterations=100):
+    """
+    对一组目标值同时求解一个输入单元格的值，全部目标在情景维度上按数组一起迭代
+
+    Args:
+        engine (RecalcEngine): 重算引擎，从其当前值开始求解
+        output (str): 目标单元格名称
+        targets (sequence): 目标值
+        input_name (str): 可调整的输入单元格名称
+        tolerance (float): 允许的误差，相对于max(1, |目标值|)
+        max_iterations (int): 最大迭代次数
+
+    Returns:
+        dict: inputs（各目标求得的输入值，未收敛为NaN）、values（此时的输出值）、
+              converged（各目标是否收敛）、iterations
+
+    Raises:
+        KeyError: 单元格不是输入单元格或不在依赖锥中
+        ValueError: 输出不依赖该输入单元格
+    """
+    start = time.perf_counter()
+    targets = np.asarray(targets, dtype=float)
+    slot = engine.input_slot(input_name)
+    formulas = engine.cone_formulas([slot], [engine.cell_slot(output)])
+    if not formulas:
+        raise ValueError(f"{output} 不依赖 {input_name}")
+    batch = BatchEngine(engine)
+
+    def evaluate(points):
+        values = batch.evaluate({input_name: points}, formulas=formulas, outputs=[output])[output]
+        if values.dtype == object:
+            values = np.array([value if isinstance(value, (int, float)) else np.nan for value in values], dtype=float)
+        return values
+
+    x = np.full(len(targets), float(engine.values[slot]))
+    limits = tolerance * np.maximum(1.0, np.abs(targets))
+    iterations = 0
+    with np.errstate(all='ignore'):
+        # 每次迭代在同一批中计算各目标的当前点和求导用的扰动点
+        active = np.ones(len(targets), dtype=bool)
+        errors = evaluate(x) - targets
+        while iterations < max_iterations:
+            active &= np.isfinite(errors) & (np.abs(errors) > limits)
+            if not active.any():
+                break
+            iterations += 1
+            steps = DERIVATIVE_STEP * np.maximum(np.abs(x), 1.0)
+            derivatives = (evaluate(x + steps) - targets - errors) / steps
+            step = np.where(active & (derivatives != 0), -errors / derivatives, 0.0)
+            pending = active & np.isfinite(step) & (step != 0)
+            active &= pending
+            for _ in range(MAX_HALVINGS):
+                if not pending.any():
+                    break
+                candidate_errors = evaluate(x + step) - targets
+                improved = pending & (np.abs(candidate_errors) < np.abs(errors))
+                x = np.where(improved, x + step, x)
+                errors = np.where(improved, candidate_errors, errors)
+                pending &= ~improved
+                step = np.where(pending, step / 2, step)
+            # 步长减半后仍不能减小误差的目标停止迭代
+            active &= ~pending
+    converged = np.isfinite(errors) & (np.abs(errors) <= limits)
+    print(f'批量单变量求解：{len(targets)} 个目标值，{int(converged.sum())} 个收敛，{iterations} 次迭代'
+          f'（每次 {len(formulas)} 个公式），用时 {(time.perf_counter() - start) * 1000:.1f} 毫秒')
+    return {
+        'inputs': np.where(converged, x, np.nan), 'values': errors + targets,
+        'converged': converged, 'iterations': iterations,
+    }
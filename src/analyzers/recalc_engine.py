@@ -0,0 +1,682 @@
+"""重算引擎，把依赖图中输出单元格的依赖锥编译为Python函数，修改输入单元格后只重算受影响的公式"""
+
+import math
+import time
+from bisect import bisect_left, bisect_right
+from operator import itemgetter
+
+from openpyxl.formula.tokenizer import Token
+from openpyxl.utils import get_column_letter, coordinate_to_tuple
+
+from .dependency_graph import EDGE_INPUT, EDGE_FORMULA, EDGE_RANGE
+from .excel_functions import (
+    ERRORS, FUNCTIONS, REF, VALUE, NUM, DIV0, ExcelError, RangeValue, UnsupportedFormula,
+    cell_result, compare, power, to_bool, to_cell_value, to_number, to_text
+)
+from ..parsers.formula_parser import FormulaParser, Reference, Function, ArrayConstant, Group, Literal
+
+# 运算符的结合优先级，数值越大结合越紧；负号高于乘方（Excel中=-2^2为4）
+_INFIX_PRECEDENCE = {
+    '=': 1, '<>': 1, '<': 1, '>': 1, '<=': 1, '>=': 1,
+    '&': 2,
+    '+': 3, '-': 3,
+    '*': 4, '/': 4,
+    '^': 5,
+}
+_PREFIX_PRECEDENCE = 6
+_COMPARISONS = {'=': '==', '<>': '!=', '<': '<', '>': '>', '<=': '<=', '>=': '>='}
+
+
+def _if_error(value, fallback):
+    """IFERROR：value求值出错或结果为错误值时返回fallback的结果"""
+    try:
+        result = value()
+    except (ExcelError, ArithmeticError, ValueError, TypeError):
+        return fallback()
+    if isinstance(result, ExcelError):
+        return fallback()
+    return result
+
+
+# 编译后的公式中可以使用的名称
+_NAMESPACE = {
+    'N': to_number, 'T': to_text, 'B': to_bool, 'R': RangeValue, 'C': cell_result,
+    'CMP': compare, 'POW': power, 'IFERROR': _if_error,
+    **{f"F_{name}": function for name, function in FUNCTIONS.items()},
+}
+
+
+class _FormulaCompiler:
+    namespace = _NAMESPACE  # 编译后的公式中可以使用的名称
+
+    def __init__(self, parsed):
+        """
+        把一个公式的语法树编译为Python函数
+
+        编译结果的参数为(v, p0, p1, ...)：v是全部单元格的值列表，pi对应公式中第i个引用，
+        单元格引用为其在v中的位置，区域引用为取出区域全部值的itemgetter。
+        同一公式模板的副本只编译一次，按各自平移后的引用传入不同的参数
+
+        Args:
+            parsed (ParsedFormula): 公式的解析结果
+        """
+        self.parsed = parsed
+        self.positions = {id(ref): index for index, ref in enumerate(parsed.references)}
+        self.constants = {}  # 错误值常量 -> 名称
+
+    def compile(self):
+        """
+        Returns:
+            function: 编译后的函数
+
+        Raises:
+            UnsupportedFormula: 公式中有不支持的函数、名称或运算符
+        """
+        if self.parsed.error is not None:
+            raise UnsupportedFormula(f"无法解析: {self.parsed.error}")
+        code, _ = self._expression(self.parsed.items)
+        params = ''.join(f", p{index}" for index in range(len(self.parsed.references)))
+        source = f"def formula(v{params}):\n    return C({code})\n"
+        namespace = dict(self.namespace)
+        namespace.update({name: ERRORS[error] for error, name in self.constants.items()})
+        exec(compile(source, f"<{self.parsed.text}>", 'exec'), namespace)
+        return namespace['formula']
+
+    def _expression(self, items, as_range=False):
+        """
+        编译一个表达式
+
+        Args:
+            items (list): 语法树节点列表
+            as_range (bool): 表达式是函数参数时，单独的单元格引用按一个单元格的区域传入
+
+        Returns:
+            tuple: (Python表达式, 结果是否一定为数值)
+        """
+        tokens = [item for item in items if not (isinstance(item, Literal) and item.kind == Token.WSPACE)]
+        if not tokens:
+            return 'None', False
+        if as_range and len(tokens) == 1 and isinstance(tokens[0], Reference):
+            return self._reference(tokens[0], as_range=True), False
+        self._tokens = tokens
+        self._position = 0
+        code, numeric = self._parse(0)
+        if self._position != len(tokens):
+            raise UnsupportedFormula(f"不支持的运算: {tokens[self._position]!r}")
+        return code, numeric
+
+    def _parse(self, min_precedence):
+        """按运算符优先级解析self._tokens中从当前位置开始的表达式"""
+        token = self._next()
+        if isinstance(token, Literal) and token.kind == Token.OP_PRE:
+            operand, numeric = self._parse(_PREFIX_PRECEDENCE)
+            operand = operand if numeric else f"N({operand})"
+            code, numeric = (f"(-{operand})" if token.value == '-' else operand), True
+        else:
+            code, numeric = self._operand(token)
+
+        while self._position < len(self._tokens):
+            token = self._tokens[self._position]
+            if not (isinstance(token, Literal) and token.is_operator):
+                raise UnsupportedFormula(f"不支持的运算: {token!r}")
+            if token.kind == Token.OP_POST and token.value == '%':
+                self._position += 1
+                code, numeric = f"({code if numeric else f'N({code})'}/100)", True
+                continue
+            precedence = _INFIX_PRECEDENCE.get(token.value)
+            if token.kind != Token.OP_IN or precedence is None:
+                raise UnsupportedFormula(f"不支持的运算符: {token.value}")
+            if precedence < min_precedence:
+                break
+            self._position += 1
+            # 同一优先级从左到右结合
+            right, right_numeric = self._parse(precedence + 1)
+            code, numeric = self._binary(token.value, code, numeric, right, right_numeric)
+        return code, numeric
+
+    def _next(self):
+        if self._position >= len(self._tokens):
+            raise UnsupportedFormula("表达式不完整")
+        token = self._tokens[self._position]
+        self._position += 1
+        return token
+
+    @staticmethod
+    def _binary(operator, left, left_numeric, right, right_numeric):
+        if operator in _COMPARISONS:
+            return f"(CMP({left}, {right}) {_COMPARISONS[operator]} 0)", False
+        if operator == '&':
+            return f"(T({left}) + T({right}))", False
+        left = left if left_numeric else f"N({left})"
+        right = right if right_numeric else f"N({right})"
+        if operator == '^':
+            return f"POW({left}, {right})", True
+        return f"({left} {operator} {right})", True
+
+    def _operand(self, token):
+        if isinstance(token, Reference):
+            return self._reference(token), False
+        if isinstance(token, ArrayConstant):
+            raise UnsupportedFormula("不支持数组常量")
+        if isinstance(token, Function):
+            return self._function(token)
+        if isinstance(token, Group):
+            # 括号中的表达式单独解析，完成后恢复外层的解析位置
+            tokens, position = self._tokens, self._position
+            code, numeric = self._expression(token.items)
+            self._tokens, self._position = tokens, position
+            return f"({code})", numeric
+        if token.kind != Token.OPERAND:
+            raise UnsupportedFormula(f"不支持的运算符: {token.value}")
+        return self._constant(token.value)
+
+    def _constant(self, text):
+        if text.startswith('"'):
+            return repr(text[1:-1].replace('""', '"')), False
+        if text.startswith('#'):
+            if text not in ERRORS:
+                raise UnsupportedFormula(f"未知的错误值: {text}")
+            name = self.constants.setdefault(text, f"E{len(self.constants)}")
+            return name, False
+        upper = text.upper()
+        if upper in ('TRUE', 'FALSE'):
+            return str(upper == 'TRUE'), False
+        try:
+            number = float(text)
+        except ValueError:
+            raise UnsupportedFormula(f"不支持的名称: {text}")
+        return repr(int(number) if number.is_integer() and abs(number) < 2 ** 53 else number), True
+
+    def _reference(self, ref, as_range=False):
+        param = f"p{self.positions[id(ref)]}"
+        if ref.is_range:
+            return f"R({param}(v))"
+        return f"R((v[{param}],))" if as_range else f"v[{param}]"
+
+    @staticmethod
+    def _if(condition, when_true, when_false):
+        """IF只对选中的分支求值"""
+        return f"({when_true} if B({condition}) else {when_false})"
+
+    def _function(self, function):
+        name = function.name.upper()
+        if name.startswith('_XLFN.'):
+            name = name[len('_XLFN.'):]
+        args = function.args if function.args != [[]] else []
+        tokens, position = self._tokens, self._position
+        try:
+            if name == 'IF':
+                if not 1 <= len(args) <= 3:
+                    raise UnsupportedFormula("IF的参数个数不正确")
+                # 省略的参数为0，没有第三个参数时为FALSE
+                branches = [self._expression(arg)[0] if arg else '0' for arg in args[1:]]
+                branches += ['0', 'False'][len(branches):]
+                condition, _ = self._expression(args[0])
+                return self._if(condition, *branches), False
+            if name == 'IFERROR':
+                if len(args) != 2:
+                    raise UnsupportedFormula("IFERROR的参数个数不正确")
+                value, _ = self._expression(args[0])
+                fallback, _ = self._expression(args[1])
+                return f"IFERROR(lambda: {value}, lambda: {fallback})", False
+            if name not in FUNCTIONS:
+                raise UnsupportedFormula(f"不支持的函数: {function.name}")
+            compiled = [self._expression(arg, as_range=True)[0] for arg in args]
+            return f"F_{name}({', '.join(compiled)})", False
+        finally:
+            self._tokens, self._position = tokens, position
+
+
+class RecalcEngine:
+    def __init__(self, workbook, graph, root_ids, cached_values=None, formula_parser=None, sheet_dimensions=None):
+        """
+        初始化重算引擎，从输出单元格出发收集依赖锥，按拓扑顺序编译其中的公式
+
+        依赖锥沿依赖图中的公式边和区域边展开，在输入单元格（黄色背景）处停止。
+        全部单元格的值放在一个列表中，每个公式单元格对应一个编译后的函数和参数；
+        无法编译的公式、循环引用和分解失败的单元格保持缓存的计算结果不变
+
+        Args:
+            workbook: openpyxl工作簿对象
+            graph (DependencyGraph): 工作簿级依赖图
+            root_ids (list): 输出单元格在依赖图中的编号
+            cached_values (dict): 公式单元格的缓存计算结果，工作表名 -> {(行号, 列号): 值}
+            formula_parser (FormulaParser): 可选，用于复用解析结果和公式模板
+            sheet_dimensions (callable): 可选，工作表 -> (最大行号, 最大列号)，用于确定整行、整列引用的范围，
+                                         如FormulaExtractor._get_sheet_dimensions；默认按实际存在的单元格计算
+        """
+        start = time.perf_counter()
+        self.workbook = workbook
+        self.graph = graph
+        self.cached_values = cached_values or {}
+        self.formula_parser = formula_parser or FormulaParser()
+        self.sheet_dimensions = sheet_dimensions or self._populated_dimensions
+        self.slots = {}  # (工作表名, 行号, 列号) -> 值列表中的位置
+        self.names = []  # 位置 -> 单元格名称
+        self.values = []  # 位置 -> 当前值
+        self.inputs = {}  # 输入单元格名称 -> 位置
+        self.outputs = {}  # 输出单元格名称 -> 位置
+        self.unsupported = {}  # 无法编译的公式单元格名称 -> 原因
+        self.frozen = {}  # 保持缓存值的公式单元格名称 -> 原因（循环引用、分解失败）
+        self._ref_slot = None  # 无效工作表引用对应的位置，值为#REF!
+        self._blank_slot = None  # 区域中所有空白位置共用的位置，值为None
+        self._populated = {}  # 工作表名 -> (有单元格的列号列表, 列号 -> 有序行号列表)
+        self._compiled = {}  # id(ParsedFormula) -> 编译后的函数，编译失败时为异常
+        self._affected = {}  # 修改的位置集合 -> 需要重算的公式序号
+        self._formula_indexes = None  # 公式单元格的位置 -> 在重算计划中的序号，首次使用时建立
+
+        order, input_ids = self._topological_order(root_ids)
+        self.plan = []  # 按拓扑顺序的(位置, 函数, 参数)
+        self.plan_formulas = []  # 与plan对应的公式解析结果，用于按其他方式重新编译
+        for cell_id in order:
+            self._compile_cell(cell_id)
+        for input_id in sorted(input_ids):
+            sheet_name, row, col = graph.locations[input_id]
+            self.inputs[graph.names[input_id]] = self._slot(sheet_name, row, col)
+        for root_id in root_ids:
+            sheet_name, row, col = graph.locations[root_id]
+            self.outputs[graph.names[root_id]] = self._slot(sheet_name, row, col)
+        self.initial_values = list(self.values)
+        self._dependents = self._build_dependents()
+        self.build_time = time.perf_counter() - start
+        print(f'重算引擎：{len(self.plan)} 个公式单元格（{len(self._compiled)} 个编译函数），'
+              f'{len(self.inputs)} 个输入单元格，{len(self.outputs)} 个输出单元格，用时 {self.build_time:.2f} 秒')
+        if self.unsupported or self.frozen:
+            print(f'  {len(self.unsupported)} 个公式无法编译、{len(self.frozen)} 个单元格有循环引用或分解失败，保持缓存值')
+
+    def _topological_order(self, root_ids):
+        """
+        深度优先遍历依赖锥，得到公式单元格的拓扑顺序（被引用的在前）
+
+        Returns:
+            tuple: (公式单元格编号列表, 输入单元格编号集合)
+        """
+        graph = self.graph
+        order = []
+        input_ids = set()
+        state = {}  # 编号 -> 1: 正在遍历其依赖，2: 已完成
+
+        def dependencies(cell_id):
+            if cell_id not in graph.formula_rows:
+                return
+            for _, kind, target, _ in graph.iter_edges(cell_id):
+                if kind == EDGE_FORMULA:
+                    yield target
+                elif kind == EDGE_INPUT:
+                    input_ids.add(target)
+                elif kind == EDGE_RANGE:
+                    for _, member_kind, member, _ in graph.iter_edges(target):
+                        if member_kind == EDGE_FORMULA:
+                            yield member
+                        elif member_kind == EDGE_INPUT:
+                            input_ids.add(member)
+
+        for root_id in root_ids:
+            if root_id in state:
+                continue
+            state[root_id] = 1
+            stack = [(root_id, dependencies(root_id))]
+            while stack:
+                cell_id, pending = stack[-1]
+                for target in pending:
+                    target_state = state.get(target)
+                    if target_state is None:
+                        state[target] = 1
+                        stack.append((target, dependencies(target)))
+                        break
+                    if target_state == 1:
+                        # 循环引用：环上的单元格都保持缓存值
+                        cycle = [item for item, _ in stack[[item for item, _ in stack].index(target):]]
+                        for member in cycle:
+                            self.frozen[graph.names[member]] = '循环引用'
+                else:
+                    stack.pop()
+                    state[cell_id] = 2
+                    order.append(cell_id)
+        return order, input_ids
+
+    def _slot(self, sheet_name, row, col):
+        """获取单元格在值列表中的位置，首次出现时以当前值（公式单元格为缓存的计算结果）初始化"""
+        key = (sheet_name, row, col)
+        slot = self.slots.get(key)
+        if slot is None:
+            slot = len(self.values)
+            self.slots[key] = slot
+            self.names.append(f"{sheet_name}!{get_column_letter(col)}{row}")
+            cell = self.workbook[sheet_name]._cells.get((row, col))
+            value = cell.value if cell is not None else None
+            if isinstance(value, str) and value.startswith('='):
+                value = self.cached_values.get(sheet_name, {}).get((row, col))
+                if isinstance(value, str) and value in ERRORS:
+                    value = ERRORS[value]
+            elif cell is not None and cell.data_type == 'e':
+                value = ERRORS.get(value, VALUE)
+            self.values.append(value)
+        return slot
+
+    def _get_populated(self, sheet_name):
+        """工作表中实际存在的单元格按列分组的有序行号，首次使用时建立"""
+        populated = self._populated.get(sheet_name)
+        if populated is None:
+            rows_by_column = {}
+            for row, col in self.workbook[sheet_name]._cells:
+                rows_by_column.setdefault(col, []).append(row)
+            for rows in rows_by_column.values():
+                rows.sort()
+            populated = (sorted(rows_by_column), rows_by_column)
+            self._populated[sheet_name] = populated
+        return populated
+
+    def _populated_dimensions(self, worksheet):
+        """按实际存在的单元格计算工作表的最大行号和最大列号，不遍历openpyxl的max_row"""
+        columns, rows_by_column = self._get_populated(worksheet.title)
+        if not columns:
+            return 1, 1
+        return max(rows[-1] for rows in rows_by_column.values()), columns[-1]
+
+    def _get_blank_slot(self):
+        """区域中空白位置共用的位置，大区域不再为每个空白单元格分配位置"""
+        if self._blank_slot is None:
+            self._blank_slot = len(self.values)
+            self.names.append('(空白)')
+            self.values.append(None)
+        return self._blank_slot
+
+    def _reference_param(self, ref, sheet_name):
+        """
+        引用对应的编译函数参数
+
+        Returns:
+            int或callable: 单元格引用为位置，区域引用为取出区域全部值的函数
+        """
+        target_sheet = ref.sheet or sheet_name
+        if target_sheet not in self.workbook.sheetnames:
+            if self._ref_slot is None:
+                self._ref_slot = len(self.values)
+                self.names.append('#REF!')
+                self.values.append(REF)
+            slot = self._ref_slot
+            return slot if not ref.is_range else (lambda values: (values[slot],))
+        if not ref.is_range:
+            return self._slot(target_sheet, ref.bounds[1], ref.bounds[0])
+
+        range_id = self.graph.ids.get(ref.qualified(sheet_name))
+        if range_id is not None and range_id in self.graph.ranges:
+            _, min_row, min_col, max_row, max_col = self.graph.ranges[range_id]
+        else:
+            min_col, min_row, max_col, max_row = ref.bounds
+            if min_row is None or min_col is None:
+                sheet_max_row, sheet_max_column = self.sheet_dimensions(self.workbook[target_sheet])
+                min_row, max_row = (min_row, max_row) if min_row is not None else (1, sheet_max_row)
+                min_col, max_col = (min_col, max_col) if min_col is not None else (1, sheet_max_column)
+        if min_row == max_row and min_col == max_col:
+            slot = self._slot(target_sheet, min_row, min_col)
+            return lambda values: (values[slot],)
+        # 按行主序排列区域的全部位置，保持SUMPRODUCT等按位置对应的函数的语义；
+        # 只为实际存在的单元格分配位置，空白位置共用一个值为None的位置
+        width = max_col - min_col + 1
+        slots = [self._get_blank_slot()] * ((max_row - min_row + 1) * width)
+        columns, rows_by_column = self._get_populated(target_sheet)
+        for col in columns[bisect_left(columns, min_col):bisect_right(columns, max_col)]:
+            rows = rows_by_column[col]
+            for row in rows[bisect_left(rows, min_row):bisect_right(rows, max_row)]:
+                slots[(row - min_row) * width + col - min_col] = self._slot(target_sheet, row, col)
+        return itemgetter(*slots)
+
+    def _compile_cell(self, cell_id):
+        """编译一个公式单元格，加入重算计划"""
+        graph = self.graph
+        name = graph.names[cell_id]
+        sheet_name, row, col = graph.locations[cell_id]
+        slot = self._slot(sheet_name, row, col)
+        if name in self.frozen:
+            return
+        if cell_id in graph.failures:
+            self.frozen[name] = f"分解失败: {graph.failures[cell_id]}"
+            return
+        formula = self.workbook[sheet_name]._cells[(row, col)].value
+        template = self.formula_parser.template(formula, row, col)
+        if template is not None:
+            parsed, references = template.parsed, template.references(row, col)
+        else:
+            parsed = self.formula_parser.parse(formula)
+            references = parsed.references
+
+        function = self._compiled.get(id(parsed))
+        if function is None:
+            try:
+                function = _FormulaCompiler(parsed).compile()
+            except UnsupportedFormula as e:
+                function = e
+            self._compiled[id(parsed)] = function
+        if isinstance(function, UnsupportedFormula):
+            self.unsupported[name] = str(function)
+            return
+        params = tuple(self._reference_param(ref, sheet_name) for ref in references)
+        self.plan.append((slot, function, params))
+        self.plan_formulas.append(parsed)
+
+    def _build_dependents(self):
+        """
+        Returns:
+            dict: 位置 -> 读取该位置的公式在重算计划中的序号列表
+        """
+        dependents = {}
+        for index, (_, _, params) in enumerate(self.plan):
+            for slot in self._read_slots(params):
+                dependents.setdefault(slot, []).append(index)
+        return dependents
+
+    def _read_slots(self, params):
+        """公式参数读取的全部位置"""
+        slots = set()
+        for param in params:
+            if isinstance(param, int):
+                slots.add(param)
+            else:
+                # 区域参数：用位置序号代替值取出区域包含的位置
+                slots.update(param(range(len(self.values))))
+        return slots
+
+    def _run(self, indexes):
+        """按拓扑顺序重算计划中的公式，求值出错时单元格的值为对应的错误值"""
+        values = self.values
+        plan = self.plan
+        for index in indexes:
+            slot, function, params = plan[index]
+            try:
+                values[slot] = function(values, *params)
+            except ExcelError as e:
+                values[slot] = e
+            except ZeroDivisionError:
+                values[slot] = DIV0
+            except (ValueError, OverflowError):
+                values[slot] = NUM
+            except (TypeError, IndexError):
+                values[slot] = VALUE
+
+    def recalculate(self):
+        """
+        按拓扑顺序重算依赖锥中的全部公式
+
+        Returns:
+            float: 用时（秒）
+        """
+        start = time.perf_counter()
+        self._run(range(len(self.plan)))
+        return time.perf_counter() - start
+
+    def affected_formulas(self, slots):
+        """
+        修改一组位置后需要重算的公式
+
+        Args:
+            slots (iterable): 修改的位置
+
+        Returns:
+            list: 按拓扑顺序的公式序号
+        """
+        key = frozenset(slots)
+        affected = self._affected.get(key)
+        if affected is None:
+            found = set()
+            pending = list(key)
+            while pending:
+                for index in self._dependents.get(pending.pop(), ()):
+                    if index not in found:
+                        found.add(index)
+                        pending.append(self.plan[index][0])
+            affected = sorted(found)
+            self._affected[key] = affected
+        return affected
+
+    def upstream_formulas(self, slots):
+        """
+        计算一组位置的值所需的全部公式
+
+        Args:
+            slots (iterable): 位置
+
+        Returns:
+            set: 公式在重算计划中的序号
+        """
+        if self._formula_indexes is None:
+            self._formula_indexes = {slot: index for index, (slot, _, _) in enumerate(self.plan)}
+        found = set()
+        pending = list(slots)
+        while pending:
+            index = self._formula_indexes.get(pending.pop())
+            if index is not None and index not in found:
+                found.add(index)
+                pending.extend(self._read_slots(self.plan[index][2]))
+        return found
+
+    def cone_formulas(self, input_slots, output_slots):
+        """
+        连接输入和输出的公式：受输入影响且输出依赖的公式，只修改这些输入、只读取这些输出时只需重算它们
+
+        Returns:
+            list: 按拓扑顺序的公式序号
+        """
+        return sorted(set(self.affected_formulas(input_slots)) & self.upstream_formulas(output_slots))
+
+    def input_slot(self, name):
+        """输入单元格名称（如'Sheet1!A1'，可省略$）对应的位置"""
+        sheet_name, address = name.rsplit('!', 1)
+        sheet_name = sheet_name.strip("'")
+        row, col = coordinate_to_tuple(address.replace('$', '').upper())
+        slot = self.inputs.get(f"{sheet_name}!{get_column_letter(col)}{row}")
+        if slot is None:
+            raise KeyError(f"{name} 不是输出单元格依赖的输入单元格")
+        return slot
+
+    def set_inputs(self, changes):
+        """
+        修改输入单元格的值，只重算受影响的公式
+
+        Args:
+            changes (dict): 输入单元格名称 -> 新值
+
+        Returns:
+            float: 重算用时（秒）
+
+        Raises:
+            KeyError: 单元格不是依赖锥中的输入单元格
+        """
+        slots = [self.input_slot(name) for name in changes]
+        start = time.perf_counter()
+        for slot, value in zip(slots, changes.values()):
+            self.values[slot] = to_cell_value(value)
+        self._run(self.affected_formulas(slots))
+        return time.perf_counter() - start
+
+    def what_if(self, changes):
+        """
+        计算修改输入单元格后的输出值，完成后恢复原来的值
+
+        Args:
+            changes (dict): 输入单元格名称 -> 新值
+
+        Returns:
+            dict: 输出单元格名称 -> 修改后的值
+        """
+        previous = {name: self.values[self.input_slot(name)] for name in changes}
+        self.set_inputs(changes)
+        try:
+            return self.output_values()
+        finally:
+            self.set_inputs(previous)
+
+    def reset(self):
+        """恢复加载时的值（公式单元格为缓存的计算结果）"""
+        self.values[:] = self.initial_values
+
+    def get_value(self, name):
+        """
+        Args:
+            name (str): 单元格名称，如'Sheet1!A1'
+
+        Returns:
+            单元格的当前值，错误值为ExcelError
+        """
+        return self.values[self.cell_slot(name)]
+
+    def cell_slot(self, name):
+        """
+        单元格名称（如'Sheet1!A1'，可省略$）对应的位置
+
+        Raises:
+            KeyError: 单元格不在依赖锥中
+        """
+        sheet_name, address = name.rsplit('!', 1)
+        row, col = coordinate_to_tuple(address.replace('$', '').upper())
+        slot = self.slots.get((sheet_name.strip("'"), row, col))
+        if slot is None:
+            raise KeyError(f"{name} 不在输出单元格的依赖锥中")
+        return slot
+
+    def output_values(self):
+        """
+        Returns:
+            dict: 输出单元格名称 -> 当前值
+        """
+        return {name: self.values[slot] for name, slot in self.outputs.items()}
+
+    def validate(self, rel_tol=1e-9, abs_tol=1e-9):
+        """
+        重算全部公式并与工作簿中缓存的计算结果比较
+
+        Args:
+            rel_tol (float): 数值比较的相对误差
+            abs_tol (float): 数值比较的绝对误差
+
+        Returns:
+            dict: checked（比较的单元格数）、matched、mismatches（[(名称, 缓存值, 重算值), ...]）、
+                  missing（没有缓存值的公式单元格数）
+        """
+        self.recalculate()
+        checked = matched = missing = 0
+        mismatches = []
+        for slot, _, _ in self.plan:
+            expected = self.initial_values[slot]
+            actual = self.values[slot]
+            if expected is None:
+                missing += 1
+                continue
+            checked += 1
+            if values_match(expected, actual, rel_tol, abs_tol):
+                matched += 1
+            else:
+                mismatches.append((self.names[slot], expected, actual))
+        return {'checked': checked, 'matched': matched, 'mismatches': mismatches, 'missing': missing}
+
+
+def values_match(expected, actual, rel_tol=1e-9, abs_tol=1e-9):
+    """缓存值与重算值是否一致，数值按误差比较，错误值按错误代码比较"""
+    if isinstance(expected, bool) or isinstance(actual, bool):
+        return expected == actual
+    if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+        return math.isclose(expected, actual, rel_tol=rel_tol, abs_tol=abs_tol)
+    if isinstance(expected, ExcelError) or isinstance(actual, ExcelError):
+        return str(expected) == str(actual)
+    return expected == actual
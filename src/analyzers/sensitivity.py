@@ -0,0 +1,164 @@
+"""输入单元格对输出单元格的敏感度分析，一次批量计算得到全部偏导数"""
+
+import time
+
+import numpy as np
+
+from .batch_engine import BatchEngine
+
+# 中心差分的相对步长，约为机器精度的立方根，使截断误差和舍入误差相当
+RELATIVE_STEP = 6e-6
+
+
+class SensitivityMatrix:
+    def __init__(self, inputs, outputs, base_inputs, base_outputs, derivatives, reachable):
+        """
+        敏感度矩阵，行对应输出单元格、列对应输入单元格
+
+        Args:
+            inputs (list): 输入单元格名称
+            outputs (list): 输出单元格名称
+            base_inputs (numpy.ndarray): 输入单元格的当前值
+            base_outputs (numpy.ndarray): 输出单元格的当前值，非数值为NaN
+            derivatives (numpy.ndarray): 偏导数矩阵，输出单元格在该点无法求值时为NaN
+            reachable (numpy.ndarray): 输出单元格是否依赖该输入单元格（依赖锥中存在路径）
+        """
+        self.inputs = inputs
+        self.outputs = outputs
+        self.base_inputs = base_inputs
+        self.base_outputs = base_outputs
+        self.derivatives = derivatives
+        self.reachable = reachable
+
+    @property
+    def elasticities(self):
+        """
+        弹性矩阵：输入变化1%时输出变化的百分比，用于比较量纲不同的输入单元格
+
+        Returns:
+            numpy.ndarray: 输入或输出当前值为0时为NaN
+        """
+        with np.errstate(all='ignore'):
+            elasticities = self.derivatives * self.base_inputs[None, :] / self.base_outputs[:, None]
+        return np.where(np.isfinite(elasticities), elasticities, np.nan)
+
+    def ranked(self, output):
+        """
+        按影响大小排列一个输出单元格依赖的输入单元格
+
+        影响大小为输入变化1%时输出的变化量（偏导数×输入值），输入当前值为0时取偏导数的绝对值
+
+        Args:
+            output (str): 输出单元格名称
+
+        Returns:
+            list: [(输入单元格名称, 偏导数, 弹性), ...]，按影响从大到小排列
+        """
+        row = self.outputs.index(output)
+        elasticities = self.elasticities[row]
+        impact = np.abs(self.derivatives[row] * np.where(self.base_inputs == 0, 1, self.base_inputs))
+        columns = [column for column in np.flatnonzero(self.reachable[row]) if not np.isnan(impact[column])]
+        columns.sort(key=lambda column: -impact[column])
+        return [(self.inputs[column], self.derivatives[row, column], elasticities[column]) for column in columns]
+
+    def iter_rows(self):
+        """
+        按输出单元格、影响大小顺序遍历敏感度表
+
+        Yields:
+            dict: 输出单元格、排名、输入单元格、偏导数、弹性
+        """
+        for output in self.outputs:
+            for rank, (name, derivative, elasticity) in enumerate(self.ranked(output), 1):
+                yield {'输出单元格': output, '排名': rank, '输入单元格': name, '偏导数': derivative, '弹性': elasticity}
+
+
+def compute_sensitivity(engine, inputs=None, relative_step=RELATIVE_STEP):
+    """
+    用批量中心差分计算全部输出单元格对输入单元格的偏导数
+
+    每个输入单元格向上、向下各扰动一次，全部扰动情景在BatchEngine中一次按数组计算，
+    而不是逐个输入单元格修改后重算；影响范围不重叠的输入单元格共用同一对情景
+
+    Args:
+        engine (RecalcEngine): 重算引擎，以其当前值为计算点
+        inputs (list): 可选，要分析的输入单元格名称，默认为全部数值输入单元格
+        relative_step (float): 扰动步长相对输入值的比例（输入值为0时为绝对步长）
+
+    Returns:
+        SensitivityMatrix: 敏感度矩阵
+    """
+    start = time.perf_counter()
+    engine.recalculate()
+    if inputs is None:
+        inputs = [
+            name for name, slot in engine.inputs.items()
+            if isinstance(engine.values[slot], (int, float)) and not isinstance(engine.values[slot], bool)
+        ]
+    outputs = list(engine.outputs)
+    base_inputs = np.array([float(engine.get_value(name)) for name in inputs])
+    base_outputs = np.array([_as_float(engine.values[slot]) for slot in engine.outputs.values()])
+
+    # 受影响的公式互不相交的输入单元格可以在同一情景中同时扰动（稀疏雅可比矩阵的列压缩），
+    # 每组一个向上、一个向下扰动的情景
+    count = len(inputs)
+    affected = [set(engine.affected_formulas([engine.inputs[name]])) for name in inputs]
+    groups = group_independent_inputs(affected)
+    steps = relative_step * np.maximum(np.abs(base_inputs), 1.0)
+    columns = np.tile(base_inputs, (2 * len(groups), 1))
+    for group, members in enumerate(groups):
+        columns[group, members] += steps[members]
+        columns[len(groups) + group, members] -= steps[members]
+    results = BatchEngine(engine).evaluate({name: columns[:, index] for index, name in enumerate(inputs)})
+
+    # 只有依赖锥中存在路径的输入单元格才会影响输出
+    output_rows = {slot: row for row, slot in enumerate(engine.outputs.values())}
+    reachable = np.zeros((len(outputs), count), dtype=bool)
+    for column, indexes in enumerate(affected):
+        for index in indexes:
+            row = output_rows.get(engine.plan[index][0])
+            if row is not None:
+                reachable[row, column] = True
+
+    derivatives = np.zeros((len(outputs), count))
+    for row, output in enumerate(outputs):
+        values = np.array([_as_float(value) for value in results[output]])
+        differences = (values[:len(groups)] - values[len(groups):])
+        for group, members in enumerate(groups):
+            members = [column for column in members if reachable[row, column]]
+            derivatives[row, members] = differences[group] / (2 * steps[members])
+
+    print(f'敏感度分析：{len(outputs)} 个输出单元格 × {count} 个输入单元格，'
+          f'{2 * len(groups)} 个扰动情景，用时 {time.perf_counter() - start:.3f} 秒')
+    return SensitivityMatrix(inputs, outputs, base_inputs, base_outputs, derivatives, reachable)
+
+
+def group_independent_inputs(affected):
+    """
+    把输入单元格贪心分组，同一组中各输入单元格影响的公式互不相交
+
+    Args:
+        affected (list): 每个输入单元格影响的公式序号集合
+
+    Returns:
+        list: 每组输入单元格在affected中的序号列表
+    """
+    groups = []
+    used = []  # 每组已影响的公式
+    for column in sorted(range(len(affected)), key=lambda column: -len(affected[column])):
+        for group, formulas in enumerate(used):
+            if formulas.isdisjoint(affected[column]):
+                groups[group].append(column)
+                formulas.update(affected[column])
+                break
+        else:
+            groups.append([column])
+            used.append(set(affected[column]))
+    return groups
+
+
+def _as_float(value):
+    """数值转换为float，错误值、文本等为NaN"""
+    if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+        return float(value)
+    return np.nan
@@ -0,0 +1,615 @@
+"""分析结果的本地持久化缓存，按工作簿内容哈希和工具版本失效"""
+
+import datetime
+import hashlib
+import hmac
+import os
+import pickle
+import sqlite3
+from bisect import bisect_left, bisect_right
+
+from openpyxl.utils import range_boundaries
+
+from ..extractors.header_resolver import header_text
+from ..utils.cell_utils import is_numeric, is_yellow_cell
+
+# 分析逻辑或结果格式变化时需要递增，旧缓存会整体失效
+TOOL_VERSION = '0.1.7'
+
+
+def file_digest(path):
+    """
+    计算文件内容的SHA-256摘要
+
+    Args:
+        path (str): 文件路径
+
+    Returns:
+        str: 十六进制摘要
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def default_cache_dir():
+    """
+    当前用户的缓存目录，只有当前用户可以读写
+
+    Returns:
+        str: 目录路径（$XDG_CACHE_HOME/excel-formula-parser，Windows下为%LOCALAPPDATA%/excel-formula-parser）
+    """
+    base = os.environ.get('LOCALAPPDATA') if os.name == 'nt' else os.environ.get('XDG_CACHE_HOME')
+    base = base or os.path.join(os.path.expanduser('~'), '.cache')
+    path = os.path.join(base, 'excel-formula-parser')
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    return path
+
+
+def default_cache_path(excel_path, cache_dir=None):
+    """
+    工作簿对应的缓存文件路径，按工作簿的绝对路径区分
+
+    Args:
+        excel_path (str): Excel文件路径
+        cache_dir (str): 缓存目录，默认为default_cache_dir()
+
+    Returns:
+        str: 缓存文件路径
+    """
+    absolute = os.path.abspath(excel_path)
+    name = hashlib.sha256(absolute.encode('utf-8', 'surrogateescape')).hexdigest()[:16]
+    return os.path.join(cache_dir or default_cache_dir(), f"{name}-{os.path.basename(absolute)}.analysis.sqlite")
+
+
+def _load_key(cache_dir):
+    """
+    读取（首次使用时生成）缓存目录中的签名密钥
+
+    Args:
+        cache_dir (str): 缓存目录
+
+    Returns:
+        bytes: 32字节随机密钥
+    """
+    path = os.path.join(cache_dir, 'cache.key')
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path, 'rb') as f:
+            key = f.read()
+        if len(key) == 32:
+            return key
+        # 密钥文件损坏：重新生成，用旧密钥签名的缓存内容随之失效
+        os.remove(path)
+        return _load_key(cache_dir)
+    key = os.urandom(32)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key)
+    return key
+
+
+def _snapshot_value(value):
+    """把单元格值转换为可比较、可序列化的形式（如数组公式对象取其公式文本）"""
+    if value is None or isinstance(value, (str, int, float, bool, datetime.date, datetime.time, datetime.timedelta)):
+        return value
+    return repr(getattr(value, 'text', value))
+
+
+def sheet_snapshot(worksheet, sheet_values=None, is_yellow=is_yellow_cell):
+    """
+    记录工作表中影响分析结果的内容，用于与下次运行时的工作簿逐单元格比较：
+    单元格值、公式缓存值、是否黄色背景、合并单元格以及工作表范围
+
+    Args:
+        worksheet: openpyxl工作表对象
+        sheet_values: 该工作表公式单元格的缓存值 {(行号, 列号): 值}
+        is_yellow: 判断单元格是否为黄色背景的函数
+
+    Returns:
+        dict: {'cells': {(行号, 列号): (值, 缓存值, 是否黄色)}, 'merged': 合并区域, 'dimensions': (最大行号, 最大列号)}
+    """
+    sheet_values = sheet_values or {}
+    cells = {}
+    for key, cell in worksheet._cells.items():
+        cells[key] = (_snapshot_value(cell.value), _snapshot_value(sheet_values.get(key)), is_yellow(cell))
+    max_row = max((row for row, _ in cells), default=1)
+    max_column = max((col for _, col in cells), default=1)
+    return {
+        'cells': cells,
+        'merged': tuple(sorted(str(merged_range) for merged_range in worksheet.merged_cells.ranges)),
+        'dimensions': (max_row, max_column),
+    }
+
+
+def _header_role(value):
+    """
+    单元格值在标题查找中的作用：None（不能作为标题）、('number', 文本)或('text', 文本)
+    """
+    text = header_text(value)
+    if text is None:
+        return None
+    return ('number', text) if is_numeric(text) else ('text', text)
+
+
+class SheetChanges:
+    def __init__(self, whole=False):
+        """
+        一个工作表相对上次快照的变化范围
+
+        单元格的标题只取决于其左侧、上方的单元格、合并单元格以及右侧一列是否为空，
+        因此一个单元格的变化只影响有限的区域：
+        - 文本标题变化（或表格名称所在的合并单元格变化）影响其右下方（含同行同列）的全部单元格
+        - 数字变化只影响同列下方单元格的数字序号标题
+        - 某列由空变为非空（或相反）影响其左侧一列的全部单元格
+        - 工作表范围变化时，两次范围交集以外的单元格都视为变化
+
+        Args:
+            whole (bool): 整个工作表都视为变化（首次分析、合并单元格或工作表集合变化）
+        """
+        self.whole = whole
+        self.cells = set()  # 值、缓存值或背景色变化的单元格 (行号, 列号)
+        self.corners = []  # 右下方标题可能变化的起点 (行号, 列号)
+        self.columns = {}  # 列号 -> 该列中从此行开始的单元格标题可能变化
+        self.box = None  # 工作表范围变化时两次范围的交集 (最大行号, 最大列号)
+        self._index = None
+
+    @classmethod
+    def diff(cls, old, new):
+        """
+        比较同一工作表的两次快照
+
+        Args:
+            old (dict): 上次运行的快照，可以为None
+            new (dict): 本次运行的快照
+
+        Returns:
+            SheetChanges: 变化范围
+        """
+        if old is None or old['merged'] != new['merged']:
+            return cls(whole=True)
+        changes = cls()
+        anchors = {range_boundaries(merged)[1::-1] for merged in new['merged']}
+        old_cells, new_cells = old['cells'], new['cells']
+        for key in old_cells.keys() | new_cells.keys():
+            old_record, new_record = old_cells.get(key), new_cells.get(key)
+            if old_record == new_record:
+                continue
+            changes.cells.add(key)
+            old_value = old_record[0] if old_record else None
+            new_value = new_record[0] if new_record else None
+            if old_value == new_value:
+                continue
+            old_role, new_role = _header_role(old_value), _header_role(new_value)
+            kinds = {role[0] for role in (old_role, new_role) if role is not None}
+            if key in anchors or (old_role != new_role and 'text' in kinds):
+                changes.corners.append(key)
+            elif old_role != new_role:
+                row, col = key
+                changes.columns[col] = min(changes.columns.get(col, row), row)
+
+        old_columns = {col for (_, col), record in old_cells.items() if record[0]}
+        new_columns = {col for (_, col), record in new_cells.items() if record[0]}
+        for col in old_columns ^ new_columns:
+            if col > 1:
+                changes.columns[col - 1] = 1
+
+        if old['dimensions'] != new['dimensions']:
+            changes.box = tuple(map(min, old['dimensions'], new['dimensions']))
+        return changes
+
+    def __bool__(self):
+        return bool(self.whole or self.cells or self.corners or self.columns or self.box)
+
+    def _get_index(self):
+        """按行排序的起点及其前缀最小列号，和按列分组的变化单元格，用于二分查找"""
+        if self._index is None:
+            corners = sorted(self.corners)
+            corner_rows = [row for row, _ in corners]
+            corner_cols = []
+            for _, col in corners:
+                corner_cols.append(min(col, corner_cols[-1]) if corner_cols else col)
+            cells_by_column = {}
+            for row, col in self.cells:
+                cells_by_column.setdefault(col, []).append(row)
+            for rows in cells_by_column.values():
+                rows.sort()
+            self._index = (corner_rows, corner_cols, sorted(cells_by_column), cells_by_column)
+        return self._index
+
+    def affects_cell(self, row, col):
+        """
+        判断单元格的内容或标题是否可能变化
+
+        Args:
+            row (int): 行号
+            col (int): 列号
+
+        Returns:
+            bool: 是否受影响
+        """
+        if self.whole or (row, col) in self.cells:
+            return True
+        if self.box is not None and (row > self.box[0] or col > self.box[1]):
+            return True
+        start = self.columns.get(col)
+        if start is not None and row >= start:
+            return True
+        corner_rows, corner_cols, _, _ = self._get_index()
+        position = bisect_right(corner_rows, row)
+        return position > 0 and corner_cols[position - 1] <= col
+
+    def affects_range(self, min_row, min_col, max_row, max_col):
+        """
+        判断区域中是否有单元格可能变化
+
+        Args:
+            min_row, min_col, max_row, max_col: 区域范围，整行或整列引用中缺少的一维为None
+
+        Returns:
+            bool: 是否受影响
+        """
+        if self.whole:
+            return True
+        min_row, min_col = min_row or 1, min_col or 1
+        max_row = max_row if max_row is not None else float('inf')
+        max_col = max_col if max_col is not None else float('inf')
+        if self.box is not None and (max_row > self.box[0] or max_col > self.box[1]):
+            return True
+        if any(min_col <= col <= max_col and start <= max_row for col, start in self.columns.items()):
+            return True
+        corner_rows, corner_cols, _, _ = self._get_index()
+        position = bisect_right(corner_rows, max_row)
+        if position > 0 and corner_cols[position - 1] <= max_col:
+            return True
+        return self.has_changed_cells(min_row, min_col, max_row, max_col)
+
+    def has_changed_cells(self, min_row, min_col, max_row, max_col):
+        """
+        判断区域中是否有值、缓存值或背景色变化的单元格（不考虑标题变化）
+
+        Args:
+            min_row, min_col, max_row, max_col: 区域范围
+
+        Returns:
+            bool: 是否有变化的单元格
+        """
+        if self.whole:
+            return True
+        _, _, columns, cells_by_column = self._get_index()
+        for col in columns[bisect_left(columns, min_col):bisect_right(columns, max_col)]:
+            rows = cells_by_column[col]
+            if bisect_left(rows, min_row) < bisect_right(rows, max_row):
+                return True
+        return False
+
+    def summary(self):
+        """变化情况的简要说明"""
+        if self.whole:
+            return '全部'
+        return f"{len(self.cells)} 个单元格"
+
+
+class AnalysisCache:
+    def __init__(self, excel_path, cache_path=None):
+        """
+        打开（或创建）工作簿的SQLite分析缓存
+
+        缓存分两级：
+        1. 整个文件的摘要未变化时，直接返回上次运行的完整结果，无需加载工作簿
+        2. 文件变化时，与上次运行的快照逐单元格比较（diff），只重新计算受影响的
+           标题缓存条目和输入/输出单元格，只重建依赖图中受影响的节点，
+           只重新分析依赖锥与变化范围相交的输出单元格
+
+        本次运行的写入在save_run时与新的快照一起提交到同一事务，中途出错时缓存仍与上次的快照保持一致；
+        依赖分析结果数量与输出单元格数量成正比，逐个写入尚未提交的事务，不在内存中保留
+
+        缓存内容用pickle序列化，读取前必须确认来源可信：缓存文件放在当前用户的缓存目录中，
+        而不是工作簿旁边（共享或下载的工作簿旁边可能被他人放入任意文件），
+        每条记录都带有用该目录中的密钥计算的HMAC，签名不符的记录视为没有缓存
+
+        Args:
+            excel_path (str): Excel文件路径
+            cache_path (str): 缓存文件路径，默认为default_cache_path(excel_path)
+        """
+        self.excel_path = excel_path
+        self.cache_path = cache_path or default_cache_path(excel_path)
+        self._key = _load_key(os.path.dirname(os.path.abspath(self.cache_path)))
+        self.conn = sqlite3.connect(self.cache_path)
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS snapshots (sheet TEXT PRIMARY KEY, data BLOB);
+            CREATE TABLE IF NOT EXISTS sheet_parts (
+                sheet TEXT, part TEXT, data BLOB,
+                PRIMARY KEY (sheet, part)
+            );
+            CREATE TABLE IF NOT EXISTS analyses (
+                sheet TEXT, cell TEXT, cone BLOB, data BLOB,
+                PRIMARY KEY (sheet, cell)
+            );
+            CREATE TABLE IF NOT EXISTS graphs (id INTEGER PRIMARY KEY, data BLOB);
+            CREATE TABLE IF NOT EXISTS runs (file_digest TEXT PRIMARY KEY, data BLOB);
+        ''')
+        if self._get_meta('tool_version') != TOOL_VERSION:
+            self.clear()
+            self._set_meta('tool_version', TOOL_VERSION)
+        self.file_digest = file_digest(excel_path)
+        self.snapshots = None  # 本次运行的快照，由diff设置
+        self.sheet_changes = {}  # 工作表名 -> SheetChanges
+        self._pending_parts = {}  # (工作表名, 内容名称) -> 数据
+        self._pending_analyses = set()  # 本次写入的(工作表名, 单元格地址)
+        self._pending_graph = None
+
+    def _dumps(self, value):
+        """序列化缓存内容，并在前面加上HMAC签名"""
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        return hmac.new(self._key, data, hashlib.sha256).digest() + data
+
+    def _verify(self, blob):
+        """判断记录的签名是否与本机密钥一致"""
+        signature, data = blob[:32], blob[32:]
+        return hmac.compare_digest(signature, hmac.new(self._key, data, hashlib.sha256).digest())
+
+    def _loads(self, blob):
+        """
+        校验签名后反序列化缓存内容
+
+        Returns:
+            缓存内容，签名不符时返回None
+        """
+        if not self._verify(blob):
+            return None
+        return pickle.loads(blob[32:])
+
+    def close(self):
+        """关闭缓存数据库"""
+        self.conn.close()
+
+    def clear(self):
+        """清空所有缓存内容"""
+        with self.conn:
+            for table in ('meta', 'snapshots', 'sheet_parts', 'analyses', 'graphs', 'runs'):
+                self.conn.execute(f'DELETE FROM {table}')
+
+    def _get_meta(self, key):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    def load_run(self):
+        """
+        文件未变化时读取上次运行的完整结果
+        
+        Returns:
+            dict: 包含input_cells、output_cells、header_index（旧版本保存的结果中可能为None）的结果，
+                  依赖分析结果由iter_run_formulas逐个读取；
+                  文件变化或无缓存时返回None
+        """
+        row = self.conn.execute(
+            'SELECT data FROM runs WHERE file_digest = ?', (self.file_digest,)
+        ).fetchone()
+        if row is None:
+            return None
+        run = self._loads(row[0])
+        if run is None:
+            return None
+        for item in run['output_cells']:
+            analysis = self.conn.execute(
+                'SELECT data FROM analyses WHERE sheet = ? AND cell = ?', (item['工作表'], item['单元格'])
+            ).fetchone()
+            if analysis is None or not self._verify(analysis[0]):
+                return None
+        return run
+
+    def iter_run_formulas(self, run):
+        """
+        按输出单元格的顺序逐个读取上次运行的依赖分析结果
+        
+        Args:
+            run (dict): load_run的返回值
+            
+        Yields:
+            dict: 分析结果
+        """
+        for item in run['output_cells']:
+            row = self.conn.execute(
+                'SELECT data FROM analyses WHERE sheet = ? AND cell = ?', (item['工作表'], item['单元格'])
+            ).fetchone()
+            yield self._loads(row[0])
+
+    def diff(self, snapshots):
+        """
+        与上次运行的快照逐工作表比较
+
+        工作表被添加、删除或改名时，对其他工作表的引用也可能由无效变为有效（或相反），
+        此时所有工作表都视为整体变化
+
+        Args:
+            snapshots (dict): 工作表名 -> 本次运行的快照（sheet_snapshot的结果）
+
+        Returns:
+            dict: 工作表名 -> SheetChanges
+        """
+        previous = {
+            sheet: data for sheet, data in self.conn.execute('SELECT sheet, data FROM snapshots')
+        }
+        self.snapshots = snapshots
+        if set(previous) != set(snapshots):
+            self.sheet_changes = {sheet: SheetChanges(whole=True) for sheet in snapshots}
+        else:
+            self.sheet_changes = {
+                sheet: SheetChanges.diff(self._loads(previous[sheet]), snapshot)
+                for sheet, snapshot in snapshots.items()
+            }
+        return self.sheet_changes
+
+    def get_sheet_part(self, sheet_name, part):
+        """
+        读取上次运行保存的工作表级缓存，是否仍然有效由调用方根据sheet_changes判断
+
+        Args:
+            sheet_name (str): 工作表名称
+            part (str): 缓存内容名称，如'headers'、'input_cells'、'output_cells'
+
+        Returns:
+            缓存内容，无缓存时返回None
+        """
+        row = self.conn.execute(
+            'SELECT data FROM sheet_parts WHERE sheet = ? AND part = ?', (sheet_name, part)
+        ).fetchone()
+        return self._loads(row[0]) if row else None
+
+    def put_sheet_part(self, sheet_name, part, data):
+        """写入工作表级缓存（在save_run时保存）"""
+        self._pending_parts[(sheet_name, part)] = data
+
+    def _cone_affected(self, cone):
+        """判断依赖锥是否与本次的变化范围相交"""
+        for sheet_name, (cells, ranges) in cone.items():
+            changes = self.sheet_changes.get(sheet_name)
+            if not changes:
+                # 引用了不存在的工作表：工作表集合变化时所有工作表都视为整体变化，此处无需判断
+                continue
+            if any(changes.affects_cell(row, col) for row, col in cells):
+                return True
+            if any(changes.affects_range(*bounds) for bounds in ranges):
+                return True
+        return False
+
+    def has_analysis(self, sheet_name, cell_address):
+        """
+        判断输出单元格是否有可以复用的依赖分析结果，不读取结果本身
+        
+        Args:
+            sheet_name (str): 工作表名称
+            cell_address (str): 单元格地址
+            
+        Returns:
+            bool: 有上次的结果且依赖锥中的单元格（含其标题）都未变化时返回True
+        """
+        row = self.conn.execute(
+            'SELECT cone, data FROM analyses WHERE sheet = ? AND cell = ?', (sheet_name, cell_address)
+        ).fetchone()
+        if row is None or not self._verify(row[1]):
+            return False
+        cone = self._loads(row[0])
+        return cone is not None and not self._cone_affected(cone)
+
+    def get_analysis(self, sheet_name, cell_address):
+        """
+        读取输出单元格的依赖分析结果
+
+        Args:
+            sheet_name (str): 工作表名称
+            cell_address (str): 单元格地址
+
+        Returns:
+            dict: 分析结果，依赖锥中任一单元格（含其标题）可能变化时返回None
+        """
+        row = self.conn.execute(
+            'SELECT cone, data FROM analyses WHERE sheet = ? AND cell = ?', (sheet_name, cell_address)
+        ).fetchone()
+        if row is None:
+            return None
+        cone = self._loads(row[0])
+        if cone is None or self._cone_affected(cone):
+            return None
+        return self._loads(row[1])
+
+    def put_analysis(self, sheet_name, cell_address, cone, data):
+        """
+        写入输出单元格的依赖分析结果，写入尚未提交的事务，在save_run时一起提交
+
+        Args:
+            sheet_name (str): 工作表名称
+            cell_address (str): 单元格地址
+            cone (dict): 依赖锥，工作表名 -> (单元格(行号, 列号)列表, 区域(起始行, 起始列, 结束行, 结束列)列表)
+            data (dict): 分析结果
+        """
+        self.conn.execute(
+            'INSERT OR REPLACE INTO analyses (sheet, cell, cone, data) VALUES (?, ?, ?, ?)',
+            (sheet_name, cell_address, self._dumps(cone), self._dumps(data))
+        )
+        self._pending_analyses.add((sheet_name, cell_address))
+
+    def load_graph(self):
+        """
+        读取上次运行保存的工作簿级依赖图
+
+        Returns:
+            DependencyGraph: 与上次快照一致的依赖图，无缓存时返回None
+        """
+        row = self.conn.execute('SELECT data FROM graphs WHERE id = 0').fetchone()
+        return self._loads(row[0]) if row else None
+
+    def put_graph(self, graph):
+        """保存与本次快照一致的依赖图（在save_run时保存）"""
+        self._pending_graph = graph
+
+    def save_run(self, input_cells, output_cells, header_index=None):
+        """
+        在同一事务中保存本次运行的快照、工作表级缓存、依赖分析结果和完整结果
+
+        依赖锥受本次变化影响而未重新分析的结果会被删除；
+        本次没有更新依赖图且工作簿有变化时，删除保存的依赖图
+
+        Args:
+            input_cells (list): 输入单元格信息列表
+            output_cells (list): 输出单元格信息列表（会去掉单元格对象），依赖分析结果已由put_analysis写入
+            header_index (HeaderIndex): 可选，本次运行构建的标题索引，与完整结果一起保存
+        """
+        data = {
+            'input_cells': input_cells,
+            'output_cells': [{k: v for k, v in item.items() if k != 'cell'} for item in output_cells],
+            'header_index': header_index,
+        }
+        graph = None
+        if self._pending_graph is not None:
+            try:
+                graph = self._dumps(self._pending_graph)
+            except (pickle.PicklingError, TypeError, AttributeError):
+                # 依赖图中保存的异常无法序列化时不保存，下次运行重新构建
+                graph = None
+        changed = any(self.sheet_changes.values())
+        stale = []
+        if changed:
+            for sheet, cell, cone in self.conn.execute('SELECT sheet, cell, cone FROM analyses'):
+                if (sheet, cell) in self._pending_analyses:
+                    continue
+                cone = self._loads(cone)
+                if cone is None or self._cone_affected(cone):
+                    stale.append((sheet, cell))
+        with self.conn:
+            if self.snapshots is not None:
+                self.conn.execute('DELETE FROM snapshots')
+                self.conn.executemany(
+                    'INSERT INTO snapshots (sheet, data) VALUES (?, ?)',
+                    [(sheet, self._dumps(snapshot)) for sheet, snapshot in self.snapshots.items()]
+                )
+                self.conn.execute(
+                    f"DELETE FROM sheet_parts WHERE sheet NOT IN ({','.join('?' * len(self.snapshots))})",
+                    list(self.snapshots)
+                )
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO sheet_parts (sheet, part, data) VALUES (?, ?, ?)',
+                [(sheet, part, self._dumps(value))
+                 for (sheet, part), value in self._pending_parts.items()]
+            )
+            self.conn.executemany('DELETE FROM analyses WHERE sheet = ? AND cell = ?', stale)
+            if graph is not None:
+                self.conn.execute('INSERT OR REPLACE INTO graphs (id, data) VALUES (0, ?)', (graph,))
+            elif changed or self._pending_graph is not None:
+                self.conn.execute('DELETE FROM graphs')
+            self.conn.execute('DELETE FROM runs')
+            self.conn.execute(
+                'INSERT INTO runs (file_digest, data) VALUES (?, ?)',
+                (self.file_digest, self._dumps(data))
+            )
+        self._pending_parts.clear()
+        self._pending_analyses.clear()
+        self._pending_graph = None
@@ -1,49 +1,140 @@
 """Excel公式提取器，用于提取和分析公式"""
 
 import re
-from openpyxl.utils import get_column_letter, column_index_from_string
-from ..utils.cell_utils import is_yellow_cell, is_blue_cell, get_cell_address
+import sys
+from array import array
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from bisect import bisect_left, bisect_right
+from openpyxl.utils import get_column_letter, column_index_from_string, coordinate_to_tuple, range_boundaries
+from ..utils.cell_utils import is_yellow_cell, is_blue_cell, get_cell_address, get_cell_value, iter_populated_cells
+from ..utils.sheet_index import MergedCellIndex, SheetOccupancy
+from ..utils.header_index import HeaderIndex
+from ..utils.process_pool import get_fork_context, iter_in_forked_pool, run_in_forked_pool, split_into_chunks
 from .header_extractor import HeaderExtractor
-import ipdb;
-from openpyxl import load_workbook
-import networkx as nx
-import matplotlib.pyplot as plt
-
-import formulas
-#from formulas.parser.nodes import Formula, Cell
+from .tree_bundle import (
+    format_node_info, open_in_browser, render_tree_page, write_formula_tree_bundle
+)
+from .header_resolver import build_header_cache, header_snapshot, resolve_sheet_headers, resolve_snapshot_headers
+from ..loaders.workbook_loader import load_workbook_with_values
+from ..cache.analysis_cache import sheet_snapshot
+from ..analyzers.recalc_engine import RecalcEngine
+from ..analyzers.dependency_graph import (
+    DependencyGraph, EDGE_INPUT, EDGE_FORMULA, EDGE_BASIC, EDGE_INVALID_SHEET, EDGE_INVALID_CELL, EDGE_ERROR,
+    EDGE_RANGE
+)
+from ..parsers.formula_parser import (
+    FormulaParser, Reference, Function, ArrayConstant, Group, iter_references, parse_reference
+)
+from openpyxl.formula.tokenizer import Token
 
 class Node:
-    _node_counter = 0  # 类变量，用于跟踪节点数量
+    __slots__ = ('index', 'cell_name', 'original_formula', 'cell_variable_name', 'variable_expression', 'children')
     
-    def __init__(self, cell_name, original_formula, cell_variable_name, variable_expression):
-        Node._node_counter += 1
-        self.index = Node._node_counter  # 为每个节点分配唯一的索引
-        self.cell_name = cell_name
+    def __init__(self, index, cell_name, original_formula, cell_variable_name, variable_expression):
+        self.index = index  # 节点在分析会话中的编号
+        self.cell_name = sys.intern(cell_name)
         self.original_formula = original_formula 
         self.cell_variable_name = cell_variable_name
         self.variable_expression = variable_expression
-        self.children = []
+        self.children = array('l')  # 子节点编号
 
     def __str__(self):
         return f"Node({self.index}: cell={self.cell_name}, vname={self.cell_variable_name}, formula={self.original_formula}, expr={self.variable_expression})"
 
-    @classmethod
-    def reset_counter(cls):
-        """重置节点计数器"""
-        cls._node_counter = 0
+class NodeStore:
+    def __init__(self):
+        """
+        一次分析会话中的节点表
+        
+        每个单元格（以及每个无效引用）只对应一个节点，被多个输出单元格或多个公式引用时共享，
+        节点编号在会话内从1开始分配
+        """
+        self.nodes = {}  # 节点编号 -> 节点
+        self.keys = {}  # 单元格编号或无效引用说明 -> 节点编号
+    
+    def get(self, key):
+        """按单元格编号或无效引用说明查找节点，不存在时返回None"""
+        index = self.keys.get(key)
+        return self.nodes[index] if index is not None else None
+    
+    def add(self, key, cell_name, original_formula, cell_variable_name, variable_expression):
+        """
+        创建节点并分配编号
+        
+        Returns:
+            Node: 新节点
+        """
+        node = Node(len(self.nodes) + 1, cell_name, original_formula, cell_variable_name, variable_expression)
+        self.nodes[node.index] = node
+        self.keys[key] = node.index
+        return node
+    
+    def __getitem__(self, index):
+        return self.nodes[index]
+    
+    def __len__(self):
+        return len(self.nodes)
+
+def formula_to_json(formula_info):
+    """
+    把分析结果转换为可以写入JSON的字典
+    
+    基础单元格按名称排序，依赖树中的节点展开为字典，其余无法直接序列化的值转换为字符串
+    
+    Args:
+        formula_info (dict): 公式依赖分析结果
+        
+    Returns:
+        dict: 可以JSON序列化的分析结果
+    """
+    record = dict(formula_info)
+    record['基础单元格'] = sorted(formula_info['基础单元格'])
+    record['依赖树'] = [
+        {
+            '编号': node.index,
+            '单元格': node.cell_name,
+            '原始公式': node.original_formula,
+            '变量名': node.cell_variable_name,
+            '变量公式': node.variable_expression,
+            '子节点': list(node.children),
+        }
+        for node in formula_info['依赖树']
+    ]
+    return record
 
 class FormulaExtractor:
-    def __init__(self, workbook, excel_path=None):
+    def __init__(self, workbook, excel_path=None, cached_values=None, analysis_cache=None, workers=1):
         """
         初始化公式提取器
         
         Args:
             workbook: openpyxl工作簿对象
-            excel_path: Excel文件路径，用于读取实际值
+            excel_path: Excel文件路径，未提供cached_values时用于读取实际值
+            cached_values: 公式单元格的缓存计算结果，工作表名 -> {(行号, 列号): 值}，
+                           由load_workbook_with_values一次加载得到
+            analysis_cache: 可选的AnalysisCache，与上次运行的快照比较，只重新计算受变化影响的部分
+            workers: 并行进程数，大于1时标题缓存按工作表、依赖追踪和公式树页面按输出单元格在进程池中并行计算
         """
         self.workbook = workbook
         self.excel_path = excel_path
+        self.cached_values = cached_values
+        self.analysis_cache = analysis_cache
+        self.workers = workers
+        self.sheet_changes = {}  # 工作表名 -> 相对上次运行的变化范围，仅在使用分析缓存时计算
         self.header_cache = {}
+        self.merged_indexes = {}  # 工作表名 -> 合并单元格索引
+        self.occupancies = {}  # 工作表名 -> 行列占用统计
+        self.sheet_dimensions = {}  # 工作表名 -> (最大行号, 最大列号)
+        self.yellow_fills = {}  # 填充样式编号 -> 是否黄色背景
+        self.formula_parser = FormulaParser()  # 按公式文本缓存的解析结果
+        self.dependency_graph = None  # 工作簿级依赖图，首次追踪时构建
+        self.recalc_engine = None  # 输出单元格的重算引擎，首次使用时编译
+        self.header_index = None  # 输入/输出单元格的标题索引，首次使用时构建
+        self.node_store = NodeStore()  # 当前分析会话的节点表
+        self.pool_cells = None  # 并行追踪时子进程读取的输出单元格
+        self.pool_formulas = set()  # 子进程中解析的公式，用于统计不同公式的数量
         self.input_cells = []
         self.output_cells = []  # 添加输出单元格列表
         self._init_header_cache()
@@ -52,44 +143,199 @@ class FormulaExtractor:
         
     def _init_header_cache(self):
         """初始化标题缓存"""
-        wb_data = load_workbook(self.excel_path, data_only=True)
-
+        if self.cached_values is None:
+            # 未提供缓存值时重新加载一次工作簿读取公式的计算结果
+            self.cached_values = load_workbook_with_values(self.excel_path).cached_values if self.excel_path else {}
+        
+        if self.analysis_cache is not None:
+            # 与上次运行的快照逐单元格比较，确定需要重新计算的范围
+            snapshots = {
+                sheet_name: sheet_snapshot(
+                    self.workbook[sheet_name], self.cached_values.get(sheet_name), self._is_yellow_cell
+                )
+                for sheet_name in self.workbook.sheetnames
+            }
+            self.sheet_changes = self.analysis_cache.diff(snapshots)
         
+        header_caches = {}
+        pending = []  # 需要计算的工作表 (工作表名, 上次的结果, 变化范围)
         for sheet_name in self.workbook.sheetnames:
-            ws = self.workbook[sheet_name]
-            header_extractor = HeaderExtractor(ws)
-            sheet_cache = {}
-            #ipdb.set_trace()
-            # 扫描工作表中的所有单元格
-            for row in range(1, ws.max_row + 1):
-                for col in range(1, ws.max_column + 1):
-                    row_header, col_header = header_extractor.find_nearest_header(row, col, 'both')
-                    cell_key = f"{get_column_letter(col)}{row}"
-                    
-                    # 创建组合标题
-                    combined_header = None
-                    if row_header and col_header:
-                        combined_header = f"{row_header}.{col_header}"
-                    elif row_header:
-                        combined_header = row_header
-                    elif col_header:
-                        combined_header = col_header
-                        
-                        
-                    worksheet = wb_data[sheet_name]
-                    actual_value = worksheet.cell(row, col).value
-   
-   
-                    sheet_cache[cell_key] = {
-                        'row_header': row_header,
-                        'col_header': col_header,
-                        'combined_header': combined_header,
-                        'actual_value' : actual_value
-                    }
-                    
-            wb_data.close()
-            self.header_cache[sheet_name] = sheet_cache
+            previous, changes = self._get_previous_sheet_part(sheet_name, 'headers')
+            if previous is not None and not changes:
+                print(f'使用缓存的标题: {sheet_name}')
+                header_caches[sheet_name] = previous
+            else:
+                pending.append((sheet_name, previous, changes))
+        
+        if self.workers > 1 and len(pending) > 1:
+            results = self._build_header_caches_in_pool(pending)
+        else:
+            results = (
+                self._build_sheet_header_cache(self.workbook[sheet_name], previous, changes)
+                for sheet_name, previous, changes in pending
+            )
+        for (sheet_name, previous, changes), (sheet_cache, updated) in zip(pending, results):
+            if previous is not None:
+                print(f'更新标题: {sheet_name}（{changes.summary()}变化，重新计算 {updated} 个单元格）')
+            if self.analysis_cache is not None:
+                self.analysis_cache.put_sheet_part(sheet_name, 'headers', sheet_cache)
+            header_caches[sheet_name] = sheet_cache
+        
+        # 按工作表顺序保存，与是否使用缓存、是否并行无关
+        for sheet_name in self.workbook.sheetnames:
+            self.header_cache[sheet_name] = header_caches[sheet_name]
+    
+    def _get_previous_sheet_part(self, sheet_name, part):
+        """
+        查找上次运行保存的工作表级结果
+        
+        Args:
+            sheet_name: 工作表名称
+            part: 缓存内容名称
+            
+        Returns:
+            tuple: (上次的结果, 变化范围)。变化范围为空时可直接复用上次的结果；
+                   未使用分析缓存、没有上次的结果或整个工作表都已变化时返回(None, None)
+        """
+        if self.analysis_cache is None:
+            return None, None
+        changes = self.sheet_changes[sheet_name]
+        previous = self.analysis_cache.get_sheet_part(sheet_name, part)
+        if previous is None or changes.whole:
+            return None, None
+        return previous, changes
+    
+    def _get_sheet_part(self, sheet_name, part, label, build, update):
+        """
+        获取工作表级结果：工作表未变化时复用缓存，部分变化时只更新受影响的单元格，否则重新计算
+        
+        Args:
+            sheet_name: 工作表名称
+            part: 缓存内容名称
+            label: 输出提示中的内容名称
+            build: () -> 结果，完整计算
+            update: (上次的结果, SheetChanges) -> 结果，只重新计算受影响的单元格
+            
+        Returns:
+            计算或缓存的结果
+        """
+        previous, changes = self._get_previous_sheet_part(sheet_name, part)
+        if previous is not None and not changes:
+            print(f'使用缓存的{label}: {sheet_name}')
+            return previous
+        data = update(previous, changes) if previous is not None else build()
+        if self.analysis_cache is not None:
+            self.analysis_cache.put_sheet_part(sheet_name, part, data)
+        return data
+            
+    def _build_sheet_header_cache(self, ws, previous=None, changes=None):
+        """
+        计算一个工作表中所有实际存在的单元格的标题
+        
+        空白单元格的标题在查询时按需计算
+        
+        Args:
+            ws: 工作表对象
+            previous: 可选，上次运行的标题缓存，与changes一起给出时不受变化影响的单元格直接复用
+            changes: 可选，工作表相对上次运行的变化范围
+            
+        Returns:
+            tuple: (单元格地址 -> 标题信息, 重新计算的单元格数量)
+        """
+        # 公式单元格取缓存的计算结果，其他单元格取其值
+        cells, _ = header_snapshot(ws, self.cached_values.get(ws.title))
+        resolved = resolve_sheet_headers(cells, self._get_merged_index(ws), self._get_occupancy(ws))
+        return build_header_cache(cells, resolved, previous, changes)
+    
+    def _build_header_caches_in_pool(self, pending):
+        """
+        在进程池中按工作表并行计算标题缓存
+        
+        子进程只接收header_snapshot得到的紧凑快照，不传递openpyxl对象，只计算并传回各单元格的标题；
+        复用上次结果和组装缓存条目在主进程中完成。按单元格数量从多到少提交，
+        结果按pending的顺序返回，与串行计算一致
+        
+        Args:
+            pending (list): [(工作表名, 上次的结果, 变化范围), ...]
+            
+        Returns:
+            list: [(单元格地址 -> 标题信息, 重新计算的单元格数量), ...]
+        """
+        snapshots = [
+            header_snapshot(self.workbook[sheet_name], self.cached_values.get(sheet_name))
+            for sheet_name, _, _ in pending
+        ]
+        order = sorted(range(len(pending)), key=lambda i: len(snapshots[i][0]), reverse=True)
+        workers = min(self.workers, len(pending))
+        print(f'正在使用 {workers} 个进程计算 {len(pending)} 个工作表的标题...')
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {i: executor.submit(resolve_snapshot_headers, snapshots[i]) for i in order}
+            results = []
+            for i, (_, previous, changes) in enumerate(pending):
+                cells, _ = snapshots[i]
+                results.append(build_header_cache(cells, zip(*futures[i].result()), previous, changes))
+            return results
             
+    def _get_merged_index(self, worksheet):
+        """
+        获取工作表的合并单元格索引，首次访问时构建
+        
+        Args:
+            worksheet: 工作表对象
+            
+        Returns:
+            MergedCellIndex: 合并单元格索引
+        """
+        merged_index = self.merged_indexes.get(worksheet.title)
+        if merged_index is None:
+            merged_index = MergedCellIndex.from_worksheet(worksheet)
+            self.merged_indexes[worksheet.title] = merged_index
+        return merged_index
+        
+    def _get_occupancy(self, worksheet):
+        """
+        获取工作表的行列占用统计，首次访问时构建，供需要判断行列是否为空的扫描使用
+        
+        Args:
+            worksheet: 工作表对象
+            
+        Returns:
+            SheetOccupancy: 行列占用统计
+        """
+        occupancy = self.occupancies.get(worksheet.title)
+        if occupancy is None:
+            occupancy = SheetOccupancy.from_worksheet(worksheet)
+            self.occupancies[worksheet.title] = occupancy
+        return occupancy
+        
+    def _get_sheet_dimensions(self, worksheet):
+        """
+        获取工作表的最大行号和最大列号，首次访问时计算
+        
+        openpyxl每次访问max_row、max_column都会遍历全部单元格，
+        逐个判断引用是否越界时需要复用同一结果
+        
+        Args:
+            worksheet: 工作表对象
+            
+        Returns:
+            tuple: (最大行号, 最大列号)
+        """
+        dimensions = self.sheet_dimensions.get(worksheet.title)
+        if dimensions is None:
+            dimensions = (worksheet.max_row, worksheet.max_column)
+            self.sheet_dimensions[worksheet.title] = dimensions
+        return dimensions
+        
+    def _is_yellow_cell(self, cell):
+        """判断单元格是否为黄色背景，按填充样式编号缓存判断结果"""
+        fill_id = cell._style.fillId
+        is_yellow = self.yellow_fills.get(fill_id)
+        if is_yellow is None:
+            is_yellow = is_yellow_cell(cell)
+            self.yellow_fills[fill_id] = is_yellow
+        return is_yellow
+        
     def _get_cell_cached_headers(self, cell):
         sheet_name = cell.parent.title
         cell_address = cell.coordinate
@@ -106,12 +352,55 @@ class FormulaExtractor:
         Returns:
             tuple: (行标题, 列标题, 组合标题)
         """
-        if sheet_name in self.header_cache and cell_address in self.header_cache[sheet_name]:
-            headers = self.header_cache[sheet_name][cell_address]
+        sheet_cache = self.header_cache.get(sheet_name)
+        headers = sheet_cache.get(cell_address) if sheet_cache is not None else None
+        if headers is None and sheet_cache is not None:
+            headers = self._compute_blank_cell_headers(sheet_name, cell_address)
+        if headers is not None:
             return headers['row_header'], headers['col_header'], headers['combined_header'],headers['actual_value']
-        else:
-            print('没有找到缓存中的标题',sheet_name,cell_address)
-            return None, None, None
+        # 引用了不存在的工作表，没有标题；分析服务在工作线程中按需追踪时也经过这里，不打印
+        return None, None, None, None
+    
+    def _compute_blank_cell_headers(self, sheet_name, cell_address):
+        """
+        按需计算不在缓存中的空白单元格的标题，并写入缓存
+        
+        Args:
+            sheet_name: 工作表名称
+            cell_address: 单元格地址（如 'A1'）
+            
+        Returns:
+            dict: 标题信息，地址无效或超出工作表范围时返回None
+        """
+        if sheet_name not in self.workbook.sheetnames:
+            return None
+        try:
+            row, col = coordinate_to_tuple(cell_address)
+        except ValueError:
+            return None
+        ws = self.workbook[sheet_name]
+        max_row, max_column = self._get_sheet_dimensions(ws)
+        if not (1 <= row <= max_row and 1 <= col <= max_column):
+            return None
+        
+        header_extractor = HeaderExtractor(ws, self._get_merged_index(ws), self._get_occupancy(ws))
+        row_header, col_header = header_extractor.find_nearest_header(row, col, 'both')
+        combined_header = None
+        if row_header and col_header:
+            combined_header = f"{row_header}.{col_header}"
+        elif row_header:
+            combined_header = row_header
+        elif col_header:
+            combined_header = col_header
+        
+        headers = {
+            'row_header': row_header,
+            'col_header': col_header,
+            'combined_header': combined_header,
+            'actual_value': None
+        }
+        self.header_cache[sheet_name][cell_address] = headers
+        return headers
     
     def _find_table_name(self, cell, worksheet, current_row):
         """
@@ -125,94 +414,541 @@ class FormulaExtractor:
         Returns:
             str: 表格名称，如果未找到则返回None
         """
-        # 获取所有合并单元格范围
-        merged_ranges = worksheet.merged_cells.ranges
-        
-        # 获取目标单元格所在列
-        target_col = cell.column
-        
-        # 向上查找直到遇到合并单元格
-        for row in range(current_row-1, 0, -1):
-            check_cell = worksheet.cell(row=row, column=target_col)
-            
-            # 检查当前单元格是否在任何合并单元格范围内
-            for merged_range in merged_ranges:
-                if check_cell.coordinate in merged_range:
-                    # 获取合并单元格的起始单元格（左上角）的值
-                    start_cell = worksheet.cell(row=merged_range.min_row, column=merged_range.min_col)
-                    return start_cell.value if start_cell.value else None
+        # 在目标单元格所在列向上查找最近的合并单元格
+        merged = self._get_merged_index(worksheet).nearest_above(current_row, cell.column)
+        if merged is None:
+            return None
         
-        return None
+        # 获取合并单元格的起始单元格（左上角）的值
+        _, anchor_row, anchor_col = merged
+        start_value = get_cell_value(worksheet, anchor_row, anchor_col)
+        return start_value if start_value else None
     
-    def _analyze_formula_dependencies(self,cells):
+    def _analyze_formula_dependencies(self, cells, render_trees=True):
         """
         分析公式依赖关系并生成最终的计算表达式
         
+        全部分析完成后再统一生成公式树页面，workers大于1时页面在进程池中并行生成
+        
         Args:
             cells (list): 需要分析的单元格列表
-            formula_extractor: FormulaExtractor实例
+            render_trees (bool): 是否为新追踪的输出单元格逐个生成并打开公式树页面，
+                                 使用render_formula_tree_bundle批量生成时传入False
         
         Returns:
             list: 包含依赖关系的公式列表
         """
-        print("\n正在分析公式依赖关系...")
-        
-        # 创建依赖图
-        dependency_graph = {}
         final_formulas = []
+        traced_formulas = []
+        for formula_info, traced in self._iter_formula_dependencies(cells):
+            final_formulas.append(formula_info)
+            if traced:
+                traced_formulas.append(formula_info)
+        
+        # 全部追踪完成后再单独生成公式树页面
+        if render_trees:
+            self._render_formula_trees(traced_formulas)
+        return final_formulas
 
-        for item in cells:
-            cell = item['cell']
-            formula = cell.value  # 获取单元格的公式
-            worksheet = cell.parent  # 获取单元格所属的工作表
-            
-            # 获取公式依赖
-            basic_cells, new_formula,tree,path = self._trace_formula_dependencies(
-                worksheet, 
-                formula,
-                cell,
-                cell.row,
-                cell.column
-            )
-            # 将分解后的公式转换为变量表达式
-            variable_new_formula = self._convert_to_variable_expression(
-                worksheet, f"={new_formula}"
-            )
+    def iter_formula_dependencies(self, cells, render_trees=True):
+        """
+        逐个分析输出单元格的公式依赖，每个输出单元格的结果就绪后立即产出
+        
+        与_analyze_formula_dependencies的结果相同，但不在内存中保留全部结果，
+        调用方可以边分析边处理，内存占用不随输出单元格数量增长
+        
+        Args:
+            cells (list): 需要分析的单元格列表
+            render_trees (bool): 是否在产出结果前为新追踪的输出单元格生成公式树页面
+            
+        Yields:
+            dict: 按cells顺序的分析结果
+        """
+        for formula_info, traced in self._iter_formula_dependencies(cells):
+            if traced and render_trees:
+                self._open_formula_tree(self._write_formula_tree(formula_info))
+            yield formula_info
 
+    def _iter_formula_dependencies(self, cells):
+        """
+        按cells的顺序逐个产出分析结果
+        
+        Args:
+            cells (list): 需要分析的单元格列表
             
-            # 创建公式信息字典
-            formula_info = {
-                '工作表': worksheet.title,
-                '单元格': cell.coordinate,
-                '原始公式': formula,
-                '标题组合': item.get('header', ''),  # 使用item中的header信息
-                '合并公式': new_formula,
-                '变量公式': variable_new_formula,
-                '基础单元格': basic_cells,
-                '路径': path,
-                '依赖树': tree
-           #     '依赖变量': dependencies['依赖变量'],
-    #            '计算顺序': dependencies['计算顺序'],
-    #            '完整表达式': dependencies['完整表达式']
+        Yields:
+            tuple: (分析结果, 是否为本次新追踪的结果)
+        """
+        print("\n正在分析公式依赖关系...")
+        
+        # 每次分析是一个新的会话，节点在本次分析的所有输出单元格之间共享
+        self.node_store = NodeStore()
+        
+        # 依赖锥中的单元格都未变化时直接复用缓存的分析结果，轮到该单元格时才读取
+        reusable = set()
+        if self.analysis_cache is not None:
+            reusable = {
+                position for position, item in enumerate(cells)
+                if self.analysis_cache.has_analysis(item['cell'].parent.title, item['cell'].coordinate)
             }
+        
+        # 获取公式依赖，结果按cells中的顺序产出
+        traced = self._iter_traced_output_cells(
+            [item['cell'] for position, item in enumerate(cells) if position not in reusable]
+        )
+        try:
+            for position, item in enumerate(cells):
+                cell = item['cell']
+                worksheet = cell.parent  # 获取单元格所属的工作表
+                
+                if position in reusable:
+                    print(f'使用缓存的依赖分析结果: {worksheet.title}!{cell.coordinate}')
+                    yield self.analysis_cache.get_analysis(worksheet.title, cell.coordinate), False
+                    continue
+                
+                basic_cells, new_formula, tree, path, variable_new_formula = next(traced)
+                # 创建公式信息字典
+                formula_info = {
+                    '工作表': worksheet.title,
+                    '单元格': cell.coordinate,
+                    '原始公式': cell.value,
+                    '标题组合': item.get('header', ''),  # 使用item中的header信息
+                    '合并公式': new_formula,
+                    '变量公式': variable_new_formula,
+                    '基础单元格': basic_cells,
+                    '路径': [str(node) for node in path],
+                    '依赖树': tree
+                }
+                
+                if self.analysis_cache is not None:
+                    self.analysis_cache.put_analysis(
+                        worksheet.title, cell.coordinate,
+                        self._get_dependency_cone(basic_cells, tree), formula_info
+                    )
+                yield formula_info, True
+        finally:
+            # 调用方提前停止时结束并行追踪
+            traced.close()
+        
+        print(f"共解析 {len(self.pool_formulas.union(self.formula_parser))} 个不同的公式")
+
+    def _trace_output_cell(self, cell):
+        """
+        追踪一个输出单元格的公式依赖，并将合并公式转换为变量表达式
+        
+        Args:
+            cell: 输出单元格
             
-            final_formulas.append(formula_info)
+        Returns:
+            tuple: (基础单元格集合, 合并公式, 依赖图节点列表, 按处理顺序的节点路径, 变量公式)
+        """
+        worksheet = cell.parent
+        basic_cells, new_formula, tree, path = self._trace_formula_dependencies(
+            worksheet, cell.value, cell, cell.row, cell.column
+        )
+        # 将分解后的公式转换为变量表达式
+        variable_new_formula = self._convert_to_variable_expression(worksheet, f"={new_formula}")
+        return basic_cells, new_formula, tree, path, variable_new_formula
+
+    def _iter_traced_output_cells(self, output_cells):
+        """
+        依次追踪输出单元格，workers大于1时在进程池中并行追踪
+        
+        Args:
+            output_cells (list): 输出单元格列表
             
-            # # 更新依赖图
-            # dependency_graph[formula_info['标题组合']] = {
-            #     'deps': dependencies['依赖变量'],
-            #     'expr': dependencies['完整表达式']
-            # }
+        Yields:
+            tuple: 与output_cells一一对应的_trace_output_cell结果
+        """
+        if self.workers > 1 and len(output_cells) > 1:
+            if get_fork_context() is not None:
+                yield from self._iter_traced_output_cells_in_pool(output_cells)
+                return
+            print('当前平台不支持fork，依赖追踪改为串行')
+        for cell in output_cells:
+            yield self._trace_output_cell(cell)
+
+    def _iter_traced_output_cells_in_pool(self, output_cells):
+        """
+        在进程池中并行追踪输出单元格
         
-        # 按照依赖关系排序
-        #sorted_formulas = sort_by_dependencies(final_formulas)
+        依赖图在主进程中构建完成后再创建子进程，子进程通过fork共享只读的依赖图、
+        工作簿和标题缓存，只接收输出单元格的位置。每批输出单元格在子进程中使用独立的节点表，
+        主进程按原始顺序合并各批结果，节点编号与串行追踪时相同
         
-        return final_formulas
+        Args:
+            output_cells (list): 输出单元格列表
+            
+        Yields:
+            tuple: 与output_cells一一对应的_trace_output_cell结果
+        """
+        graph = self._get_dependency_graph()
+        for cell in output_cells:
+            # 子进程不能再修改依赖图，否则各进程的单元格编号会不一致
+            self._get_root_id(graph, cell)
+        
+        workers = min(self.workers, len(output_cells))
+        chunks = split_into_chunks(len(output_cells), workers)
+        print(f'正在使用 {workers} 个进程追踪 {len(output_cells)} 个输出单元格...')
+        self.pool_cells = output_cells
+        try:
+            for nodes, outputs, parsed_formulas in iter_in_forked_pool(self, '_trace_output_chunk', chunks, workers):
+                yield from self._merge_traced_chunk(nodes, outputs, parsed_formulas)
+        finally:
+            self.pool_cells = None
+    
+    def _merge_traced_chunk(self, nodes, outputs, parsed_formulas):
+        """
+        把子进程追踪的一批结果合并到当前会话的节点表
+        
+        Args:
+            nodes, outputs, parsed_formulas: _trace_output_chunk的返回值
+            
+        Returns:
+            list: 以当前会话节点表示的_trace_output_cell结果
+        """
+        results = []
+        self.pool_formulas.update(parsed_formulas)
+        local_nodes = {}  # 子进程中的节点编号 -> 主进程的节点
+        
+        def to_node(local_index):
+            node = local_nodes.get(local_index)
+            if node is None:
+                key, cell_name, original_formula, cell_variable_name, variable_expression, _ = nodes[local_index - 1]
+                node = self.node_store.get(key)
+                if node is None:
+                    node = self.node_store.add(
+                        key, cell_name, original_formula, cell_variable_name, variable_expression
+                    )
+                local_nodes[local_index] = node
+            return node
+        
+        # 按输出单元格的顺序、依赖树中的顺序分配新节点，与串行追踪时创建节点的顺序一致
+        for basic_cells, new_formula, tree, path, variable_new_formula in outputs:
+            tree = [to_node(index) for index in tree]
+            path = [to_node(index) for index in path]
+            results.append((basic_cells, new_formula, tree, path, variable_new_formula))
+        for local_index, node in local_nodes.items():
+            node.children = array('l', (to_node(child).index for child in nodes[local_index - 1][5]))
+        return results
+
+    def _trace_output_chunk(self, positions):
+        """
+        在子进程中追踪一批输出单元格
+        
+        Args:
+            positions: 输出单元格在pool_cells中的位置
+            
+        Returns:
+            tuple: (节点表, 追踪结果, 新解析的公式)。节点表按子进程中的编号排列，
+                   元素为(节点键, 单元格名, 原始公式, 标题, 变量表达式, 子节点编号)；
+                   追踪结果中的节点都以子进程中的编号表示
+        """
+        self.node_store = NodeStore()
+        parsed_before = len(self.formula_parser)
+        outputs = []
+        for position in positions:
+            basic_cells, new_formula, tree, path, variable_new_formula = self._trace_output_cell(
+                self.pool_cells[position]
+            )
+            outputs.append((
+                basic_cells, new_formula, [node.index for node in tree], [node.index for node in path],
+                variable_new_formula
+            ))
+        keys = {index: key for key, index in self.node_store.keys.items()}
+        nodes = [
+            (keys[node.index], node.cell_name, node.original_formula, node.cell_variable_name,
+             node.variable_expression, list(node.children))
+            for node in self.node_store.nodes.values()
+        ]
+        return nodes, outputs, list(islice(self.formula_parser, parsed_before, None))
+
+    def _get_dependency_cone(self, basic_cells, nodelist):
+        """
+        收集依赖锥涉及的全部单元格和区域，用于判断缓存的分析结果是否失效
+        
+        Args:
+            basic_cells: 基础单元格集合
+            nodelist: 依赖锥中全部节点的列表（含输出单元格本身）
+            
+        Returns:
+            dict: 工作表名 -> (单元格(行号, 列号)列表, 区域(起始行, 起始列, 结束行, 结束列)列表)，
+                  整行或整列区域中缺少的一维为None
+        """
+        cone = {}
+        names = set(basic_cells)
+        names.update(node.cell_name for node in nodelist)
+        for name in names:
+            if '!' not in name:
+                continue
+            sheet_name, address = name.rsplit('!', 1)
+            ref = parse_reference(address)
+            if ref is None:
+                continue
+            cells, ranges = cone.setdefault(sheet_name.strip("'"), ([], []))
+            min_col, min_row, max_col, max_row = ref.bounds
+            if ref.is_range:
+                ranges.append((min_row, min_col, max_row, max_col))
+            else:
+                cells.append((min_row, min_col))
+        return cone
 
+    def _get_dependency_graph(self):
+        """
+        获取工作簿级依赖图，首次访问时构建
+        
+        Returns:
+            DependencyGraph: 依赖图
+        """
+        if self.dependency_graph is None:
+            graph = self.analysis_cache.load_graph() if self.analysis_cache is not None else None
+            if graph is not None and not self._update_dependency_graph(graph):
+                graph = None
+            if graph is None:
+                graph = self._build_dependency_graph()
+            if self.analysis_cache is not None:
+                self.analysis_cache.put_graph(graph)
+            self.dependency_graph = graph
+        return self.dependency_graph
+    
+    def _build_dependency_graph(self):
+        """
+        一次遍历所有工作表的公式单元格，构建工作簿级依赖图
+        
+        每个公式只分解、提取引用和分类一次，所有输出单元格的追踪共享这些结果
+        
+        Returns:
+            DependencyGraph: 依赖图
+        """
+        print('\n正在构建公式依赖图...')
+        graph = DependencyGraph()
+        formula_cells = self._collect_traced_cells()
+        for ws, cell in formula_cells:
+            self._add_formula_cell_to_graph(graph, ws, cell)
+        formula_count = len(graph.formula_rows) - len(graph.ranges) + len(graph.failures)
+        print(f'依赖图共 {formula_count} 个公式单元格，{len(graph.ranges)} 个区域，{graph.edge_count} 条引用')
+        print(f'{len(formula_cells)} 个公式单元格归并为 {self.formula_parser.template_count} 个相对公式模板')
+        return graph
+    
+    def _collect_traced_cells(self):
+        """
+        记录每个工作表中需要继续追踪的单元格（公式和黄色输入单元格），
+        区域引用只展开这些单元格，其余成员不逐个列出
+        
+        Returns:
+            list: 全部公式单元格 [(工作表, 单元格), ...]
+        """
+        formula_cells = []
+        self.traced_cells = {}
+        for sheet_name in self.workbook.sheetnames:
+            ws = self.workbook[sheet_name]
+            columns = {}
+            for cell in iter_populated_cells(ws):
+                is_formula = isinstance(cell.value, str) and cell.value.startswith('=')
+                if is_formula:
+                    formula_cells.append((ws, cell))
+                if is_formula or self._is_yellow_cell(cell):
+                    columns.setdefault(cell.column, []).append(cell.row)
+            self.traced_cells[sheet_name] = (sorted(columns), {col: sorted(rows) for col, rows in columns.items()})
+        return formula_cells
+    
+    def _update_dependency_graph(self, graph):
+        """
+        按本次的变化范围更新上次运行保存的依赖图，只重新分析受影响的公式单元格和区域：
+        内容变化的公式单元格、引用了变化单元格的公式单元格（引用类型可能改变）
+        以及包含变化单元格的区域
+        
+        Args:
+            graph: 与上次快照一致的依赖图
+            
+        Returns:
+            bool: 是否已更新，工作表整体变化或范围变化等无法增量更新的情况返回False
+        """
+        if any(changes.whole or changes.box is not None for changes in self.sheet_changes.values()):
+            return False
+        if graph.stale_edges > graph.edge_count // 2:
+            # 失效的引用边过多时重新构建，避免数组持续增长
+            return False
+        
+        print('\n正在更新公式依赖图...')
+        formula_cells = self._collect_traced_cells()
+        changed_ids = set()
+        for sheet_name, changes in self.sheet_changes.items():
+            for row, col in changes.cells:
+                cell_id = graph.ids.get(f"{sheet_name}!{get_column_letter(col)}{row}")
+                if cell_id is not None:
+                    changed_ids.add(cell_id)
+        
+        dirty = {cell_id for cell_id in changed_ids if cell_id in graph}
+        if changed_ids:
+            owners = {row: cell_id for cell_id, row in graph.formula_rows.items()}
+            for edge, target in enumerate(graph.targets):
+                if target in changed_ids:
+                    owner = owners.get(bisect_right(graph.indptr, edge) - 1)
+                    if owner is not None:
+                        dirty.add(owner)
+        for range_id, (sheet_name, min_row, min_col, max_row, max_col) in graph.ranges.items():
+            if self.sheet_changes[sheet_name].has_changed_cells(min_row, min_col, max_row, max_col):
+                dirty.add(range_id)
+        dirty_ranges = [cell_id for cell_id in dirty if cell_id in graph.ranges]
+        for cell_id in dirty:
+            graph.discard(cell_id)
+        
+        # 重新分析受影响的公式单元格，以及由非公式变为公式的单元格
+        formula_count = 0
+        for ws, cell in formula_cells:
+            if (cell.row, cell.column) in self.sheet_changes[ws.title].cells \
+                    or graph.ids.get(self.get_cell_coordinate_with_sheet(cell)) in dirty:
+                self._add_formula_cell_to_graph(graph, ws, cell)
+                formula_count += 1
+        for range_id in dirty_ranges:
+            if range_id not in graph.ranges:
+                self._add_range_to_graph(graph, graph.names[range_id])
+        print(f'依赖图增量更新：重新分析 {formula_count} 个公式单元格，{len(dirty_ranges)} 个区域')
+        return True
+    
+    def _add_formula_cell_to_graph(self, graph, worksheet, cell):
+        """
+        分解一个公式单元格的公式，把它的引用边加入依赖图
+        
+        Args:
+            graph: 依赖图
+            worksheet: 单元格所在的工作表
+            cell: 公式单元格
+            
+        Returns:
+            int: 单元格在依赖图中的编号
+        """
+        cell_id = graph.intern(
+            self.get_cell_coordinate_with_sheet(cell), (worksheet.title, cell.row, cell.column)
+        )
+        try:
+            decomposed = self._decompose_formula(worksheet, cell.value, cell.row, cell.column)
+            refs = self._extract_cell_refs(cell.value, worksheet, cell.row, cell.column)
+        except Exception as e:
+            # 与逐个追踪时一样，只有追踪到该单元格时才报错
+            graph.add_failed_cell(cell_id, e)
+            return cell_id
+        
+        edges = []
+        error_messages = {}
+        for ref in refs:
+            try:
+                if ':' in ref:
+                    range_id = self._add_range_to_graph(graph, ref)
+                    if range_id is not None:
+                        edges.append((EDGE_RANGE, range_id, range_id))
+                        continue
+                    kind, target_name, location, label = EDGE_INVALID_SHEET, ref, None, ref
+                else:
+                    kind, target_name, location, label = self._classify_cell_reference(worksheet, ref)
+            except Exception as e:
+                error_messages[len(edges)] = str(e)
+                kind, target_name, location, label = EDGE_ERROR, ref, None, ref
+            edges.append((kind, graph.intern(target_name, location), graph.intern(label)))
+        graph.add_formula_cell(cell_id, decomposed, edges, error_messages)
+        return cell_id
+    
+    def _add_range_to_graph(self, graph, ref):
+        """
+        把区域引用作为一个节点加入依赖图，同一区域只添加一次
+        
+        区域只记录其中的公式单元格和输入单元格，常量和空白成员不逐个列出，
+        需要时可通过graph.iter_range_members枚举
+        
+        Args:
+            graph: 依赖图
+            ref: 已补全工作表名的区域引用，如'Sheet1!A1:B10'
+            
+        Returns:
+            int: 区域编号，工作表不存在时返回None
+        """
+        range_id = graph.ids.get(ref)
+        if range_id is not None and range_id in graph.ranges:
+            return range_id
+        sheet_name, cell_range = ref.split('!')
+        if sheet_name not in self.workbook.sheetnames:
+            return None
+        worksheet = self.workbook[sheet_name]
+        min_col, min_row, max_col, max_row = range_boundaries(cell_range)
+        sheet_max_row, sheet_max_column = self._get_sheet_dimensions(worksheet)
+        if min_row is None:
+            # 整列引用
+            min_row, max_row = 1, sheet_max_row
+        if min_col is None:
+            # 整行引用
+            min_col, max_col = 1, sheet_max_column
+        range_id = graph.intern(ref)
+        
+        columns, rows_by_column = self.traced_cells[sheet_name]
+        members = []
+        for col in columns[bisect_left(columns, min_col):bisect_right(columns, max_col)]:
+            rows = rows_by_column[col]
+            members.extend((row, col) for row in rows[bisect_left(rows, min_row):bisect_right(rows, max_row)])
+        
+        edges = []
+        for row, col in sorted(members):
+            kind, target_name, location, label = self._classify_cell_reference(
+                worksheet, f"{sheet_name}!{get_column_letter(col)}{row}"
+            )
+            edges.append((kind, graph.intern(target_name, location), graph.intern(label)))
+        graph.add_range(range_id, (sheet_name, min_row, min_col, max_row, max_col), edges)
+        return range_id
+    
+    def _get_range_node(self, graph, range_id):
+        """获取区域对应的节点，同一会话中首次引用时创建"""
+        node = self.node_store.get(range_id)
+        if node is None:
+            name = graph.names[range_id]
+            node = self.node_store.add(
+                range_id, name, name, (None, None, f"{name}（{graph.range_size(range_id)}个单元格）", None), "RANGE"
+            )
+        return node
+    
+    def _get_cell_node(self, graph, cell_id, kind, worksheets):
+        """
+        获取单元格对应的节点，同一会话中首次引用时创建
+        
+        Args:
+            graph: 依赖图
+            cell_id: 单元格在依赖图中的编号
+            kind: EDGE_INPUT或EDGE_FORMULA
+            worksheets: 工作表名 -> 工作表对象
+            
+        Returns:
+            Node: 节点
+        """
+        node = self.node_store.get(cell_id)
+        if node is not None:
+            return node
+        sheet_name, ref_row, ref_col = graph.locations[cell_id]
+        ws = worksheets[sheet_name]
+        value = get_cell_value(ws, ref_row, ref_col)
+        headers = self._get_cached_headers(sheet_name, f"{get_column_letter(ref_col)}{ref_row}")
+        if kind == EDGE_INPUT:
+            return self.node_store.add(
+                cell_id, graph.names[cell_id], value, headers,
+                "INPUT"  # 或其他标识输入单元格的值
+            )
+        return self.node_store.add(
+            cell_id, graph.names[cell_id], str(value), headers,
+            self._convert_to_variable_expression(ws, f"{value}", ref_row, ref_col)
+        )
+    
+    def _get_error_node(self, ref, original_formula):
+        """获取无效引用对应的节点，相同的无效引用共享一个节点"""
+        node = self.node_store.get(original_formula)
+        if node is None:
+            node = self.node_store.add(original_formula, ref, original_formula, "ERROR", "ERROR")
+        return node
+    
     def _trace_formula_dependencies(self, worksheet, formula, cell, row, col):
         """
         追踪公式依赖关系
         
+        在工作簿级依赖图上按广度优先遍历，节点在当前会话中按单元格共享，
+        子节点只记录编号
+        
         Args:
             worksheet: 工作表对象
             formula: 公式字符串
@@ -221,318 +957,276 @@ class FormulaExtractor:
             col: 当前列号
             
         Returns:
-            tuple: (基础单元格集合, 简化表达式, 依赖树, 节点路径)
+            tuple: (基础单元格集合, 简化表达式, 依赖图节点列表（根节点在前）, 节点路径)
         """
+        graph = self._get_dependency_graph()
+        worksheets = {ws.title: ws for ws in self.workbook.worksheets}
         basic_cells = set()
-        path = []  # 现在存储Node对象
-        nodelist = []
-        current_node = Node(
-            cell_name=self.get_cell_coordinate_with_sheet(cell),
-            original_formula=cell.value,
-            cell_variable_name= self._get_cell_cached_headers(cell),
-            variable_expression=self._convert_to_variable_expression(worksheet, f"{cell.value}"),
-        )
-        to_process = [(worksheet, formula, cell, row, col,current_node)]
+        path = []  # 按处理顺序记录公式节点
+        nodelist = []  # 可达的全部节点，子节点编号都能在其中找到
+        listed = set()
+        root_id = self._get_root_id(graph, cell)
+        current_node = self._get_cell_node(graph, root_id, EDGE_FORMULA, worksheets)
+        nodelist.append(current_node)
+        listed.add(current_node.index)
+        to_process = deque([(root_id, current_node)])
 
         visited = set()
-        simplified_formula = formula[1:] if formula.startswith('=') else formula
         new_formula = ''
 
         while to_process:
-            current_ws, current_formula, current_cell, current_row, current_col,current_node = to_process.pop(0)
+            current_id, current_node = to_process.popleft()
             
-            current_cell_name = self.get_cell_coordinate_with_sheet(current_cell)
-            
-            if current_cell_name in visited:
+            if current_id in visited:
                 continue
 
-            visited.add(current_cell_name)
-            print(' 当前处理的单元格： ', current_cell_name, '=', current_formula)
-
-            # 创建当前节点
-            variable_expr = self._convert_to_variable_expression(current_ws, f"{current_formula}")
-
-            path.append(current_node.__str__())
-            nodelist.append(current_node)
-            
-            # if cell.coordinate == 'E37':
-            #     ipdb.set_trace()
-            
-            # 分解公式
-            new_current_formula = self._decompose_formula(current_ws, current_formula)
+            visited.add(current_id)
+            current_cell_name = graph.names[current_id]
 
-            #print('分解后的公式', decomposed_formula)
-            
-            #ipdb.set_trace()      
+            path.append(current_node)
             
+            # 区域在合成公式中保持原样，只追踪其中的公式和输入单元格
+            if current_id not in graph.ranges:
+                # 分解后的公式在依赖图中只计算一次
+                new_current_formula = graph.get_decomposed(current_id)
 
-            # 提取单元格引用并重组公式
-            new_formula = self._replace_cell_refs(new_formula, current_cell, current_ws)
-       
-            refs = self._extract_cell_refs(new_current_formula, current_ws)
-  
-            print(' 待合成次数： ', len(to_process))
-            if len(to_process) > 3000:
-                ipdb.set_trace()
-                break
+                # 用分解后的公式替换合成公式中当前单元格的引用（不替换更长的地址或区域的起始单元格）
+                if new_formula == '':
+                    new_formula = current_cell_name
+                new_formula = re.sub(
+                    re.escape(current_cell_name) + r'(?![0-9:])',
+                    lambda match: f"({new_current_formula})", new_formula
+                )
 
-            #ipdb.set_trace()      
-            for ref in refs:
-                self._process_cell_reference(current_ws, ref, basic_cells, to_process, current_node.children)
-        #ipdb.set_trace()    
-        if len(nodelist) > 0:
-            print(f"准备绘制公式树，单元格: {cell.coordinate}")
-            print(f"节点列表长度: {len(nodelist)}")
-            print(f"根节点信息: {nodelist[0]}")
-            self.visualize_interactive_formula_tree(nodelist[0], f'formula_tree_{cell.coordinate}.html')
-        else:
-            print(f"警告：单元格 {cell.coordinate} 没有生成节点列表")
+            children = {}
+            for edge, kind, target_id, label_id in graph.iter_edges(current_id):
+                if kind == EDGE_BASIC:
+                    basic_cells.add(graph.names[label_id])
+                    continue
+                if kind == EDGE_RANGE:
+                    basic_cells.add(graph.names[label_id])
+                    node = self._get_range_node(graph, target_id)
+                    to_process.append((target_id, node))
+                elif kind == EDGE_INPUT or kind == EDGE_FORMULA:
+                    node = self._get_cell_node(graph, target_id, kind, worksheets)
+                    if kind == EDGE_INPUT:
+                        basic_cells.add(graph.names[label_id])
+                    else:
+                        to_process.append((target_id, node))
+                else:
+                    ref = graph.names[label_id]
+                    if kind == EDGE_INVALID_SHEET:
+                        original_formula = f"跳过无效工作表: {ref}"
+                    elif kind == EDGE_INVALID_CELL:
+                        original_formula = f"跳过无效单元格引用: {ref}"
+                    else:
+                        original_formula = f"处理单元格引用出错 {ref}: {graph.error_messages[edge]}"
+                    node = self._get_error_node(ref, original_formula)
+                children[node.index] = None
+                if node.index not in listed:
+                    listed.add(node.index)
+                    nodelist.append(node)
+            current_node.children = array('l', children)
         #print(cell.coordinate, ' 合成后的公式 ', new_formula)
         return basic_cells, new_formula, nodelist, path
     
-    def _extract_cell_refs(self, formula,worksheet):
-        """提取公式中的单元格引用"""
-        # 匹配模式：
-        # 1. 可选的+号
-        # 2. 工作表名（可能包含中文）
-        # 3. 感叹号
-        # 4. 单元格引用
-        variable_expr = formula[1:] if formula.startswith('=') else formula
-        
-        # 修改正则表达式以匹配单元格引用，并确保所有引用都带有工作表名
-        cell_refs = re.findall(
-            r"('?[^+\-*/(),\s!]+?'?!\$?[A-Z]+\$?\d+|\$?[A-Z]+\$?\d+)", 
-            variable_expr
-        )
+    def _get_root_id(self, graph, cell):
+        """获取输出单元格在依赖图中的编号，单元格不在依赖图中时先加入"""
+        root_id = graph.ids.get(self.get_cell_coordinate_with_sheet(cell))
+        if root_id is None or root_id not in graph:
+            root_id = self._add_formula_cell_to_graph(graph, cell.parent, cell)
+        return root_id
+    
+    def get_recalc_engine(self):
+        """
+        获取全部输出单元格的重算引擎，首次访问时按依赖图编译
         
-        # 处理提取到的单元格引用，确保都带有工作表名
-        processed_refs = []
-        seen_refs = set()  # 用于跟踪已处理的引用
-        current_sheet = None
-        
-        for ref in cell_refs:
-            processed_ref = None
-            if '!' in ref:
-                # 如果包含工作表名，保存当前工作表名
-                current_sheet = ref.split('!')[0].strip("'")
-                processed_ref = ref
-            else:
-                # 如果不包含工作表名，使用最近的工作表名或当前工作表
-                sheet_prefix = f"{current_sheet or worksheet.title}!"
-                # 移除可能存在的$符号
-                clean_ref = ref.replace('$', '')
-                processed_ref = f"{sheet_prefix}{clean_ref}"
-            
-            # 只有当引用未被处理过时才添加
-            if processed_ref not in seen_refs:
-                seen_refs.add(processed_ref)
-                processed_refs.append(processed_ref)
+        Returns:
+            RecalcEngine: 重算引擎，修改输入单元格后可以只重算受影响的公式
+        """
+        if self.recalc_engine is None:
+            graph = self._get_dependency_graph()
+            root_ids = [self._get_root_id(graph, item['cell']) for item in self.output_cells]
+            self.recalc_engine = RecalcEngine(
+                self.workbook, graph, root_ids, self.cached_values, self.formula_parser,
+                sheet_dimensions=self._get_sheet_dimensions
+            )
+        return self.recalc_engine
+    
+    def get_header_index(self):
+        """
+        获取输入/输出单元格的标题索引，首次访问时构建
         
-        # 用处理后的引用替换原来的cell_refs
-        cell_refs = processed_refs
+        Returns:
+            HeaderIndex: 按行标题、列标题、标题组合和表格名称查找单元格的索引
+        """
+        if self.header_index is None:
+            self.header_index = HeaderIndex.from_cells(self.input_cells, self.output_cells, self.header_cache)
+        return self.header_index
+    
+    def _render_formula_trees(self, formula_infos):
+        """
+        为追踪得到的每个输出单元格生成公式树页面，workers大于1时在进程池中并行生成
+        
+        Args:
+            formula_infos (list): 本次追踪得到的分析结果
+        """
+        if self.workers > 1 and len(formula_infos) > 1 and get_fork_context() is not None:
+            workers = min(self.workers, len(formula_infos))
+            chunks = split_into_chunks(len(formula_infos), workers)
+            print(f'\n正在使用 {workers} 个进程生成 {len(formula_infos)} 个公式树页面...')
+            self.pool_cells = formula_infos
+            try:
+                output_paths = [
+                    output_path
+                    for chunk in run_in_forked_pool(self, '_render_formula_tree_chunk', chunks, workers)
+                    for output_path in chunk
+                ]
+            finally:
+                self.pool_cells = None
+        else:
+            output_paths = [self._write_formula_tree(formula_info) for formula_info in formula_infos]
         
-        return cell_refs
+        for output_path in output_paths:
+            self._open_formula_tree(output_path)
     
-    def _get_cell_range_references(self, worksheet, start_ref, end_ref):
+    def render_formula_tree_bundle(self, formula_infos, output_dir, open_browser=False):
         """
-        获取单元格范围内的所有单元格引用
+        把全部输出单元格的公式树写成一个共享节点表的页面包，不逐个打开浏览器
         
         Args:
-            worksheet: 工作表对象
-            start_ref: 起始单元格引用
-            end_ref: 结束单元格引用
+            formula_infos: 可迭代的分析结果
+            output_dir (str): 页面包目录
+            open_browser (bool): 是否在浏览器中打开索引页
             
         Returns:
-            list: 单元格引用列表
+            str: 索引页路径
         """
-        start_col = ''.join(c for c in start_ref if c.isalpha())
-        start_row = int(''.join(c for c in start_ref if c.isdigit()))
-        end_col = ''.join(c for c in end_ref if c.isalpha())
-        end_row = int(''.join(c for c in end_ref if c.isdigit()))
-        
-        # 确保行列范围正确
-        if start_row > end_row:
-            start_row, end_row = end_row, start_row
-        start_col_idx = column_index_from_string(start_col)
-        end_col_idx = column_index_from_string(end_col)
-        if start_col_idx > end_col_idx:
-            start_col_idx, end_col_idx = end_col_idx, start_col_idx
-        
-        # 生成单元格引用列表
-        cell_refs = []
-        for r in range(start_row, end_row + 1):
-            for c in range(start_col_idx, end_col_idx + 1):
-                cell_refs.append(f"{worksheet.title}!{get_column_letter(c)}{r}")
-        
-        return cell_refs
+        return write_formula_tree_bundle(formula_infos, output_dir, self.formula_parser, open_browser)
+    
+    def _open_formula_tree(self, output_path):
+        """在浏览器中打开生成的公式树页面，output_path为None时不做任何事"""
+        if output_path is not None:
+            # 自动在浏览器中打开生成的HTML文件
+            open_in_browser(output_path)
+    
+    def _render_formula_tree_chunk(self, positions):
+        """在子进程中生成一批公式树页面，返回各页面的路径"""
+        return [self._write_formula_tree(self.pool_cells[position]) for position in positions]
     
-    def _process_cell_reference(self, worksheet, ref, basic_cells, to_process, children):
+    def _write_formula_tree(self, formula_info):
         """
-        处理单个单元格引用
+        生成一个输出单元格的公式树页面
         
         Args:
-            worksheet: 工作表对象
-            ref: 单元格引用
-            basic_cells: 基础单元格集合
-            to_process: 待处理的单元格列表
-            children: 当前节点的子节点列表
-        """
-        try:
-            if '!' in ref:
-                sheet_name, cell_ref = ref.split('!')
-                sheet_name = sheet_name.strip("'")
-                sheet_name = sheet_name.strip("=")
-                if sheet_name not in self.workbook.sheetnames:
-                    children.append(Node(
-                        cell_name=ref,
-                        original_formula=f"跳过无效工作表: {ref}",
-                        cell_variable_name= "ERROR",
-                        variable_expression="ERROR"
-                    ))
-                    return
-                target_ws = self.workbook[sheet_name]
-            else:
-                cell_ref = ref
-                target_ws = worksheet
-            
-            col_str = ''.join(filter(str.isalpha, cell_ref))
-            row_num = int(''.join(filter(str.isdigit, cell_ref)))
-            ref_col = column_index_from_string(col_str)
-            
-            if not (1 <= row_num <= target_ws.max_row and 
-                   1 <= ref_col <= target_ws.max_column):
-                node = Node(
-                    cell_name=ref,
-                    original_formula=f"跳过无效单元格引用: {ref}",
-                    cell_variable_name= "ERROR",
-                    variable_expression="ERROR"
-                )
-                children.append(node)
-                return
-            
-            cell = target_ws.cell(row=row_num, column=ref_col)
-            full_ref = f"{target_ws.title}!{cell_ref}"
+            formula_info (dict): 输出单元格的分析结果
             
+        Returns:
+            str: 页面路径，没有节点或生成失败时返回None
+        """
+        nodelist = formula_info['依赖树']
+        coordinate = formula_info['单元格']
+        if len(nodelist) == 0:
+            print(f"警告：单元格 {coordinate} 没有生成节点列表")
+            return None
+        print(f"准备绘制公式树，单元格: {coordinate}")
+        print(f"节点列表长度: {len(nodelist)}")
+        print(f"根节点信息: {nodelist[0]}")
+        output_path = f'formula_tree_{coordinate}.html'
+        if not self._write_formula_tree_html(nodelist, output_path):
+            return None
+        return output_path
+    
+    def _extract_cell_refs(self, formula, worksheet, row=None, col=None):
+        """
+        提取公式中的单元格和区域引用
+        
+        Args:
+            formula: 公式字符串
+            worksheet: 公式所在的工作表，用于补全未指定工作表的引用
+            row: 可选，公式所在行，与col一起给出时按相对公式模板平移得到引用
+            col: 可选，公式所在列
             
-            if is_yellow_cell(cell):
-                basic_cells.add(full_ref)
-                #ipdb.set_trace()
-                node = Node(
-                    cell_name=self.get_cell_coordinate_with_sheet(cell),
-                    original_formula=cell.value,
-                    cell_variable_name= self._get_cell_cached_headers(cell),
-                    variable_expression="INPUT"  # 或其他标识输入单元格的值
-                )
-                children.append(node)
-            elif isinstance(cell.value, str) and cell.value.startswith('='):
-                node = Node(
-                    cell_name=self.get_cell_coordinate_with_sheet(cell),
-                    original_formula=str(cell.value),
-                    cell_variable_name= self._get_cell_cached_headers(cell),
-                    variable_expression=str(cell.value)
-                )
-                children.append(node)
-                to_process.append((target_ws, cell.value, cell, row_num, ref_col,node))
-            else:
-                basic_cells.add(full_ref)
-
-            
-        except Exception as e:
-            node = Node(
-                cell_name=ref,
-                original_formula=f"处理单元格引用出错 {ref}: {str(e)}",
-                cell_variable_name= "ERROR",
-                variable_expression="ERROR"
-            )
-            children.append(node)
+        Returns:
+            list: 补全工作表名后的引用（如'Sheet1!A1'、'Sheet1!A1:B2'），按出现顺序去重
+        """
+        template = None if row is None else self.formula_parser.template(formula, row, col)
+        if template is None:
+            references = self.formula_parser.parse(formula).references
+        else:
+            references = template.references(row, col)
+        return list(dict.fromkeys(ref.qualified(worksheet.title) for ref in references))
     
-    def _convert_to_variable_expression(self, worksheet, formula):
+    def _classify_cell_reference(self, worksheet, ref):
         """
-        将公式转换为使用行标题作为变量的表达式
+        判断单个单元格引用的类型，不会在工作表中创建单元格
+        
+        Args:
+            worksheet: 引用所在公式的工作表
+            ref: 单元格引用
+            
+        Returns:
+            tuple: (边类型, 目标单元格名称, 目标位置(工作表名, 行号, 列号), 引用文本)，
+                   无效引用的目标名称为引用本身、位置为None
         """
-        variable_expr = formula[1:] if formula.startswith('=') else formula
+        if '!' in ref:
+            sheet_name, cell_ref = ref.split('!')
+            sheet_name = sheet_name.strip("'")
+            sheet_name = sheet_name.strip("=")
+            if sheet_name not in self.workbook.sheetnames:
+                return EDGE_INVALID_SHEET, ref, None, ref
+            target_ws = self.workbook[sheet_name]
+        else:
+            cell_ref = ref
+            target_ws = worksheet
         
-        # 修改正则表达式以匹配单元格引用，并确保所有引用都带有工作表名
-        cell_refs = re.findall(
-            r"('?[^+\-*/(),\s!]+?'?!\$?[A-Z]+\$?\d+|\$?[A-Z]+\$?\d+)", 
-            variable_expr
-        )
+        col_str = ''.join(filter(str.isalpha, cell_ref))
+        row_num = int(''.join(filter(str.isdigit, cell_ref)))
+        ref_col = column_index_from_string(col_str)
         
-        # 处理提取到的单元格引用，确保都带有工作表名
-        processed_refs = []
-        seen_refs = set()  # 用于跟踪已处理的引用
-        current_sheet = None
-        
-        for ref in cell_refs:
-            processed_ref = None
-            if '!' in ref:
-                # 如果包含工作表名，保存当前工作表名
-                current_sheet = ref.split('!')[0].strip("'")
-                processed_ref = ref
-            else:
-                # 如果不包含工作表名，使用最近的工作表名或当前工作表
-                sheet_prefix = f"{current_sheet or worksheet.title}!"
-                # 移除可能存在的$符号
-                clean_ref = ref.replace('$', '')
-                processed_ref = f"{sheet_prefix}{clean_ref}"
-            
-            # 只有当引用未被处理过时才添加
-            if processed_ref not in seen_refs:
-                seen_refs.add(processed_ref)
-                processed_refs.append(processed_ref)
-        
-        # 用处理后的引用替换原来的cell_refs
-        cell_refs = processed_refs
-        
-        # 创建替换映射
-        replacements = {}
-        for cell_ref in sorted(cell_refs, key=len, reverse=True):  # 按长度降序排序
-            target_ws = worksheet
-            cell_address = cell_ref
-            sheet_name = worksheet.title
-            
-            if '!' in cell_ref:
-                parts = cell_ref.split('!')
-                sheet_name = parts[0].strip("'")
-                cell_address = parts[1]
-                if sheet_name in self.workbook.sheetnames:
-                    target_ws = self.workbook[sheet_name]
-            
-            # 从缓存中获取标题
-            row_header, col_header, combined_header,actual_value = self._get_cached_headers(sheet_name, cell_address)
-            if combined_header:
-                replacements[cell_ref] = combined_header
-            elif row_header:  # 如果没有组合标题，则使用行标题作为后备
-                replacements[cell_ref] = row_header
+        max_row, max_column = self._get_sheet_dimensions(target_ws)
+        if not (1 <= row_num <= max_row and 1 <= ref_col <= max_column):
+            return EDGE_INVALID_CELL, ref, None, ref
         
-        # 替换单元格引用为变量名
-        result_parts = []
-        current_pos = 0
+        target_name = f"{target_ws.title}!{get_column_letter(ref_col)}{row_num}"
+        location = (target_ws.title, row_num, ref_col)
+        full_ref = f"{target_ws.title}!{cell_ref}"
         
-        # 保持运算符和括号
-        for match in re.finditer(r'([+\-*/(),]|\s+|[^+\-*/(),\s]+)', variable_expr):
-            token = match.group(0)
-            if '$' in token:
-                # 如果不包含工作表名，使用最近的工作表名或当前工作表
-                sheet_prefix = f"{current_sheet or worksheet.title}!"
-                # 移除可能存在的$符号
-                clean_ref = ref.replace('$', '')
-                token = f"{sheet_prefix}{clean_ref}"
+        cell = target_ws._cells.get((row_num, ref_col))
+        if cell is None:
+            # 不存在的单元格为空值且无背景色
+            return EDGE_BASIC, target_name, location, full_ref
+        if self._is_yellow_cell(cell):
+            return EDGE_INPUT, target_name, location, full_ref
+        if isinstance(cell.value, str) and cell.value.startswith('='):
+            return EDGE_FORMULA, target_name, location, full_ref
+        return EDGE_BASIC, target_name, location, full_ref
     
-            
-            if token.strip() in replacements:
-                result_parts.append(replacements[token.strip()])
-            else:
-                # 保留运算符和括号
-                if token in ['+', '-', '*', '/', '(', ')', ',']:
-                    result_parts.append(f' {token} ')
-                elif not token.isspace():  # 跳过空白字符
-                    result_parts.append(token)
+    def _convert_to_variable_expression(self, worksheet, formula, row=None, col=None):
+        """
+        将公式转换为使用行标题作为变量的表达式
         
-        # 组合结果
-        variable_expr = ''.join(result_parts)
+        Args:
+            worksheet: 公式所在的工作表
+            formula: 公式字符串
+            row: 可选，公式所在行，与col一起给出时复制的公式共享同一模板
+            col: 可选，公式所在列
+        """
+        def format_reference(ref):
+            # 从缓存中获取标题，区域保持原样
+            if ref.is_range:
+                return ref.text
+            row_header, col_header, combined_header, actual_value = self._get_cached_headers(
+                ref.sheet or worksheet.title, ref.address
+            )
+            if combined_header:
+                return combined_header
+            elif row_header:  # 如果没有组合标题，则使用行标题作为后备
+                return row_header
+            return ref.text
         
-        # 清理多余的空格
+        # 组合结果并清理多余的空格
+        variable_expr = self._render_formula(formula, self._render_variable_items, format_reference, row, col)
         variable_expr = re.sub(r'\s+', ' ', variable_expr).strip()
         
         # 美化最终表达式
@@ -540,161 +1234,108 @@ class FormulaExtractor:
         
         return variable_expr
     
-    def _decompose_formula(self, worksheet, formula):
+    def _render_variable_items(self, items, format_reference):
         """
-        分解公式，将SUM、AVERAGE、IRR、NPV等函数展开为基本运算
+        按变量表达式的规则渲染语法树：运算符两侧加空格，函数参数用' , '分隔
+        
+        Args:
+            items: 语法树节点列表
+            format_reference: Reference -> 文本
+            
+        Returns:
+            str: 渲染结果（未清理多余空格）
+        """
+        parts = []
+        for item in items:
+            if isinstance(item, Reference):
+                parts.append(format_reference(item))
+            elif isinstance(item, Function):
+                args = [self._render_variable_items(arg, format_reference) for arg in item.args]
+                if isinstance(item, ArrayConstant):
+                    parts.append(item.render(args))
+                else:
+                    parts.append(f"{item.name} ( {' , '.join(args)} )")
+            elif isinstance(item, Group):
+                parts.append(f"( {self._render_variable_items(item.items, format_reference)} )")
+            elif item.is_operator:
+                # 保留运算符和括号
+                parts.append(f' {item.value} ')
+            elif item.kind != Token.WSPACE:
+                parts.append(item.value)
+        return ''.join(parts)
+    
+    def _render_formula(self, formula, render_items, format_reference, row=None, col=None):
+        """
+        渲染公式，给出位置时同一相对公式的所有副本只渲染一次语法树
+        
+        Args:
+            formula: 公式字符串
+            render_items: (语法树节点列表, format_reference) -> 文本
+            format_reference: Reference -> 文本
+            row: 可选，公式所在行
+            col: 可选，公式所在列
+            
+        Returns:
+            str: 渲染结果
+        """
+        template = None if row is None else self.formula_parser.template(formula, row, col)
+        if template is None:
+            return render_items(self.formula_parser.parse(formula).items, format_reference)
+        return template.render(render_items, row, col, format_reference)
+    
+    def _decompose_formula(self, worksheet, formula, row=None, col=None):
+        """
+        分解公式，将SUM、AVERAGE中逗号分隔的单元格展开为基本运算
+        
+        所有引用都补全工作表名并去掉$符号；单元格区域不展开为单个单元格，
+        统一写成'工作表!A1:B2'的形式，在依赖图中作为一个区域节点处理
         
         Args:
             worksheet: 当前工作表对象（公式所在的工作表）
             formula: 公式字符串
+            row: 可选，公式所在行，与col一起给出时复制的公式共享同一模板
+            col: 可选，公式所在列
         """
         if not formula.startswith('='):
             return formula
-            
-        formula = formula[1:]  # 移除等号
         
-        #if 'IF' in formula:
-        #    ipdb.set_trace()
-        
-        # 依次处理各种函数
-        formula = self._decompose_irr(worksheet, formula)
-        formula = self._decompose_npv(worksheet, formula)
-        formula = self._decompose_sum(worksheet, formula)
-        formula = self._decompose_average(worksheet, formula)
-        formula = self._add_missing_sheet_references(worksheet, formula)
-        
-        return formula
-
-    def _decompose_irr(self, worksheet, formula):
-        """处理IRR函数"""
-        irr_pattern = r'IRR\((.*?)\)'
-        processed_positions = set()  # 记录已处理的位置
-        
-        while 'IRR' in formula.upper():
-            match = re.search(irr_pattern, formula, re.IGNORECASE)
-            if not match or match.start() in processed_positions:
-                break
-            
-            range_str = match.group(1)
-            if ':' in range_str:
-                cells = self._expand_range_reference(worksheet, range_str)
-                replacement = f"IRR({','.join(cells)})"
-                start_pos = match.start()
-                formula = formula[:start_pos] + replacement + formula[match.end():]
-                processed_positions.add(start_pos)  # 记录已处理的位置
-            else:
-                processed_positions.add(match.start())  # 标记已检查但无需处理的位置
-            
-        return formula
-
-    def _decompose_npv(self, worksheet, formula):
-        """处理NPV函数"""
-        npv_pattern = r'NPV\((.*?),(.*?)\)'
-        processed_positions = set()  # 记录已处理的位置
-        
-        while 'NPV' in formula.upper():
-            match = re.search(npv_pattern, formula, re.IGNORECASE)
-            if not match or match.start() in processed_positions:
-                break
-            
-            rate = match.group(1)
-            range_str = match.group(2)
-            
-            if ':' in range_str:
-                cells = self._expand_range_reference(worksheet, range_str)
-                replacement = f"NPV({rate},{','.join(cells)})"
-                start_pos = match.start()
-                formula = formula[:start_pos] + replacement + formula[match.end():]
-                processed_positions.add(start_pos)  # 记录已处理的位置
-            else:
-                processed_positions.add(match.start())  # 标记已检查但无需处理的位置
-            
-        return formula
-
-    def _decompose_sum(self, worksheet, formula):
-        """处理SUM函数"""
-        sum_pattern = r'SUM\((.*?)\)'
-        while 'SUM' in formula.upper():
-            match = re.search(sum_pattern, formula, re.IGNORECASE)
-            if not match:
-                break
-            
-            range_str = match.group(1)
-            if ':' in range_str:
-                cells = self._expand_range_reference(worksheet, range_str)
-                replacement = f"({' + '.join(cells)})"
-                formula = formula.replace(match.group(0), replacement)
-            else:
-                # 处理单个单元格或逗号分隔的单元格
-                cells = self._expand_comma_separated_refs(worksheet, range_str)
-                replacement = f"({' + '.join(cells)})"
-                formula = formula.replace(match.group(0), replacement)
-            
-        return formula
-
-    def _decompose_average(self, worksheet, formula):
-        """处理AVERAGE函数"""
-        avg_pattern = r'AVERAGE\((.*?)\)'
-        while 'AVERAGE' in formula.upper():
-            match = re.search(avg_pattern, formula, re.IGNORECASE)
-            if not match:
-                break
-            
-            range_str = match.group(1)
-            if ':' in range_str:
-                cells = self._expand_range_reference(worksheet, range_str)
-                cell_count = len(cells)
-                replacement = f"(({' + '.join(cells)})/{cell_count})"
-                formula = formula.replace(match.group(0), replacement)
-            else:
-                # 处理单个单元格或逗号分隔的单元格
-                cells = self._expand_comma_separated_refs(worksheet, range_str)
-                cell_count = len(cells)
-                replacement = f"(({' + '.join(cells)})/{cell_count})"
-                formula = formula.replace(match.group(0), replacement)
-            
-        return formula
+        sheet_name = worksheet.title
+        return self._render_formula(
+            formula, self._render_decomposed, lambda ref: ref.qualified(sheet_name), row, col
+        )
 
-    def _expand_range_reference(self, worksheet, range_str):
-        """展开单元格范围引用为单个单元格列表"""
-        if '!' in range_str:
-            sheet_name, cell_range = range_str.split('!')
-            sheet_name = sheet_name.strip("'")
-            target_ws = self.workbook[sheet_name]
-            start_ref, end_ref = cell_range.split(':')
-        else:
-            target_ws = worksheet
-            start_ref, end_ref = range_str.split(':')
+    def _render_decomposed(self, items, format_reference):
+        """
+        按分解规则渲染语法树
         
-        return self._get_cell_range_references(target_ws, start_ref, end_ref)
-
-    def _expand_comma_separated_refs(self, worksheet, refs_str):
-        """展开逗号分隔的单元格引用"""
-        cells = []
-        for cell_ref in refs_str.split(','):
-            cell_ref = cell_ref.strip()
-            if '!' in cell_ref:
-                # 如果包含工作表引用，保持原样
-                cells.append(cell_ref)
-            else:
-                # 如果没有工作表引用，添加当前工作表名称
-                cells.append(f"{worksheet.title}!{cell_ref}")
-        return cells
-
-    def _add_missing_sheet_references(self, worksheet, formula):
-        """为缺少工作表引用的单元格添加引用"""
-        cell_pattern = r'([A-Z]+[0-9]+)'
-        
-        def replace_cell_ref(match):
-            cell_ref = match.group(1)
-            # 检查前面是否已经有工作表引用
-            start = match.start(1)
-            if start > 0 and formula[start-1] == '!':
-                # 如果前面有!，说明已经有工作表引用，直接返回原引用
-                return cell_ref
-            return f"{worksheet.title}!{cell_ref}"
-        
-        return re.sub(cell_pattern, replace_cell_ref, formula)
+        Args:
+            items: 语法树节点列表
+            format_reference: Reference -> 补全工作表名后的引用
+            
+        Returns:
+            str: 分解后的公式（不含等号）
+        """
+        parts = []
+        for item in items:
+            if isinstance(item, Reference):
+                parts.append(format_reference(item))
+            elif isinstance(item, Function):
+                args = [self._render_decomposed(arg, format_reference) for arg in item.args]
+                name = item.name.upper()
+                has_range = any(ref.is_range for arg in item.args for ref in iter_references(arg))
+                if name == 'SUM' and not has_range:
+                    # 处理单个单元格或逗号分隔的单元格
+                    parts.append(f"({' + '.join(args)})")
+                elif name == 'AVERAGE' and not has_range:
+                    parts.append(f"(({' + '.join(args)})/{len(args)})")
+                else:
+                    # 参数中含区域时保持函数原样
+                    parts.append(item.render(args))
+            elif isinstance(item, Group):
+                parts.append(f"({self._render_decomposed(item.items, format_reference)})")
+            elif item.kind != Token.WSPACE:
+                parts.append(item.value)
+        return ''.join(parts)
 
     def scan_input_cells(self):
         """
@@ -704,47 +1345,15 @@ class FormulaExtractor:
         Returns:
             list: 输入单元格信息列表
         """
-        # 使用传入的文件路径创建data_only工作簿
-        #wb_data = load_workbook(self.excel_path, data_only=True)
         input_cells = []
         
         # 扫描所有工作表
         for sheet_name in self.workbook.sheetnames:
-            worksheet = self.workbook[sheet_name]
-            # 获取对应的data_only工作表
-            #data_worksheet = wb_data[sheet_name]
-            print(f'\n正在扫描工作表输入单元格: {sheet_name}')
-            
-            # 扫描所有单元格
-            for row in range(1, worksheet.max_row + 1):
-                for col in range(1, worksheet.max_column + 1):
-                    cell = worksheet.cell(row=row, column=col)
-                    
-                    # 检查是否是黄色背景的单元格
-                    if is_yellow_cell(cell):
-                        # 从data_only工作表获取实际值
-                        #ipdb.set_trace()
-                        #data_cell = data_worksheet.cell(row=row, column=col)
-                        #actual_value = data_cell.value
-                        
-                        # 获取表格名称
-                        table_name = self._find_table_name(cell, worksheet, row)
-                        
-                        # 获取标题组合
-                        # 查找最近的行标题和列标题
-                        row_header, col_header, combined_header,actual_value = self._get_cached_headers(sheet_name, cell_address=cell.coordinate)
-                        
-                        # 记录输入单元格信息
-                        input_cells.append({
-                            '工作表': sheet_name,
-                            '单元格': cell.coordinate,
-                            '表格名称': table_name,
-                            '标题组合': combined_header,
-                            '当前值': actual_value
-                        })
-        
-        # 关闭data_only工作簿
-        #wb_data.close()
+            input_cells.extend(self._get_sheet_part(
+                sheet_name, 'input_cells', '输入单元格',
+                lambda: self._scan_sheet_input_cells(sheet_name),
+                lambda previous, changes: self._scan_sheet_input_cells(sheet_name, previous, changes)
+            ))
         
         # 按表格名称和单元格位置排序
         sorted_input_cells = sorted(input_cells, 
@@ -753,6 +1362,64 @@ class FormulaExtractor:
         self.input_cells = sorted_input_cells
         return 
 
+    def _scan_sheet_input_cells(self, sheet_name, previous=None, changes=None):
+        """
+        扫描一个工作表中的黄色背景单元格（输入单元格）
+        
+        Args:
+            sheet_name: 工作表名称
+            previous: 可选，上次运行的扫描结果，与changes一起给出时只重新扫描受变化影响的单元格
+            changes: 可选，工作表相对上次运行的变化范围
+            
+        Returns:
+            list: 该工作表的输入单元格信息列表
+        """
+        # 使用传入的文件路径创建data_only工作簿
+        #wb_data = load_workbook(self.excel_path, data_only=True)
+        input_cells = []
+        
+        worksheet = self.workbook[sheet_name]
+        # 获取对应的data_only工作表
+        #data_worksheet = wb_data[sheet_name]
+        if previous is None:
+            print(f'\n正在扫描工作表输入单元格: {sheet_name}')
+        else:
+            print(f'\n正在更新工作表输入单元格: {sheet_name}')
+            input_cells = [item for item in previous if not changes.affects_cell(*coordinate_to_tuple(item['单元格']))]
+        
+        # 扫描所有实际存在的单元格
+        for cell in iter_populated_cells(worksheet):
+            row = cell.row
+            if previous is not None and not changes.affects_cell(row, cell.column):
+                continue
+            
+            # 检查是否是黄色背景的单元格
+            if is_yellow_cell(cell):
+                # 从data_only工作表获取实际值
+                #ipdb.set_trace()
+                #data_cell = data_worksheet.cell(row=row, column=col)
+                #actual_value = data_cell.value
+                
+                # 获取表格名称
+                table_name = self._find_table_name(cell, worksheet, row)
+                
+                # 获取标题组合
+                # 查找最近的行标题和列标题
+                row_header, col_header, combined_header,actual_value = self._get_cached_headers(sheet_name, cell_address=cell.coordinate)
+                
+                # 记录输入单元格信息
+                input_cells.append({
+                    '工作表': sheet_name,
+                    '单元格': cell.coordinate,
+                    '表格名称': table_name,
+                    '标题组合': combined_header,
+                    '当前值': actual_value
+                })
+        
+        # 关闭data_only工作簿
+        #wb_data.close()
+        return input_cells
+
     def scan_output_cells(self):
         """
         扫描所有工作表中的绿色背景单元格（输出单元格）
@@ -761,8 +1428,6 @@ class FormulaExtractor:
         Returns:
             list: 输出单元格信息列表
         """
-        # 使用传入的文件路径创建data_only工作簿
-        #wb_data = load_workbook(self.excel_path, data_only=True)
         output_cells = []
         
         # 扫描所有工作表
@@ -771,39 +1436,13 @@ class FormulaExtractor:
                 continue
             
             worksheet = self.workbook[sheet_name]
-            # 获取对应的data_only工作表
-            #data_worksheet = wb_data[sheet_name]
-            print(f'\n正在扫描工作表输出单元格: {sheet_name}')
-            
-            # 扫描所有单元格
-            for row in range(1, worksheet.max_row + 1):
-                for col in range(1, worksheet.max_column + 1):
-                    cell = worksheet.cell(row=row, column=col)
-                    formula = cell.value
-                    
-                    # 检查是否是公式且单元格不是黄色背景
-                    if (isinstance(formula, str) and formula.startswith('=') and not is_yellow_cell(cell)):                        # 从data_only工作表获取实际值
-                        #data_cell = data_worksheet.cell(row=row, column=col)
-                        #actual_value = data_cell.value
-                        
-                        # 获取表格名称
-                        table_name = self._find_table_name(cell, worksheet, row)
-                        
-                        # 获取标题组合
-                        row_header, col_header, combined_header,actual_value = self._get_cached_headers(sheet_name, cell_address=cell.coordinate)
-                        
-                        # 记录输出单元格信息
-                        output_cells.append({
-                            'cell': cell,
-                            '工作表': sheet_name,
-                            '单元格': cell.coordinate,
-                            '表格名称': table_name,
-                            '标题组合': combined_header,
-                            '当前值': actual_value
-                        })
-        
-        # 关闭data_only工作簿
-        #wb_data.close()
+            sheet_outputs = self._get_sheet_part(
+                sheet_name, 'output_cells', '输出单元格',
+                lambda: self._scan_sheet_output_cells(sheet_name),
+                lambda previous, changes: self._scan_sheet_output_cells(sheet_name, previous, changes)
+            )
+            # 缓存中不保存单元格对象，按地址重新关联
+            output_cells.extend(dict(item, cell=worksheet[item['单元格']]) for item in sheet_outputs)
         
         # 按表格名称和单元格位置排序
         self.output_cells = sorted(output_cells, 
@@ -811,85 +1450,91 @@ class FormulaExtractor:
         
         return self.output_cells
 
-    def _replace_cell_refs(self, original_formula, cell, worksheet):
+    def _scan_sheet_output_cells(self, sheet_name, previous=None, changes=None):
         """
-        使用子单元格的公式替换原公式中的单元格引用
+        扫描一个工作表中的公式单元格（输出单元格）
         
         Args:
-            original_formula: 原始公式字符串
-            cell: 当前单元格
-            cell_refs: 提取的单元格引用列表
-            worksheet: 当前工作表对象
+            sheet_name: 工作表名称
+            previous: 可选，上次运行的扫描结果，与changes一起给出时只重新扫描受变化影响的单元格
+            changes: 可选，工作表相对上次运行的变化范围
             
         Returns:
-            str: 替换后的公式
+            list: 该工作表的输出单元格信息列表（不含单元格对象）
         """
-        if original_formula == '':
-            original_formula = self.get_cell_coordinate_with_sheet(cell)
-            
-        new_formula = original_formula
-
-        #for ref in cell_refs:
-        ref = self.get_cell_coordinate_with_sheet(cell)            # 解析工作表名和单元格地址
-        
-
-
-        if '!' in ref:
-            sheet_name, cell_addr = ref.split('!')
-            sheet_name = sheet_name.strip("'")
-            target_ws = self.workbook[sheet_name]
-        else:
-            target_ws = worksheet
-            cell_addr = ref.lstrip('+')  # 移除可能的前导加号
-        
-        # 获取目标单元格
-        col_letter = ''.join(filter(str.isalpha, cell_addr))
-        row_num = int(''.join(filter(str.isdigit, cell_addr)))
-        #if ref in original_formula:
-        #    target_cell = target_ws.cell(row=row_num, column=column_index_from_string(col_letter))
-        #else:
-        target_cell = cell
-        #    ref = self.get_cell_coordinate_with_sheet(cell)
-
+        # 使用传入的文件路径创建data_only工作簿
+        #wb_data = load_workbook(self.excel_path, data_only=True)
+        output_cells = []
         
-        # 获取单元格的公式或值
-        if isinstance(target_cell.value, str) and target_cell.value.startswith('='):
-            # 递归处理公式
-            sub_formula = self._decompose_formula(target_ws, target_cell.value)
-            # 保持原有的运算符（如果存在）
-            operator = '+' if ref.startswith('+') else ''
-            #replacement = f"{operator}({cell.value[1:]})"  # 移除子公式的等号
-            #formula = str(target_cell.value)
-            replacement = f"{operator}({sub_formula})"  # 移除子公式的等号
+        worksheet = self.workbook[sheet_name]
+        # 获取对应的data_only工作表
+        #data_worksheet = wb_data[sheet_name]
+        if previous is None:
+            print(f'\n正在扫描工作表输出单元格: {sheet_name}')
         else:
-            # 如果是普通值，保持原有格式
-            cell_value = target_cell.value
-            if isinstance(cell_value, (int, float)):
-                replacement = ref  # 保持原有引用
-            else:
-                replacement = f"'{str(cell_value)}'"
+            print(f'\n正在更新工作表输出单元格: {sheet_name}')
+            output_cells = [item for item in previous if not changes.affects_cell(*coordinate_to_tuple(item['单元格']))]
         
-        # 替换公式中的引用
-        new_formula = new_formula.replace(ref, replacement)
-        # if cell.coordinate == 'E14':
-        #     print(' 替换前的公式： ', original_formula)
-        #     print(' 要替换的部分： ', ref)
-        #     print(' 替换后的公式： ', new_formula)
-        #     ipdb.set_trace()
+        # 扫描所有实际存在的单元格
+        for cell in iter_populated_cells(worksheet):
+            row = cell.row
+            if previous is not None and not changes.affects_cell(row, cell.column):
+                continue
+            formula = cell.value
+            
+            # 检查是否是公式且单元格不是黄色背景
+            if (isinstance(formula, str) and formula.startswith('=') and not is_yellow_cell(cell)):                        # 从data_only工作表获取实际值
+                #data_cell = data_worksheet.cell(row=row, column=col)
+                #actual_value = data_cell.value
+                
+                # 获取表格名称
+                table_name = self._find_table_name(cell, worksheet, row)
+                
+                # 获取标题组合
+                row_header, col_header, combined_header,actual_value = self._get_cached_headers(sheet_name, cell_address=cell.coordinate)
+                
+                # 记录输出单元格信息
+                output_cells.append({
+                    '工作表': sheet_name,
+                    '单元格': cell.coordinate,
+                    '表格名称': table_name,
+                    '标题组合': combined_header,
+                    '当前值': actual_value
+                })
         
-        return new_formula
+        # 关闭data_only工作簿
+        #wb_data.close()
+        return output_cells
 
     def get_cell_coordinate_with_sheet(self, cell):
         return f'{cell.parent.title}!{cell.coordinate}'
 
-    def visualize_interactive_formula_tree(self, root_node, output_path):
+    def visualize_interactive_formula_tree(self, nodelist, output_path):
         """
-        将公式依赖树可视化为交互式HTML页面
+        将公式依赖图可视化为交互式HTML页面，并在浏览器中打开
         
         Args:
-            root_node: 树的根节点
+            nodelist: 依赖锥中全部节点的列表，第一个为根节点
             output_path: HTML文件保存路径
         """
+        if self._write_formula_tree_html(nodelist, output_path):
+            self._open_formula_tree(output_path)
+
+    def _write_formula_tree_html(self, nodelist, output_path):
+        """
+        将公式依赖图写成交互式HTML页面
+        
+        页面数据为共享节点表：{'root': 根节点编号, 'nodes': {编号: 节点}}，
+        子节点只记录编号，被多处引用的节点只导出一次；节点较多时只内嵌前几层，
+        其余节点分块放在页面中，展开时才解析（见tree_bundle.chunk_tree_data）
+        
+        Args:
+            nodelist: 依赖锥中全部节点的列表，第一个为根节点
+            output_path: HTML文件保存路径
+            
+        Returns:
+            bool: 是否生成成功
+        """
         try:
             def node_to_dict(node):
                 """将Node对象转换为字典格式"""
@@ -899,42 +1544,30 @@ class FormulaExtractor:
                     'id': str(node.index),
                     'brief': brief_info,
                     'detail': detail_info,
-                    'children': [node_to_dict(child) for child in node.children]
+                    'children': [str(child) for child in node.children]
                 }
             
-            # 将树结构转换为JSON格式
-            tree_data = node_to_dict(root_node)
-            
-            # 读取HTML模板
-            import os
-            template_path = os.path.join(os.path.dirname(__file__), 'show.html')
-            with open(template_path, 'r', encoding='utf-8') as f:
-                html_content = f.read()
-            
-            # 将树数据注入到HTML中
-            import json
-            tree_data_json = json.dumps(tree_data, ensure_ascii=False)
-            #ipdb.set_trace()
-            # 整行替换
-            html_content = html_content.replace(
-                'const sampleData = {};',  # 匹配整行
-                f'const sampleData = {tree_data_json};'
-            )          
-              
+            # 将节点表转换为JSON格式
+            tree_data = {
+                'root': str(nodelist[0].index),
+                'nodes': {str(node.index): node_to_dict(node) for node in nodelist}
+            }
+            
+            # 读取HTML模板（同一进程中只读取一次）并注入树数据，大的树分块按需加载
+            html_content = render_tree_page(tree_data)
+            
             # 保存生成的HTML文件
             with open(output_path, 'w', encoding='utf-8') as f:
                 f.write(html_content)
             
             print(f"公式树已保存到: {output_path}")
-            
-            # 自动在浏览器中打开生成的HTML文件
-            import webbrowser
-            webbrowser.open('file://' + os.path.abspath(output_path))
+            return True
             
         except Exception as e:
             print(f"生成HTML公式树时出错: {str(e)}")
             import traceback
             traceback.print_exc()
+            return False
 
     def _format_node_info(self, node):
         """
@@ -944,48 +1577,6 @@ class FormulaExtractor:
             node: 节点对象
             
         Returns:
-            tuple: (brief_info, detail_info)
-                brief_info: 简略信息，包含单元格地址、公式类型和当前值
-                detail_info: 详细信息，包含完整的公式内容
+            tuple: (brief_info, detail_info)，见tree_bundle.format_node_info
         """
-        try:
-            # 提取公式类型（如SUM, AVERAGE等）
-            formula_type = ''
-            if node.original_formula:
-                if isinstance(node.original_formula, (int, float)):
-                    formula_type = '[数值]'
-                elif isinstance(node.original_formula, str) and node.original_formula.startswith('='):
-                    # 提取第一个函数名
-                    #match = re.match(r'=([A-Z]+)', node.original_formula)
-                    match = re.match(r"^=([A-Z]+)$$.*$$", node.original_formula)
-
-                    if match:
-                        # 复杂函数，只显示函数名
-                        formula_type = f"[{match.group(1)}]"
-                    else:
-                        # 简单四则运算，显示完整公式
-                        # 去掉等号，保留运算部分
-                        simple_formula = node.original_formula
-                        # 如果公式不太长，直接显示
-                        if len(simple_formula) <= 30:  # 可以调整长度阈值
-                            formula_type = f"[{simple_formula}]"
-                        else:
-                            # 如果太长，截断显示
-                            formula_type = f"[{simple_formula[:27]}...]"
-            
-            # 格式化当前值
-            current_value = node.cell_variable_name[3] if node.cell_variable_name[3] is not None else 'N/A'
-            
-            # 构建简略信息
-            brief_info = f" {node.cell_variable_name[2]} {formula_type} = {current_value}"
-            
-            # 构建详细信息
-            detail_info = f"【概要】{brief_info} \n【详细】 {node.cell_name}: {node.original_formula}  {node.cell_variable_name[2]}  当前值:{node.cell_variable_name[3]}",
-            
-            return brief_info, detail_info
-            
-        except Exception as e:
-            print(f"格式化节点信息时出错: {str(e)}")
-            return f"{node.cell_name}", {'cell': node.cell_name, 'error': str(e)}
-
-    
\ No newline at end of file
+        return format_node_info(node, self.formula_parser)
@@ -1,17 +1,22 @@
 """Excel标题提取器，用于提取行列标题"""
 
-from ..utils.cell_utils import is_numeric, is_yellow_cell
+from ..utils.cell_utils import is_numeric, is_yellow_cell, get_cell_value
+from ..utils.sheet_index import MergedCellIndex, SheetOccupancy
 #import ipdb;
 
 class HeaderExtractor:
-    def __init__(self, worksheet):
+    def __init__(self, worksheet, merged_index=None, occupancy=None):
         """
         初始化标题提取器
         
         Args:
             worksheet: openpyxl工作表对象
+            merged_index: 工作表的合并单元格索引，为None时自动构建
+            occupancy: 工作表的行列占用统计，为None时自动构建
         """
         self.ws = worksheet
+        self.merged_index = merged_index if merged_index is not None else MergedCellIndex.from_worksheet(worksheet)
+        self.occupancy = occupancy if occupancy is not None else SheetOccupancy.from_worksheet(worksheet)
         self.special_keywords = ['万元', '元', '%', '百分比', '比例']
         
     def find_numeric_header_title(self, row, col):
@@ -28,29 +33,26 @@ class HeaderExtractor:
         """
         # 向上查找数字序号
         for r in range(row-1, 0, -1):
-            cell = self.ws.cell(row=r, column=col)
             # 检查是否是合并单元格
-            if any(cell.coordinate in merged_range for merged_range in self.ws.merged_cells.ranges):
+            if self.merged_index.is_merged(r, col):
                 break  # 遇到合并单元格就停止搜索
             
-            value = cell.value
+            value = get_cell_value(self.ws, r, col)
             if value and str(value).strip() != '0' and not (isinstance(value, str) and value.startswith('=')):
                 current_value = str(value).strip()
                 if is_numeric(current_value):
                     # 检查上一个单元格
-                    prev_cell = self.ws.cell(row=r-1, column=col) if r > 1 else None
-                    is_prev_merged = prev_cell and any(prev_cell.coordinate in merged_range for merged_range in self.ws.merged_cells.ranges)
+                    is_prev_merged = r > 1 and self.merged_index.is_merged(r-1, col)
                     
                     # 如果上一个单元格是合并单元格或者已经到达顶部，才向左查找非数字标题
                     if is_prev_merged or r == 1:
                         # 在该数字所在行向左查找非数字标题
                         for c in range(col-1, 0, -1):
-                            left_cell = self.ws.cell(row=r, column=c)
                             # 检查是否是合并单元格
                             # if any(left_cell.coordinate in merged_range for merged_range in self.ws.merged_cells.ranges):
                             #     break  # 遇到合并单元格就停止搜索
                             
-                            left_value = left_cell.value
+                            left_value = get_cell_value(self.ws, r, c)
                             if left_value and str(left_value).strip() != '0' and not (isinstance(left_value, str) and left_value.startswith('=')):
                                 if not is_numeric(str(left_value)):
                                     return f"{str(left_value).strip()}_{current_value}"
@@ -74,14 +76,11 @@ class HeaderExtractor:
         row_header = []
         col_header = []
         
-        targert_cell = self.ws.cell(row=row, column=col)
-        
         # 向左查找最近的行标题
         found_row_header_in_first_col = False
         if direction in ['both', 'row']:
             for c in range(col-1, 0, -1):
-                cell = self.ws.cell(row=row, column=c)               
-                value = cell.value
+                value = get_cell_value(self.ws, row, c)
                 # 跳过空值、公式和数字
                 if value and str(value).strip() != '0' and not (isinstance(value, str) and value.startswith('=')):
                     current_value = str(value).strip()
@@ -96,22 +95,16 @@ class HeaderExtractor:
                     continue
 
         # 检查右侧列是否为空
-        right_col_empty = True
-        for r in range(1, self.ws.max_row + 1):
-            right_cell = self.ws.cell(row=r, column=col+1)
-            if right_cell.value:
-                right_col_empty = False
-                break
+        right_col_empty = self.occupancy.is_column_empty(col+1)
   
         # 只有当右侧列不为空，或者没有在第一列找到行标题时，才向上查找列标题
         if direction in ['both', 'column'] and (not right_col_empty or not found_row_header_in_first_col):
             for r in range(row-1, 0, -1):
-                cell = self.ws.cell(row=r, column=col)
                 # 检查是否是合并单元格
-                if any(cell.coordinate in merged_range for merged_range in self.ws.merged_cells.ranges):
+                if self.merged_index.is_merged(r, col):
                     break  # 遇到合并单元格就停止搜索
                 
-                value = cell.value
+                value = get_cell_value(self.ws, r, col)
                 # 跳过空值、公式和数字
                 if value and str(value).strip() != '0' and not (isinstance(value, str) and value.startswith('=')):
                     current_value = str(value).strip()
@@ -0,0 +1,256 @@
+"""整表标题解析器，按行扫描一次计算所有单元格的行列标题"""
+
+from openpyxl.utils import get_column_letter
+
+from ..utils.cell_utils import is_numeric
+from ..utils.sheet_index import MergedCellIndex, SheetOccupancy
+
+SPECIAL_KEYWORDS = ('万元', '元', '%', '百分比', '比例')
+
+
+def header_text(value):
+    """
+    判断单元格值能否作为标题候选，并返回去除空白后的文本
+
+    与HeaderExtractor的判断规则一致：跳过空值、'0'和公式
+
+    Args:
+        value: 单元格值
+
+    Returns:
+        str: 去除空白后的文本，不能作为标题时返回None
+    """
+    if not value:
+        return None
+    text = str(value).strip()
+    if text == '0' or (isinstance(value, str) and value.startswith('=')):
+        return None
+    return text
+
+
+class _ColumnState:
+    """列方向的扫描状态：上方最近的标题及其后的特殊关键词"""
+
+    __slots__ = ('stop', 'specials', 'segment_top', 'numeric_title', 'last_row')
+
+    def __init__(self, segment_top=1, last_row=0):
+        self.stop = None
+        self.specials = []
+        self.segment_top = segment_top  # 上一个合并单元格下方的第一行
+        self.numeric_title = None  # 数字序号补充标题
+        self.last_row = last_row  # 最近一次更新状态的行号
+
+
+class HeaderResolver:
+    def __init__(self, merged_index, occupancy, special_keywords=SPECIAL_KEYWORDS):
+        """
+        初始化标题解析器
+
+        输出与HeaderExtractor.find_nearest_header(row, col, 'both')一致，
+        但只需按行主序扫描一遍单元格：向左和向上的查找结果
+        由逐行、逐列携带的"最近标题"状态得到，总耗时为O(R·C)
+
+        Args:
+            merged_index: MergedCellIndex合并单元格索引
+            occupancy: SheetOccupancy行列占用统计，用于判断右侧列是否为空
+            special_keywords: 需要与前方标题拼接的特殊关键词
+        """
+        self.merged_index = merged_index
+        self.occupancy = occupancy
+        self.special_keywords = set(special_keywords)
+
+    @classmethod
+    def from_worksheet(cls, worksheet, merged_index=None, occupancy=None):
+        """
+        从openpyxl工作表构建解析器
+
+        Args:
+            worksheet: openpyxl工作表对象
+            merged_index: 合并单元格索引，为None时自动构建
+            occupancy: 行列占用统计，为None时自动构建
+
+        Returns:
+            HeaderResolver: 标题解析器
+        """
+        if merged_index is None:
+            merged_index = MergedCellIndex.from_worksheet(worksheet)
+        if occupancy is None:
+            occupancy = SheetOccupancy.from_worksheet(worksheet)
+        return cls(merged_index, occupancy)
+
+    def resolve(self, cells):
+        """
+        按行主序扫描单元格，依次给出每个单元格的行标题和列标题
+
+        Args:
+            cells: 可迭代的(行号, 列号, 值)，必须按行号、列号升序排列
+
+        Yields:
+            tuple: (行号, 列号, 行标题, 列标题)
+        """
+        columns = {}
+        current_row = None
+
+        for row, col, value in cells:
+            if row != current_row:
+                current_row = row
+                row_stop = None
+                row_specials = []
+                row_last_text = None
+                row_last_text_col = None
+
+            state = columns.get(col)
+            if state is None:
+                state = columns[col] = _ColumnState()
+            # 同步上方未经过的合并单元格
+            merged = self.merged_index.nearest_above(row, col)
+            if merged is not None and merged[0] > state.last_row:
+                state = columns[col] = _ColumnState(merged[0] + 1, merged[0])
+
+            # 行标题：左侧最近的非特殊关键词标题加上其后的特殊关键词
+            row_header = None
+            if row_stop is not None:
+                row_header = '_'.join([row_stop] + row_specials)
+            elif row_specials:
+                row_header = '_'.join(row_specials)
+
+            # 只有当右侧列不为空，或者没有在第一列找到行标题时，才查找列标题
+            found_row_header_in_first_col = row_last_text_col == col - 1
+            right_col_empty = self.occupancy.is_column_empty(col + 1)
+            col_header = None
+            if not right_col_empty or not found_row_header_in_first_col:
+                if state.stop is not None:
+                    col_header = '_'.join([state.stop] + state.specials)
+                elif state.specials:
+                    col_header = '_'.join(state.specials)
+                if not col_header:
+                    col_header = state.numeric_title
+
+            yield row, col, row_header, col_header
+
+            # 用当前单元格更新列状态
+            text = header_text(value)
+            if self.merged_index.is_merged(row, col):
+                state = columns[col] = _ColumnState(row + 1, row)
+            else:
+                if row == state.segment_top and text is not None and is_numeric(text) and row_last_text is not None:
+                    state.numeric_title = f"{row_last_text}_{text}"
+                if text is not None and not is_numeric(text):
+                    if text in self.special_keywords:
+                        state.specials.append(text)
+                    else:
+                        state.stop = text
+                        state.specials = []
+                state.last_row = row
+
+            # 用当前单元格更新行状态
+            if text is not None and not is_numeric(text):
+                if text in self.special_keywords:
+                    row_specials.append(text)
+                else:
+                    row_stop = text
+                    row_specials = []
+                row_last_text = text
+                row_last_text_col = col
+
+
+def header_snapshot(worksheet, sheet_values=None):
+    """
+    提取计算标题缓存所需的紧凑快照，只包含基本类型，可以传递给子进程
+
+    Args:
+        worksheet: openpyxl工作表对象
+        sheet_values: 可选，公式单元格的缓存计算结果，(行号, 列号) -> 值
+
+    Returns:
+        tuple: (单元格列表, 合并区域列表)。单元格列表按行主序排列，元素为(行号, 列号, 值, 实际值)；
+               合并区域为(起始行, 起始列, 结束行, 结束列)
+    """
+    sheet_values = sheet_values or {}
+    cells = []
+    for key in sorted(worksheet._cells):
+        value = worksheet._cells[key].value
+        cells.append((key[0], key[1], value, sheet_values.get(key, value)))
+    merged_ranges = [
+        (merged.min_row, merged.min_col, merged.max_row, merged.max_col)
+        for merged in worksheet.merged_cells.ranges
+    ]
+    return cells, merged_ranges
+
+
+def resolve_sheet_headers(cells, merged_index, occupancy):
+    """
+    按行主序计算单元格的标题
+
+    Args:
+        cells: (行号, 列号, 值, 实际值)列表，按行主序排列
+        merged_index: MergedCellIndex合并单元格索引
+        occupancy: SheetOccupancy行列占用统计
+
+    Yields:
+        tuple: (单元格地址, 行标题, 列标题, 组合标题)，与cells一一对应
+    """
+    header_resolver = HeaderResolver(merged_index, occupancy)
+    for row, col, row_header, col_header in header_resolver.resolve((row, col, value) for row, col, value, _ in cells):
+        # 创建组合标题
+        combined_header = None
+        if row_header and col_header:
+            combined_header = f"{row_header}.{col_header}"
+        elif row_header:
+            combined_header = row_header
+        elif col_header:
+            combined_header = col_header
+        yield f"{get_column_letter(col)}{row}", row_header, col_header, combined_header
+
+
+def resolve_snapshot_headers(snapshot):
+    """
+    从header_snapshot得到的快照计算标题，供进程池中的子进程调用
+
+    结果按列返回而不是返回标题缓存字典，相同的标题文本只保留一个对象，
+    这样pickle传回主进程的数据量最小，缓存条目由主进程用build_header_cache组装
+
+    Args:
+        snapshot (tuple): header_snapshot的返回值
+
+    Returns:
+        tuple: (地址列表, 行标题列表, 列标题列表, 组合标题列表)，与快照中的单元格一一对应
+    """
+    cells, merged_ranges = snapshot
+    occupancy = SheetOccupancy((row, col) for row, col, value, _ in cells if value)
+    strings = {}
+    columns = ([], [], [], [])
+    for cell_key, *headers in resolve_sheet_headers(cells, MergedCellIndex(merged_ranges), occupancy):
+        columns[0].append(cell_key)
+        for column, header in zip(columns[1:], headers):
+            column.append(strings.setdefault(header, header))
+    return columns
+
+
+def build_header_cache(cells, resolved, previous=None, changes=None):
+    """
+    组装一个工作表中所有实际存在的单元格的标题缓存
+
+    Args:
+        cells: (行号, 列号, 值, 实际值)列表，按行主序排列
+        resolved: 与cells一一对应的(单元格地址, 行标题, 列标题, 组合标题)
+        previous: 可选，上次运行的标题缓存，与changes一起给出时不受变化影响的单元格直接复用
+        changes: 可选，工作表相对上次运行的变化范围
+
+    Returns:
+        tuple: (单元格地址 -> 标题信息, 重新计算的单元格数量)
+    """
+    sheet_cache = {}
+    updated = 0
+    for (row, col, _, actual_value), (cell_key, row_header, col_header, combined_header) in zip(cells, resolved):
+        if previous is not None and cell_key in previous and not changes.affects_cell(row, col):
+            sheet_cache[cell_key] = previous[cell_key]
+            continue
+        updated += 1
+        sheet_cache[cell_key] = {
+            'row_header': row_header,
+            'col_header': col_header,
+            'combined_header': combined_header,
+            'actual_value': actual_value
+        }
+    return sheet_cache, updated
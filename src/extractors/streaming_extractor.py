@@ -0,0 +1,185 @@
+"""流式公式提取器，以有限内存处理超大工作表的标题缓存和输入输出扫描"""
+
+from openpyxl import load_workbook
+from openpyxl.utils import get_column_letter, range_boundaries
+
+from ..loaders.workbook_loader import CachedValueParser
+from ..utils.cell_utils import is_yellow_fill
+from ..utils.sheet_index import MergedCellIndex, SheetOccupancy
+from .header_resolver import HeaderResolver
+
+OUTPUT_SHEET_NAME = '测算结果输出'
+
+
+class StreamingExtractor:
+    def __init__(self, excel_path):
+        """
+        初始化流式提取器
+
+        以只读方式打开工作簿，逐行解析工作表XML，内存只与列数和合并单元格数量有关，
+        得到的标题缓存条目、输入单元格和输出单元格与FormulaExtractor一致
+
+        Args:
+            excel_path: Excel文件路径
+        """
+        self.excel_path = excel_path
+        self.workbook = load_workbook(excel_path, read_only=True, data_only=False)
+        self.input_cells = []
+        self.output_cells = []
+        self._yellow_styles = {}  # 样式编号 -> 是否黄色背景
+
+    def close(self):
+        """关闭只读工作簿持有的文件句柄"""
+        self.workbook.close()
+
+    def _iter_rows(self, worksheet, parser_holder=None):
+        """
+        逐行解析工作表XML
+
+        Args:
+            worksheet: 只读工作表对象
+            parser_holder: 可选列表，用于取回解析器（解析结束后可读取合并单元格）
+
+        Yields:
+            list: 当前行的单元格解析结果
+        """
+        with worksheet._get_source() as src:
+            parser = CachedValueParser(
+                src, worksheet._shared_strings, False, self.workbook.epoch,
+                self.workbook._date_formats, self.workbook._timedelta_formats,
+                collect=False
+            )
+            if parser_holder is not None:
+                parser_holder.append(parser)
+            for _, cells in parser.parse():
+                yield cells
+
+    def _scan_layout(self, worksheet):
+        """
+        预扫描一遍工作表，得到合并单元格索引和列占用统计
+
+        合并单元格定义位于XML中单元格数据之后，右侧列是否为空也需要看完整列，
+        因此在正式扫描前先流式读取一遍，只保留与列数相关的信息
+
+        Args:
+            worksheet: 只读工作表对象
+
+        Returns:
+            tuple: (MergedCellIndex, SheetOccupancy)
+        """
+        parser_holder = []
+        occupied = set()
+        for cells in self._iter_rows(worksheet, parser_holder):
+            for cell in cells:
+                if cell['value']:
+                    occupied.add(cell['column'])
+
+        merged_ranges = []
+        merged_cells = parser_holder[0].merged_cells
+        if merged_cells is not None:
+            for merge_cell in merged_cells.mergeCell:
+                min_col, min_row, max_col, max_row = range_boundaries(merge_cell.ref)
+                merged_ranges.append((min_row, min_col, max_row, max_col))
+
+        occupancy = SheetOccupancy(((0, col) for col in occupied), track_rows=False)
+        return MergedCellIndex(merged_ranges), occupancy
+
+    def _is_yellow_style(self, style_id):
+        """根据样式编号判断是否为黄色背景，结果按样式缓存"""
+        is_yellow = self._yellow_styles.get(style_id)
+        if is_yellow is None:
+            style = self.workbook._cell_styles[style_id]
+            is_yellow = is_yellow_fill(self.workbook._fills[style.fillId])
+            self._yellow_styles[style_id] = is_yellow
+        return is_yellow
+
+    def iter_sheet_headers(self, sheet_name):
+        """
+        流式计算一个工作表的标题缓存条目，同时收集输入和输出单元格
+
+        Args:
+            sheet_name (str): 工作表名称
+
+        Yields:
+            tuple: (单元格地址, 标题缓存条目)，条目格式与FormulaExtractor.header_cache相同
+        """
+        worksheet = self.workbook[sheet_name]
+        merged_index, occupancy = self._scan_layout(worksheet)
+        header_resolver = HeaderResolver(merged_index, occupancy)
+        anchors = {}  # 合并区域左上角单元格的值，用于查找表格名称
+
+        # 标题解析器只需要(行, 列, 值)，解析器每读入一个单元格就给出它的标题，
+        # 因此当前单元格的其余字段只需保留最近一个
+        current = [None]
+
+        def iter_cells():
+            for cells in self._iter_rows(worksheet):
+                for cell in cells:
+                    current[0] = cell
+                    yield cell['row'], cell['column'], cell['value']
+
+        for row, col, row_header, col_header in header_resolver.resolve(iter_cells()):
+            cell = current[0]
+            value = cell['value']
+            if merged_index.find(row, col) == (row, col):
+                anchors[(row, col)] = value
+
+            combined_header = None
+            if row_header and col_header:
+                combined_header = f"{row_header}.{col_header}"
+            elif row_header:
+                combined_header = row_header
+            elif col_header:
+                combined_header = col_header
+
+            actual_value = cell.get('cached_value', value)
+            cell_key = f"{get_column_letter(col)}{row}"
+            yield cell_key, {
+                'row_header': row_header,
+                'col_header': col_header,
+                'combined_header': combined_header,
+                'actual_value': actual_value
+            }
+
+            # 输入输出单元格扫描
+            is_yellow = self._is_yellow_style(cell['style_id'])
+            is_output = (
+                sheet_name == OUTPUT_SHEET_NAME
+                and isinstance(value, str) and value.startswith('=')
+                and not is_yellow
+            )
+            if is_yellow or is_output:
+                table_name = None
+                merged = merged_index.nearest_above(row, col)
+                if merged is not None:
+                    table_name = anchors.get((merged[1], merged[2])) or None
+                cell_info = {
+                    '工作表': sheet_name,
+                    '单元格': cell_key,
+                    '表格名称': table_name,
+                    '标题组合': combined_header,
+                    '当前值': actual_value
+                }
+                if is_yellow:
+                    self.input_cells.append(cell_info)
+                else:
+                    self.output_cells.append(cell_info)
+
+    def iter_header_cache(self):
+        """
+        流式计算所有工作表的标题缓存条目
+
+        遍历结束后，input_cells和output_cells按与FormulaExtractor相同的规则排序
+
+        Yields:
+            tuple: (工作表名, 单元格地址, 标题缓存条目)
+        """
+        self.input_cells = []
+        self.output_cells = []
+        for sheet_name in self.workbook.sheetnames:
+            print(f'\n正在流式扫描工作表: {sheet_name}')
+            for cell_key, entry in self.iter_sheet_headers(sheet_name):
+                yield sheet_name, cell_key, entry
+
+        self.input_cells.sort(key=lambda x: (x['表格名称'] or '', x['工作表'], x['单元格']))
+        self.output_cells.sort(key=lambda x: (x['表格名称'] or '', x['工作表'], x['单元格']))
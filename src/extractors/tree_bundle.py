@@ -0,0 +1,350 @@
+"""公式树页面的批量生成：所有输出单元格的公式树写入一个共享节点表的页面包"""
+
+import html
+import json
+import os
+import time
+from functools import lru_cache
+
+from ..parsers.formula_parser import FormulaParser
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), 'show.html')
+DATA_PLACEHOLDER = 'const sampleData = {};'
+NODES_FILE = 'formula_tree_nodes.js'
+CHUNK_FILE = 'formula_tree_nodes_{n}.js'
+TREE_FILE = 'tree.html'
+INDEX_FILE = 'index.html'
+INLINE_DEPTH = 3  # 大的公式树在页面中内嵌、初始展开的层数
+CHUNK_SIZE = 500  # 每块的节点数，节点数不超过该值的公式树全部内嵌并完全展开
+
+
+@lru_cache(maxsize=None)
+def load_tree_template(template_path=TEMPLATE_PATH):
+    """
+    读取公式树页面模板，同一进程中只读取一次
+
+    Args:
+        template_path (str): 模板路径
+
+    Returns:
+        str: 模板内容
+    """
+    with open(template_path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def script_json(value):
+    """序列化为可以直接放在<script>中的JSON文本"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/')
+
+
+def chunk_tree_data(tree_data, inline_depth=INLINE_DEPTH, chunk_size=CHUNK_SIZE):
+    """
+    把一棵公式树的节点表拆成内嵌部分和按需加载的块
+
+    节点按从根节点开始的广度优先顺序重新编号，前inline_depth层的节点内嵌，
+    其余节点按编号每chunk_size个一块，页面展开到这些节点时才解析对应的块，
+    首次显示的耗时与树的大小无关
+
+    Args:
+        tree_data (dict): {'root': 根节点编号, 'nodes': {编号: 节点}}
+        inline_depth (int): 内嵌并初始展开的层数
+        chunk_size (int): 每块的节点数，节点数不超过该值时不拆分
+
+    Returns:
+        tuple: (页面数据, 块列表)。页面数据在tree_data基础上增加chunkStart、chunkSize、expandDepth，
+               块列表的第i项为编号从chunkStart + i * chunkSize开始的节点表
+    """
+    nodes = tree_data['nodes']
+    if len(nodes) <= chunk_size:
+        return tree_data, []
+
+    # 广度优先遍历，每个节点记录第一次出现时的层数
+    order = [tree_data['root']]
+    depths = {tree_data['root']: 0}
+    for node_id in order:
+        for child in nodes[node_id]['children']:
+            if child not in depths:
+                depths[child] = depths[node_id] + 1
+                order.append(child)
+
+    new_ids = {node_id: str(position + 1) for position, node_id in enumerate(order)}
+    renumbered = [
+        dict(nodes[node_id], id=new_ids[node_id], children=[new_ids[child] for child in nodes[node_id]['children']])
+        for node_id in order
+    ]
+    inline_count = sum(1 for node_id in order if depths[node_id] <= inline_depth)
+    page_data = {
+        'root': '1',
+        'nodes': {node['id']: node for node in renumbered[:inline_count]},
+        'chunkStart': inline_count + 1,
+        'chunkSize': chunk_size,
+        'expandDepth': inline_depth,
+    }
+    chunks = [
+        {node['id']: node for node in renumbered[start:start + chunk_size]}
+        for start in range(inline_count, len(renumbered), chunk_size)
+    ]
+    return page_data, chunks
+
+
+def render_tree_page(tree_data):
+    """
+    生成一棵公式树的独立页面，大的树只内嵌前几层，其余节点分块放在页面中按需解析
+
+    Args:
+        tree_data (dict): {'root': 根节点编号, 'nodes': {编号: 节点}}
+
+    Returns:
+        str: 页面内容
+    """
+    page_data, chunks = chunk_tree_data(tree_data)
+    # 块以不执行的JSON脚本放在页面头部，浏览器只保存文本，展开到对应节点时才解析
+    chunk_scripts = ''.join(
+        f'    <script type="application/json" id="tree-chunk-{index}">{script_json(chunk)}</script>\n'
+        for index, chunk in enumerate(chunks)
+    )
+    return load_tree_template().replace(
+        '</head>', f'{chunk_scripts}</head>', 1
+    ).replace(
+        DATA_PLACEHOLDER, f'const sampleData = {script_json(page_data)};'
+    )
+
+
+def format_node_info(node, formula_parser):
+    """
+    格式化节点信息，返回简略和详细两种格式
+
+    Args:
+        node: 节点对象
+        formula_parser: FormulaParser，用于识别整体为函数调用的公式
+
+    Returns:
+        tuple: (brief_info, detail_info)
+            brief_info: 简略信息，包含单元格地址、公式类型和当前值
+            detail_info: 详细信息，包含完整的公式内容
+    """
+    try:
+        # 提取公式类型（如SUM, AVERAGE等）
+        formula_type = ''
+        if node.original_formula:
+            if isinstance(node.original_formula, (int, float)):
+                formula_type = '[数值]'
+            elif isinstance(node.original_formula, str) and node.original_formula.startswith('='):
+                # 公式整体是一个函数调用时取函数名
+                function = formula_parser.parse(node.original_formula).single_function
+
+                if function is not None:
+                    # 复杂函数，只显示函数名
+                    formula_type = f"[{function.name}]"
+                else:
+                    # 简单四则运算，显示完整公式
+                    # 去掉等号，保留运算部分
+                    simple_formula = node.original_formula
+                    # 如果公式不太长，直接显示
+                    if len(simple_formula) <= 30:  # 可以调整长度阈值
+                        formula_type = f"[{simple_formula}]"
+                    else:
+                        # 如果太长，截断显示
+                        formula_type = f"[{simple_formula[:27]}...]"
+
+        # 格式化当前值
+        current_value = node.cell_variable_name[3] if node.cell_variable_name[3] is not None else 'N/A'
+
+        # 构建简略信息
+        brief_info = f" {node.cell_variable_name[2]} {formula_type} = {current_value}"
+
+        # 构建详细信息
+        detail_info = f"【概要】{brief_info} \n【详细】 {node.cell_name}: {node.original_formula}  {node.cell_variable_name[2]}  当前值:{node.cell_variable_name[3]}",
+
+        return brief_info, detail_info
+
+    except Exception as e:
+        print(f"格式化节点信息时出错: {str(e)}")
+        return f"{node.cell_name}", {'cell': node.cell_name, 'error': str(e)}
+
+
+class FormulaTreeBundle:
+    def __init__(self, output_dir, formula_parser=None):
+        """
+        初始化公式树页面包
+
+        页面包是一个目录，包含：
+        - index.html：全部输出单元格的索引，链接到对应的公式树
+        - tree.html：公式树页面，按地址中的#根节点编号显示一棵树，模板只读取一次
+        - formula_tree_nodes.js：根节点列表
+        - formula_tree_nodes_<块号>.js：所有公式树共享的节点表，按编号分块，被多个输出单元格引用的节点只写一次；
+          公式树页面展开到某个节点时才加载其所在的块
+
+        生成过程不打开浏览器，可以在服务器上运行
+
+        Args:
+            output_dir (str): 页面包目录，不存在时创建
+            formula_parser: 可选的FormulaParser，用于复用解析缓存
+        """
+        self.output_dir = output_dir
+        self.index_path = os.path.join(output_dir, INDEX_FILE)
+        self.formula_parser = formula_parser or FormulaParser()
+        self.nodes = {}  # 页面包中的节点编号 -> 节点数据
+        self.node_ids = {}  # 节点内容 -> 页面包中的节点编号
+        self.entries = []  # 索引条目：(工作表, 单元格, 标题组合, 合并公式, 根节点编号)
+        self.sizes = []  # 与entries对应的公式树节点数
+        self.files = []  # 已写出的文件名
+        self.render_time = 0.0  # 加入公式树和写出页面包的累计耗时（秒）
+
+    def add(self, formula_info):
+        """
+        加入一个输出单元格的公式树
+
+        节点按内容合并：同一分析会话中共享的节点对象，以及从缓存逐个读取、
+        各自带有独立节点对象的分析结果中代表同一单元格的节点，都只导出一次
+
+        Args:
+            formula_info (dict): 输出单元格的分析结果
+
+        Returns:
+            str: 根节点编号，没有节点时返回None
+        """
+        nodelist = formula_info['依赖树']
+        if len(nodelist) == 0:
+            print(f"警告：单元格 {formula_info['单元格']} 没有生成节点列表")
+            return None
+        start = time.perf_counter()
+        by_index = {node.index: node for node in nodelist}
+        node_ids = [self._node_id(node) for node in nodelist]
+        for node, node_id in zip(nodelist, node_ids):
+            data = self.nodes[node_id]
+            if data['children'] is None:
+                data['children'] = [self._node_id(by_index[child]) for child in node.children]
+        root_id = node_ids[0]
+        self.entries.append((
+            formula_info['工作表'], formula_info['单元格'], formula_info.get('标题组合', ''),
+            formula_info.get('合并公式', ''), root_id
+        ))
+        self.sizes.append(len(nodelist))
+        self.render_time += time.perf_counter() - start
+        return root_id
+
+    def _node_id(self, node):
+        """获取节点在页面包中的编号，第一次出现时导出节点数据"""
+        key = (node.cell_name, str(node.original_formula), str(node.cell_variable_name), str(node.variable_expression))
+        node_id = self.node_ids.get(key)
+        if node_id is None:
+            node_id = str(len(self.nodes) + 1)
+            self.node_ids[key] = node_id
+            brief_info, detail_info = format_node_info(node, self.formula_parser)
+            self.nodes[node_id] = {'id': node_id, 'brief': brief_info, 'detail': detail_info, 'children': None}
+        return node_id
+
+    def write(self):
+        """
+        写出页面包，并报告耗时和大小
+
+        Returns:
+            str: 索引页路径
+        """
+        start = time.perf_counter()
+        os.makedirs(self.output_dir, exist_ok=True)
+        roots = [entry[4] for entry in self.entries]
+        node_ids = list(self.nodes)
+        self.files = [NODES_FILE, TREE_FILE, INDEX_FILE]
+        # 节点按编号每CHUNK_SIZE个写入一个文件，公式树页面展开到对应节点时才加载
+        for index, first in enumerate(range(0, len(node_ids), CHUNK_SIZE)):
+            chunk_file = CHUNK_FILE.format(n=index)
+            with open(os.path.join(self.output_dir, chunk_file), 'w', encoding='utf-8') as f:
+                f.write('formulaTreeAddNodes(')
+                f.write(script_json({node_id: self.nodes[node_id] for node_id in node_ids[first:first + CHUNK_SIZE]}))
+                f.write(');\n')
+            self.files.append(chunk_file)
+        with open(os.path.join(self.output_dir, NODES_FILE), 'w', encoding='utf-8') as f:
+            f.write(f'const formulaTreeRoots = {script_json(roots)};\n')
+            f.write(f'const formulaTreeSizes = {script_json(self.sizes)};\n')
+
+        # 公式树页面先加载根节点列表，再按地址中的根节点编号逐块加载节点
+        tree_page = load_tree_template().replace(
+            '</head>', f'    <script src="{NODES_FILE}"></script>\n</head>', 1
+        ).replace(
+            DATA_PLACEHOLDER,
+            'const formulaTreeRoot = decodeURIComponent(window.location.hash.slice(1)) || formulaTreeRoots[0];\n'
+            f'        const sampleData = {{root: formulaTreeRoot, nodes: {{}}, chunkStart: 1, chunkSize: {CHUNK_SIZE}, '
+            f"chunkUrl: '{CHUNK_FILE}',\n"
+            f'            expandDepth: formulaTreeSizes[formulaTreeRoots.indexOf(formulaTreeRoot)] > {CHUNK_SIZE} '
+            f'? {INLINE_DEPTH} : undefined}};\n'
+            "        window.addEventListener('hashchange', () => window.location.reload());"
+        )
+        with open(os.path.join(self.output_dir, TREE_FILE), 'w', encoding='utf-8') as f:
+            f.write(tree_page)
+
+        index_path = self.index_path
+        with open(index_path, 'w', encoding='utf-8') as f:
+            f.write(self._render_index())
+        self.render_time += time.perf_counter() - start
+        print(
+            f"\n公式树页面包已保存到: {index_path}（{len(self.entries)} 棵公式树，{len(self.nodes)} 个节点，"
+            f"{self.size() / 1024:.1f} KB，耗时 {self.render_time:.2f} 秒）"
+        )
+        return index_path
+
+    def _render_index(self):
+        """生成索引页"""
+        rows = []
+        for sheet_name, coordinate, header, formula, root_id in self.entries:
+            rows.append(
+                f'<tr><td>{html.escape(str(sheet_name))}</td>'
+                f'<td><a href="{TREE_FILE}#{root_id}" target="_blank">{html.escape(str(coordinate))}</a></td>'
+                f'<td>{html.escape(str(header or ""))}</td>'
+                f'<td>{html.escape(str(formula or ""))}</td></tr>'
+            )
+        return f"""<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="utf-8">
+    <title>Excel公式依赖关系图索引</title>
+    <style>
+        body {{ font: 14px sans-serif; margin: 20px; }}
+        table {{ border-collapse: collapse; }}
+        th, td {{ border: 1px solid #ccc; padding: 4px 8px; text-align: left; vertical-align: top; }}
+        th {{ background: #4682B4; color: white; }}
+    </style>
+</head>
+<body>
+    <h3>共 {len(self.entries)} 个输出单元格，{len(self.nodes)} 个节点</h3>
+    <table>
+        <tr><th>工作表</th><th>单元格</th><th>标题组合</th><th>合并公式</th></tr>
+        {chr(10).join(rows)}
+    </table>
+</body>
+</html>
+"""
+
+    def size(self):
+        """页面包中各文件的总字节数"""
+        return sum(os.path.getsize(os.path.join(self.output_dir, name)) for name in self.files)
+
+
+def open_in_browser(path):
+    """在浏览器中打开生成的页面"""
+    import webbrowser
+    webbrowser.open('file://' + os.path.abspath(path))
+
+
+def write_formula_tree_bundle(formula_infos, output_dir, formula_parser=None, open_browser=False):
+    """
+    把全部输出单元格的公式树写成一个页面包
+
+    Args:
+        formula_infos: 可迭代的分析结果
+        output_dir (str): 页面包目录
+        formula_parser: 可选的FormulaParser，用于复用解析缓存
+        open_browser (bool): 是否在浏览器中打开索引页
+
+    Returns:
+        str: 索引页路径
+    """
+    bundle = FormulaTreeBundle(output_dir, formula_parser)
+    for formula_info in formula_infos:
+        bundle.add(formula_info)
+    index_path = bundle.write()
+    if open_browser:
+        open_in_browser(index_path)
+    return index_path
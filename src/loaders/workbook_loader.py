@@ -0,0 +1,140 @@
+"""Excel工作簿加载器，一次解析同时得到公式和缓存的计算结果"""
+
+import threading
+from collections import namedtuple
+
+from openpyxl import load_workbook
+from openpyxl.reader import excel as excel_reader
+from openpyxl.worksheet._reader import WorkSheetParser, WorksheetReader
+
+from ..utils.cell_utils import get_cell_value, iter_populated_cells
+
+# 单元格组合记录：公式（非公式单元格为None）、缓存值（公式的上次计算结果或常量值）、样式编号
+CellRecord = namedtuple('CellRecord', ['row', 'column', 'formula', 'value', 'style_id'])
+
+# openpyxl通过模块级名称查找WorksheetReader，替换期间需要加锁
+_reader_lock = threading.Lock()
+
+
+class CachedValueParser(WorkSheetParser):
+    """
+    解析公式的同时保留<v>节点中缓存的计算结果
+
+    公式单元格的解析结果中增加'cached_value'字段；collect为True时
+    还会把缓存值汇总到cached_values中（流式读取时应关闭以保持内存有界）
+    """
+
+    def __init__(self, *args, collect=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.collect = collect
+        self.cached_values = {}
+
+    def parse_cell(self, element):
+        cell = super().parse_cell(element)
+        if cell['data_type'] == 'f':
+            # 按data_only模式再解析一次同一个节点，得到与data_only=True完全一致的值
+            col_counter = self.col_counter
+            self.data_only = True
+            try:
+                cached = super().parse_cell(element)
+            finally:
+                self.data_only = False
+                self.col_counter = col_counter
+            cell['cached_value'] = cached['value']
+            if self.collect:
+                self.cached_values[(cell['row'], cell['column'])] = cached['value']
+        return cell
+
+
+class _CachedValueWorksheetReader(WorksheetReader):
+    """
+    使用CachedValueParser的工作表读取器，解析结果写入collected
+
+    openpyxl 3.1起读取器和解析器多一个rich_text参数，3.0只传四个参数，这里原样转发
+    """
+
+    collected = None
+
+    def __init__(self, ws, xml_source, shared_strings, data_only, *rich_text):
+        super().__init__(ws, xml_source, shared_strings, data_only, *rich_text)
+        self.parser = CachedValueParser(
+            xml_source, shared_strings, data_only, ws.parent.epoch,
+            ws.parent._date_formats, ws.parent._timedelta_formats, *rich_text
+        )
+
+    def bind_cells(self):
+        super().bind_cells()
+        _CachedValueWorksheetReader.collected[self.ws.title] = self.parser.cached_values
+
+
+class LoadedWorkbook:
+    def __init__(self, workbook, cached_values):
+        """
+        一次加载得到的工作簿及其公式缓存值
+
+        Args:
+            workbook: openpyxl工作簿对象（公式模式）
+            cached_values: 工作表名 -> {(行号, 列号): 缓存值}，只包含公式单元格
+        """
+        self.workbook = workbook
+        self.cached_values = cached_values
+
+    def get_value(self, sheet_name, row, col):
+        """
+        获取单元格的实际值：公式单元格返回缓存的计算结果，其他单元格返回其值
+
+        Args:
+            sheet_name (str): 工作表名称
+            row (int): 行号
+            col (int): 列号
+
+        Returns:
+            单元格的实际值
+        """
+        sheet_values = self.cached_values.get(sheet_name, {})
+        if (row, col) in sheet_values:
+            return sheet_values[(row, col)]
+        return get_cell_value(self.workbook[sheet_name], row, col)
+
+    def iter_cell_records(self, sheet_name):
+        """
+        按行主序遍历工作表中实际存在的单元格，给出组合记录
+
+        Args:
+            sheet_name (str): 工作表名称
+
+        Yields:
+            CellRecord: 单元格组合记录
+        """
+        sheet_values = self.cached_values.get(sheet_name, {})
+        for cell in iter_populated_cells(self.workbook[sheet_name]):
+            key = (cell.row, cell.column)
+            if key in sheet_values:
+                yield CellRecord(cell.row, cell.column, cell.value, sheet_values[key], cell.style_id)
+            else:
+                yield CellRecord(cell.row, cell.column, None, cell.value, cell.style_id)
+
+
+def load_workbook_with_values(filename):
+    """
+    加载工作簿，每个工作表只解析一次，同时保留公式和上次计算的结果
+
+    替代分别以data_only=False和data_only=True加载两次的做法
+
+    Args:
+        filename (str): Excel文件路径
+
+    Returns:
+        LoadedWorkbook: 工作簿及公式缓存值
+    """
+    cached_values = {}
+    with _reader_lock:
+        original_reader = excel_reader.WorksheetReader
+        excel_reader.WorksheetReader = _CachedValueWorksheetReader
+        _CachedValueWorksheetReader.collected = cached_values
+        try:
+            workbook = load_workbook(filename, data_only=False)
+        finally:
+            excel_reader.WorksheetReader = original_reader
+            _CachedValueWorksheetReader.collected = None
+    return LoadedWorkbook(workbook, cached_values)
@@ -0,0 +1,559 @@
+"""公式解析器，把公式切分为词法单元并组织为语法树，按公式文本缓存解析结果"""
+
+import re
+
+from openpyxl.formula.tokenizer import Tokenizer, TokenizerError, Token
+from openpyxl.utils import get_column_letter, column_index_from_string, range_boundaries
+
+# 公式中的字符串常量或单元格/区域引用，用于不经过完整解析快速得到相对公式（R1C1）的写法
+_REFERENCE_PATTERN = re.compile(r"""
+    "(?:[^"]|"")*"
+  | (?<![\w.$])
+    (?P<prefix>'(?:[^']|'')+'!|[^\W\d][\w.]*!)?
+    (?P<address>
+        \$?[A-Za-z]{1,3}\$?[0-9]+(?::\$?[A-Za-z]{1,3}\$?[0-9]+)?
+      | \$?[A-Za-z]{1,3}:\$?[A-Za-z]{1,3}
+      | \$?[0-9]+:\$?[0-9]+
+    )
+    (?![\w.(!])
+""", re.VERBOSE)
+_CORNER_PATTERN = re.compile(r'(\$?)([A-Za-z]*)(\$?)([0-9]*)')
+
+
+class Reference:
+    __slots__ = ('text', 'sheet', 'address', 'bounds', 'absolute', 'prefix')
+
+    def __init__(self, text, sheet, address, bounds, absolute=(False, False, False, False), prefix=''):
+        """
+        单元格或区域引用
+
+        Args:
+            text (str): 公式中的原始写法，如"'My Sheet'!$A$1"
+            sheet (str): 工作表名（已去掉引号），未指定工作表时为None
+            address (str): 去掉$后的地址，区域按左上到右下排列，如'A1'、'A1:B2'、'A:A'
+            bounds (tuple): (起始列, 起始行, 结束列, 结束行)，整行或整列引用中缺少的一维为None
+            absolute (tuple): 与bounds对应的四个部分是否为绝对引用（带$）
+            prefix (str): 原始写法中的工作表部分（含感叹号），未指定工作表时为空
+        """
+        self.text = text
+        self.sheet = sheet
+        self.address = address
+        self.bounds = bounds
+        self.absolute = absolute
+        self.prefix = prefix
+
+    @property
+    def is_range(self):
+        return ':' in self.address
+
+    def qualified(self, default_sheet):
+        """
+        补全工作表名后的引用
+
+        Args:
+            default_sheet (str): 未指定工作表时使用的工作表名（公式所在的工作表）
+
+        Returns:
+            str: 如'Sheet1!A1'、'Sheet1!A1:B2'
+        """
+        return f"{self.sheet or default_sheet}!{self.address}"
+
+    def relative_key(self, row, col):
+        """
+        以(row, col)为原点的R1C1写法，相对部分记为偏移量，绝对部分保持不变
+
+        Args:
+            row (int): 公式所在行
+            col (int): 公式所在列
+
+        Returns:
+            str: 如'Sheet1!R[-1]C2:R[1]C2'
+        """
+        parts = []
+        for index, (letter, origin) in enumerate(zip('CRCR', (col, row, col, row))):
+            value = self.bounds[index]
+            if value is None:
+                parts.append('')
+            elif self.absolute[index]:
+                parts.append(f"{letter}{value}")
+            else:
+                parts.append(f"{letter}[{value - origin}]")
+        corners = f"{parts[1]}{parts[0]}"
+        if self.is_range:
+            corners += f":{parts[3]}{parts[2]}"
+        return f"{self.prefix}{corners}"
+
+    def offset(self, row_offset, col_offset):
+        """
+        把相对部分平移后的引用，用于由公式模板得到复制后的公式中的引用
+
+        Args:
+            row_offset (int): 行偏移
+            col_offset (int): 列偏移
+
+        Returns:
+            Reference: 平移后的引用，偏移为0时返回自身
+        """
+        if row_offset == 0 and col_offset == 0:
+            return self
+        min_col, min_row, max_col, max_row = self.bounds
+        col1_abs, row1_abs, col2_abs, row2_abs = self.absolute
+        bounds = (
+            min_col if min_col is None or col1_abs else min_col + col_offset,
+            min_row if min_row is None or row1_abs else min_row + row_offset,
+            max_col if max_col is None or col2_abs else max_col + col_offset,
+            max_row if max_row is None or row2_abs else max_row + row_offset,
+        )
+        is_range = self.is_range
+        address = _format_address(bounds, is_range)
+        text = self.prefix + (_format_address(bounds, is_range, self.absolute) if any(self.absolute) else address)
+        return Reference(text, self.sheet, address, bounds, self.absolute, self.prefix)
+
+    def __repr__(self):
+        return f"Reference({self.text!r})"
+
+
+def _format_address(bounds, is_range, absolute=None):
+    """
+    根据行列范围生成地址
+
+    Args:
+        bounds (tuple): (起始列, 起始行, 结束列, 结束行)
+        is_range (bool): 是否为区域
+        absolute (tuple): 可选，各部分是否加$
+
+    Returns:
+        str: 如'A1'、'$A$1:B2'、'A:A'
+    """
+    min_col, min_row, max_col, max_row = bounds
+    if absolute is None:
+        if not is_range:
+            return f"{get_column_letter(min_col)}{min_row}"
+        absolute = (False, False, False, False)
+    parts = []
+    for index, value in enumerate(bounds):
+        if value is None:
+            parts.append('')
+            continue
+        text = get_column_letter(value) if index % 2 == 0 else str(value)
+        parts.append(f"${text}" if absolute[index] else text)
+    address = f"{parts[0]}{parts[1]}"
+    if is_range:
+        address += f":{parts[2]}{parts[3]}"
+    return address
+
+
+class Function:
+    __slots__ = ('name', 'args', 'separators')
+
+    def __init__(self, name):
+        """
+        函数调用
+
+        Args:
+            name (str): 函数名，如'SUM'
+        """
+        self.name = name
+        self.args = [[]]  # 每个参数是一个表达式（语法树节点列表）
+        self.separators = []  # 参数之间的分隔符
+
+    def render(self, rendered_args):
+        """按原有分隔符把已渲染的参数组合为函数调用"""
+        parts = [rendered_args[0]]
+        for separator, arg in zip(self.separators, rendered_args[1:]):
+            parts.append(separator)
+            parts.append(arg)
+        return f"{self.name}({''.join(parts)})"
+
+    def __repr__(self):
+        return f"Function({self.name!r}, {self.args!r})"
+
+
+class ArrayConstant(Function):
+    __slots__ = ()
+
+    def render(self, rendered_args):
+        return '{' + super().render(rendered_args)[1:-1] + '}'
+
+
+class Group:
+    __slots__ = ('items',)
+
+    def __init__(self):
+        """括号分组"""
+        self.items = []
+
+    def __repr__(self):
+        return f"Group({self.items!r})"
+
+
+class Literal:
+    __slots__ = ('value', 'kind')
+
+    def __init__(self, value, kind):
+        """
+        运算符或常量
+
+        Args:
+            value (str): 原始写法
+            kind (str): 词法单元类型，如Token.OP_IN、Token.OPERAND、Token.WSPACE
+        """
+        self.value = value
+        self.kind = kind
+
+    @property
+    def is_operator(self):
+        return self.kind in (Token.OP_PRE, Token.OP_IN, Token.OP_POST)
+
+    def __repr__(self):
+        return f"Literal({self.value!r})"
+
+
+def parse_reference(text):
+    """
+    解析单元格或区域引用
+
+    Args:
+        text (str): 引用的原始写法
+
+    Returns:
+        Reference: 引用，不是单元格或区域（如定义的名称）时返回None
+    """
+    sheet = None
+    prefix = ''
+    raw_address = text
+    if '!' in text:
+        sheet, raw_address = text.rsplit('!', 1)
+        prefix = f"{sheet}!"
+        if len(sheet) > 1 and sheet.startswith("'") and sheet.endswith("'"):
+            sheet = sheet[1:-1].replace("''", "'")
+    address = raw_address.replace('$', '').upper()
+    try:
+        min_col, min_row, max_col, max_row = range_boundaries(address)
+    except (ValueError, TypeError):
+        return None
+
+    # 各部分是否为绝对引用：列字母前或行号前的$
+    absolute = []
+    corners = raw_address.split(':')
+    for corner in corners + corners[-1:] * (2 - len(corners)):
+        if corner.lstrip('$')[:1].isalpha():
+            absolute.extend([corner.startswith('$'), '$' in corner.lstrip('$')])
+        else:
+            absolute.extend([False, corner.startswith('$')])
+
+    is_range = ':' in address
+    if is_range:
+        if min_col is not None and max_col is not None and min_col > max_col:
+            min_col, max_col = max_col, min_col
+            absolute[0], absolute[2] = absolute[2], absolute[0]
+        if min_row is not None and max_row is not None and min_row > max_row:
+            min_row, max_row = max_row, min_row
+            absolute[1], absolute[3] = absolute[3], absolute[1]
+    bounds = (min_col, min_row, max_col, max_row)
+    return Reference(text, sheet, _format_address(bounds, is_range), bounds, tuple(absolute), prefix)
+
+
+def iter_references(items):
+    """
+    按出现顺序遍历表达式中的全部引用（包括函数参数和括号内）
+
+    Args:
+        items (list): 语法树节点列表
+
+    Yields:
+        Reference: 引用
+    """
+    for item in items:
+        if isinstance(item, Reference):
+            yield item
+        elif isinstance(item, Function):
+            for arg in item.args:
+                yield from iter_references(arg)
+        elif isinstance(item, Group):
+            yield from iter_references(item.items)
+
+
+def render(items, format_reference=None):
+    """
+    把语法树还原为公式文本（不含等号，去掉原有空白）
+
+    Args:
+        items (list): 语法树节点列表
+        format_reference: 可选，Reference -> 文本，默认使用原始写法
+
+    Returns:
+        str: 公式文本
+    """
+    parts = []
+    for item in items:
+        if isinstance(item, Reference):
+            parts.append(format_reference(item) if format_reference else item.text)
+        elif isinstance(item, Function):
+            parts.append(item.render([render(arg, format_reference) for arg in item.args]))
+        elif isinstance(item, Group):
+            parts.append(f"({render(item.items, format_reference)})")
+        elif item.kind != Token.WSPACE:
+            parts.append(item.value)
+    return ''.join(parts)
+
+
+class ParsedFormula:
+    __slots__ = ('text', 'items', 'references', 'error')
+
+    def __init__(self, text, items, error=None):
+        """
+        公式的解析结果
+
+        Args:
+            text (str): 公式文本
+            items (list): 语法树节点列表（顶层表达式）
+            error (str): 无法解析时的错误信息，此时items只包含一个原样保留的常量
+        """
+        self.text = text
+        self.items = items
+        self.references = tuple(iter_references(items))
+        self.error = error
+
+    @property
+    def single_function(self):
+        """公式整体是一个函数调用时返回该函数，否则返回None"""
+        if len(self.items) == 1 and isinstance(self.items[0], Function) \
+                and not isinstance(self.items[0], ArrayConstant):
+            return self.items[0]
+        return None
+
+
+def _build_items(tokens):
+    """
+    把词法单元序列组织为语法树
+
+    Args:
+        tokens (list): openpyxl Tokenizer得到的词法单元
+
+    Returns:
+        list: 顶层表达式的语法树节点列表
+    """
+    root = []
+    stack = []  # 尚未闭合的函数或括号
+    current = root
+    for token in tokens:
+        if token.type == Token.FUNC and token.subtype == Token.OPEN:
+            node = Function(token.value[:-1])
+        elif token.type == Token.ARRAY and token.subtype == Token.OPEN:
+            node = ArrayConstant('')
+        elif token.type == Token.PAREN and token.subtype == Token.OPEN:
+            node = Group()
+        elif token.subtype == Token.CLOSE:
+            if not stack:
+                raise TokenizerError(f"括号不匹配: {token.value}")
+            stack.pop()
+            top = stack[-1] if stack else None
+            current = root if top is None else (top.items if isinstance(top, Group) else top.args[-1])
+            continue
+        elif token.type == Token.SEP and stack and isinstance(stack[-1], Function):
+            stack[-1].separators.append(token.value)
+            stack[-1].args.append([])
+            current = stack[-1].args[-1]
+            continue
+        else:
+            reference = parse_reference(token.value) \
+                if token.type == Token.OPERAND and token.subtype == Token.RANGE else None
+            current.append(reference if reference is not None else Literal(token.value, token.type))
+            continue
+
+        current.append(node)
+        stack.append(node)
+        current = node.items if isinstance(node, Group) else node.args[-1]
+    if stack:
+        raise TokenizerError("括号不匹配")
+    return root
+
+
+class FormulaParser:
+    def __init__(self):
+        """
+        公式解析器，同一公式文本只解析一次
+
+        使用openpyxl的Tokenizer切分词法单元，能正确处理嵌套括号、带引号的工作表名和字符串常量
+        """
+        self._cache = {}
+        self._formulas = {}  # 按出现顺序的不同公式文本，包括通过模板处理、没有单独解析的副本
+        self.parse_count = 0  # 实际解析的次数（不含缓存命中）
+        self._templates = {}  # R1C1写法的公式 -> FormulaTemplate，无法使用模板时为False
+        self.template_instances = 0  # 通过模板处理的公式单元格数
+        self._last_template = (None, None)  # 最近一次查询的((公式, 行, 列), 模板)
+
+    def parse(self, formula):
+        """
+        解析公式
+
+        Args:
+            formula (str): 公式文本，可以带或不带等号
+
+        Returns:
+            ParsedFormula: 解析结果
+        """
+        self._formulas[formula] = None
+        parsed = self._cache.get(formula)
+        if parsed is None:
+            self.parse_count += 1
+            text = formula if formula.startswith('=') else f"={formula}"
+            try:
+                parsed = ParsedFormula(formula, _build_items(Tokenizer(text).items))
+            except TokenizerError as e:
+                parsed = ParsedFormula(formula, [Literal(text[1:], Token.OPERAND)], str(e))
+            self._cache[formula] = parsed
+        return parsed
+
+    def __len__(self):
+        return len(self._formulas)
+
+    def __iter__(self):
+        """
+        按出现顺序遍历处理过的不同公式文本
+
+        通过模板处理的副本即使没有单独解析也计入，结果与先解析了哪一个副本无关，
+        因此并行追踪时各子进程的结果合并后与串行追踪相同
+        """
+        return iter(self._formulas)
+
+    def template(self, formula, row, col):
+        """
+        获取公式相对于所在单元格的公式模板，复制得到的公式（R1C1写法相同）共享同一模板
+
+        Args:
+            formula (str): 公式文本，以等号开头
+            row (int): 公式所在行
+            col (int): 公式所在列
+
+        Returns:
+            FormulaTemplate: 公式模板，公式无法解析或引用无法按偏移还原时返回None
+        """
+        if self._last_template[0] == (formula, row, col):
+            # 同一单元格的分解、引用提取等步骤连续查询同一模板
+            return self._last_template[1]
+        self._formulas[formula] = None
+        key, reference_keys = _relative_formula(formula, row, col)
+        template = self._templates.get(key)
+        if template is None:
+            parsed = self.parse(formula)
+            # 快速识别的引用必须与完整解析的结果一致，否则该相对公式不使用模板
+            shareable = parsed.error is None and \
+                reference_keys == [ref.relative_key(row, col) for ref in parsed.references]
+            template = FormulaTemplate(key, parsed, row, col) if shareable else False
+            self._templates[key] = template
+        self.template_instances += 1
+        self._last_template = ((formula, row, col), template or None)
+        return template or None
+
+    @property
+    def template_count(self):
+        """不同的相对公式数量"""
+        return len(self._templates)
+
+
+def _relative_formula(formula, row, col):
+    """
+    把公式中的引用改写为以(row, col)为原点的R1C1写法
+
+    Args:
+        formula (str): 公式文本
+        row (int): 公式所在行
+        col (int): 公式所在列
+
+    Returns:
+        tuple: (改写后的公式, 按出现顺序的各引用R1C1写法)
+    """
+    reference_keys = []
+
+    def replace(match):
+        address = match.group('address')
+        if address is None:
+            return match.group(0)
+        corners = []
+        for corner in address.split(':'):
+            col_abs, letters, row_abs, digits = _CORNER_PATTERN.fullmatch(corner).groups()
+            if not letters:
+                col_abs, row_abs = '', col_abs
+            parts = ''
+            if digits:
+                value = int(digits)
+                parts += f"R{value}" if row_abs else f"R[{value - row}]"
+            if letters:
+                value = column_index_from_string(letters.upper())
+                parts += f"C{value}" if col_abs else f"C[{value - col}]"
+            corners.append(parts)
+        key = f"{match.group('prefix') or ''}{':'.join(corners)}"
+        reference_keys.append(key)
+        return key
+
+    return _REFERENCE_PATTERN.sub(replace, formula), reference_keys
+
+
+class FormulaTemplate:
+    __slots__ = ('key', 'parsed', 'row', 'col', '_compiled', '_positions', '_instance')
+
+    def __init__(self, key, parsed, row, col):
+        """
+        相对公式模板，保存首次出现的公式的解析结果，其余副本按行列偏移得到
+
+        Args:
+            key (str): R1C1写法的公式
+            parsed (ParsedFormula): 首次出现的公式的解析结果
+            row (int): 首次出现的公式所在行
+            col (int): 首次出现的公式所在列
+        """
+        self.key = key
+        self.parsed = parsed
+        self.row = row
+        self.col = col
+        self._compiled = {}  # 渲染函数 -> (引用之间的文本片段, 各占位符对应的引用序号)
+        self._positions = {id(ref): index for index, ref in enumerate(parsed.references)}
+        self._instance = (None, None)  # 最近一个副本的((行, 列), 引用)
+
+    def references(self, row, col):
+        """
+        位于(row, col)的副本中的全部引用
+
+        Returns:
+            list: 按出现顺序的Reference
+        """
+        if self._instance[0] != (row, col):
+            row_offset, col_offset = row - self.row, col - self.col
+            self._instance = ((row, col), [ref.offset(row_offset, col_offset) for ref in self.parsed.references])
+        return self._instance[1]
+
+    def render(self, render_items, row, col, format_reference):
+        """
+        按渲染函数得到位于(row, col)的副本的文本
+
+        渲染函数对每个模板只执行一次：引用先渲染为占位符，
+        之后每个副本只需把平移后的引用填入占位符
+
+        Args:
+            render_items: (语法树节点列表, Reference -> 文本) -> 文本，引用的文本只能由format_reference得到
+            row (int): 副本所在行
+            col (int): 副本所在列
+            format_reference: Reference -> 文本
+
+        Returns:
+            str: 渲染结果
+        """
+        compiled = self._compiled.get(render_items)
+        if compiled is None:
+            order = []
+
+            def placeholder(ref):
+                order.append(self._positions[id(ref)])
+                return '\x00'
+
+            compiled = (render_items(self.parsed.items, placeholder).split('\x00'), order)
+            self._compiled[render_items] = compiled
+        fragments, positions = compiled
+        refs = self.references(row, col)
+        parts = [fragments[0]]
+        for position, fragment in zip(positions, fragments[1:]):
+            parts.append(format_reference(refs[position]))
+            parts.append(fragment)
+        return ''.join(parts)
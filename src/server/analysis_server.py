@@ -0,0 +1,440 @@
+"""常驻的本地分析服务：工作簿只加载一次，之后在分析结果快照上查询、追踪和解释单元格"""
+
+import json
+import time
+import asyncio
+import inspect
+import threading
+from collections import deque
+from urllib.parse import urlsplit, parse_qsl
+from ..extractors.formula_extractor import NodeStore, formula_to_json
+from .analysis_snapshot import normalize_cell_name
+
+# 每个请求方法保留的最近延迟样本数，用于计算分位数
+LATENCY_SAMPLES = 1024
+# 请求行、请求头和请求体的最大字节数
+MAX_REQUEST_SIZE = 1 << 20
+
+
+class RequestError(Exception):
+    """请求参数错误，返回给客户端的状态码由status给出"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class LatencyStats:
+    def __init__(self, samples=LATENCY_SAMPLES):
+        """
+        一个请求方法的延迟统计
+
+        Args:
+            samples (int): 保留的最近延迟样本数
+        """
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=samples)
+
+    def add(self, elapsed, failed=False):
+        self.count += 1
+        self.errors += failed
+        self.total += elapsed
+        self.recent.append(elapsed)
+
+    def summary(self):
+        """
+        Returns:
+            dict: 请求数、错误数，以及平均、中位数、p95和最大延迟（毫秒，分位数按最近的样本计算）
+        """
+        recent = sorted(self.recent)
+        percentile = lambda q: recent[min(len(recent) - 1, int(q * len(recent)))] if recent else 0.0
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'mean_ms': round(self.total / self.count, 3) if self.count else 0.0,
+            'p50_ms': round(percentile(0.5), 3),
+            'p95_ms': round(percentile(0.95), 3),
+            'max_ms': round(recent[-1], 3) if recent else 0.0,
+        }
+
+
+class LiveTracer:
+    def __init__(self, formula_extractor):
+        """
+        在快照之外按需追踪的单元格（非输出单元格的公式、不在标题缓存中的空白单元格）
+
+        追踪和计算空白单元格标题会修改提取器的节点表、依赖图和标题缓存，调用方需要持有lock；
+        结果按单元格缓存，同一单元格之后的请求直接返回
+
+        Args:
+            formula_extractor (FormulaExtractor): 与快照对应的提取器
+        """
+        self.extractor = formula_extractor
+        self.lock = threading.Lock()
+        self.traces = {}  # 单元格名称 -> 可以JSON序列化的追踪结果
+        # 服务期间的追踪共用一个节点表，不同单元格共享的节点只创建一次
+        formula_extractor.node_store = NodeStore()
+
+    async def run(self, function, *args):
+        """在线程池中持锁执行，不阻塞事件循环中的只读查询"""
+        def run():
+            with self.lock:
+                return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, run)
+
+    def trace(self, name, sheet_name, address):
+        """持锁执行：追踪公式单元格并缓存结果，等待锁期间其他请求已追踪过时直接返回"""
+        traced = self.traces.get(name)
+        if traced is not None:
+            return traced
+        cell = self.extractor.workbook[sheet_name][address]
+        if not (isinstance(cell.value, str) and cell.value.startswith('=')):
+            raise RequestError(f'{name} 不是公式单元格', status=404)
+        basic_cells, new_formula, tree, path, variable_formula = self.extractor._trace_output_cell(cell)
+        traced = formula_to_json({
+            '工作表': sheet_name,
+            '单元格': address,
+            '原始公式': cell.value,
+            '标题组合': '',
+            '合并公式': new_formula,
+            '变量公式': variable_formula,
+            '基础单元格': basic_cells,
+            '路径': [str(node) for node in path],
+            '依赖树': tree,
+        })
+        self.traces[name] = traced
+        return traced
+
+    def headers(self, sheet_name, address):
+        """持锁执行：计算不在标题缓存中的单元格的标题"""
+        return self.extractor._get_cached_headers(sheet_name, address)
+
+
+class AnalysisServer:
+    def __init__(self, loader):
+        """
+        在分析结果快照上提供查询服务
+
+        请求在开始时取得当前的(快照, LiveTracer)，之后只读取这一对象：快照中的查询不加锁并发执行，
+        快照之外的追踪交给LiveTracer。重新加载在线程池中构建新的快照，完成后一次赋值替换，
+        进行中的请求继续使用旧快照，之后的请求使用新快照
+
+        Args:
+            loader (callable): 无参数，加载工作簿并返回(AnalysisSnapshot, FormulaExtractor)
+        """
+        self.loader = loader
+        self.current = None  # (AnalysisSnapshot, LiveTracer)，只整体替换
+        self.generation = 0  # 已加载的快照数
+        self.reload_lock = None  # 同一时间只进行一次重新加载，在事件循环中创建
+        self.metrics = {}  # 请求方法 -> LatencyStats
+        self.started = time.time()
+        self.methods = {
+            'health': self.health,
+            'metrics': self.get_metrics,
+            'reload': self.reload,
+            'inputs': self.list_inputs,
+            'outputs': self.list_outputs,
+            'headers': self.get_headers,
+            'search': self.search,
+            'trace': self.trace,
+            'explain': self.explain,
+        }
+
+    async def load(self):
+        """
+        在线程池中加载工作簿并构建快照，完成后替换当前快照
+
+        Returns:
+            AnalysisSnapshot: 新的快照
+        """
+        snapshot, formula_extractor = await asyncio.get_running_loop().run_in_executor(None, self.loader)
+        self.current = (snapshot, LiveTracer(formula_extractor))
+        self.generation += 1
+        return snapshot
+
+    @staticmethod
+    def _resolve_cell(snapshot, name):
+        """
+        规范化请求中的单元格名称，并检查工作表是否存在
+
+        Returns:
+            tuple: (规范化的名称, 工作表名, 单元格地址)
+
+        Raises:
+            RequestError: 未给出单元格、格式错误或工作表不存在
+        """
+        if not name:
+            raise RequestError('缺少参数cell，如cell=测算结果输出!B5')
+        try:
+            name, sheet_name, address = normalize_cell_name(name)
+        except ValueError as e:
+            raise RequestError(str(e))
+        if sheet_name not in snapshot.sheet_names:
+            raise RequestError(f'工作表不存在: {sheet_name}', status=404)
+        return name, sheet_name, address
+
+    @staticmethod
+    def _bind(handler, state, params):
+        """
+        按请求方法的签名检查参数，只有缺少或未知的参数作为请求错误，方法内部的TypeError仍按服务端错误处理
+
+        Returns:
+            tuple: (位置参数, 关键字参数)
+
+        Raises:
+            RequestError: 缺少必需参数或有未知参数
+        """
+        try:
+            bound = inspect.signature(handler).bind(state, **params)
+        except TypeError as e:
+            raise RequestError(f'参数错误: {e}')
+        return bound.args, bound.kwargs
+
+    async def handle(self, method, params):
+        """
+        执行一个请求并记录延迟
+
+        Args:
+            method (str): 请求方法，即URL路径，如'trace'
+            params (dict): 请求参数
+
+        Returns:
+            tuple: (HTTP状态码, 响应内容, 耗时毫秒数)
+        """
+        handler = self.methods.get(method)
+        if handler is None:
+            return 404, {'error': f'未知的请求: {method}', 'methods': sorted(self.methods)}, 0.0
+        start = time.perf_counter()
+        try:
+            # 整个请求使用开始时的快照，期间重新加载不影响结果的一致性
+            args, kwargs = self._bind(handler, self.current, params)
+            status, result = 200, await handler(*args, **kwargs)
+        except RequestError as e:
+            status, result = e.status, {'error': str(e)}
+        except Exception as e:
+            status, result = 500, {'error': f'{type(e).__name__}: {e}'}
+        elapsed = (time.perf_counter() - start) * 1000
+        self.metrics.setdefault(method, LatencyStats()).add(elapsed, failed=status != 200)
+        return status, result, elapsed
+
+    async def health(self, state):
+        snapshot, tracer = state
+        return dict(
+            snapshot.summary(), status='ok', generation=self.generation,
+            uptime_s=round(time.time() - self.started, 1), live_traced=len(tracer.traces),
+        )
+
+    async def get_metrics(self, state):
+        return {method: stats.summary() for method, stats in sorted(self.metrics.items())}
+
+    async def reload(self, state):
+        """
+        重新加载工作簿，加载期间其他请求继续使用当前快照
+
+        Returns:
+            dict: 新快照的概况和加载用时
+        """
+        if self.reload_lock is None:
+            self.reload_lock = asyncio.Lock()
+        start = time.perf_counter()
+        async with self.reload_lock:
+            # 等待期间其他请求已完成重新加载时不再重复加载
+            if self.current is state:
+                await self.load()
+        return dict(self.current[0].summary(), generation=self.generation, load_s=round(time.perf_counter() - start, 2))
+
+    async def list_inputs(self, state, table=None):
+        """
+        列出输入单元格
+
+        Args:
+            table (str): 可选，只列出表格名称包含该文本的输入单元格
+
+        Returns:
+            dict: count和cells（输入单元格信息列表）
+        """
+        cells = state[0].list_inputs(table)
+        return {'count': len(cells), 'cells': cells}
+
+    async def list_outputs(self, state, table=None):
+        """
+        列出输出单元格
+
+        Args:
+            table (str): 可选，只列出表格名称包含该文本的输出单元格
+
+        Returns:
+            dict: count和cells（输出单元格信息列表）
+        """
+        cells = state[0].list_outputs(table)
+        return {'count': len(cells), 'cells': cells}
+
+    async def search(self, state, q=None, limit=10, kind=None):
+        """
+        按标题名称查找输入/输出单元格，如/search?q=营业收入 2025
+
+        Args:
+            q (str): 查询文本
+            limit (int): 最多返回的单元格数
+            kind (str): 可选，'输入'或'输出'
+
+        Returns:
+            dict: count和cells（单元格信息和得分，按得分从高到低排列）
+        """
+        if not q:
+            raise RequestError('缺少参数q，如q=营业收入 2025')
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise RequestError(f'limit必须是整数: {limit}')
+        cells = state[0].search(q, limit, kind)
+        return {'count': len(cells), 'cells': cells}
+
+    async def get_headers(self, state, cell=None):
+        """
+        获取单元格的行标题、列标题和组合标题
+
+        Returns:
+            dict: 单元格名称、行标题、列标题、组合标题和当前值
+        """
+        snapshot, tracer = state
+        name, sheet_name, address = self._resolve_cell(snapshot, cell)
+        headers = snapshot.get_headers(name)
+        if headers is None:
+            # 不在快照中的空白单元格需要计算标题
+            headers = await tracer.run(tracer.headers, sheet_name, address)
+        row_header, col_header, combined_header, actual_value = headers
+        return {
+            '单元格': name, '行标题': row_header, '列标题': col_header,
+            '标题组合': combined_header, '当前值': actual_value,
+        }
+
+    async def trace(self, state, cell=None):
+        """
+        追踪公式单元格的依赖，结果与--jsonl输出的一行相同
+
+        Returns:
+            dict: 合并公式、变量公式、基础单元格、路径和依赖树
+
+        Raises:
+            RequestError: 单元格不是公式单元格
+        """
+        snapshot, tracer = state
+        name, sheet_name, address = self._resolve_cell(snapshot, cell)
+        traced = snapshot.get_trace(name) or tracer.traces.get(name)
+        if traced is None:
+            traced = await tracer.run(tracer.trace, name, sheet_name, address)
+        return traced
+
+    async def explain(self, state, cell=None):
+        """
+        用标题解释一个公式单元格：它的含义、公式、依赖的输入单元格及其当前值
+
+        Returns:
+            dict: 单元格名称、表格名称、标题、当前值、公式、依赖的输入单元格和其他基础单元格
+        """
+        traced = await self.trace(state, cell)
+        return state[0].explain(f"{traced['工作表']}!{traced['单元格']}", traced)
+
+    async def handle_connection(self, reader, writer):
+        """
+        处理一个HTTP/1.1连接，支持keep-alive，同一连接上的请求依次处理
+
+        GET /<方法>?参数=值，或POST /<方法>，请求体为JSON对象形式的参数；响应为JSON，
+        X-Elapsed-Ms响应头为服务端处理耗时
+        """
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                verb, target, version, headers, body = request
+                url = urlsplit(target)
+                method = url.path.strip('/')
+                params = dict(parse_qsl(url.query))
+                if verb == 'POST' and body:
+                    try:
+                        params.update(json.loads(body))
+                    except (ValueError, TypeError):
+                        await self._write_response(writer, 400, {'error': '请求体不是JSON对象'}, 0.0, False)
+                        break
+                if verb not in ('GET', 'POST'):
+                    status, result, elapsed = 405, {'error': f'不支持的请求方式: {verb}'}, 0.0
+                else:
+                    status, result, elapsed = await self.handle(method, params)
+                keep_alive = (
+                    version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                )
+                await self._write_response(writer, status, result, elapsed, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader):
+        """
+        读取一个HTTP请求
+
+        Returns:
+            tuple: (请求方式, 请求目标, HTTP版本, 请求头, 请求体)，连接已关闭时返回None
+        """
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        # 请求目标可能是未经百分号编码的UTF-8（如中文工作表名），按UTF-8解码后与编码过的写法一致
+        verb, target, version = request_line.decode('utf-8', 'surrogateescape').split()
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        if length > MAX_REQUEST_SIZE:
+            raise ValueError('请求体过大')
+        body = await reader.readexactly(length) if length else b''
+        return verb, target, version, headers, body
+
+    @staticmethod
+    async def _write_response(writer, status, result, elapsed, keep_alive):
+        body = json.dumps(result, ensure_ascii=False, default=str).encode('utf-8')
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}.get(
+            status, 'Internal Server Error'
+        )
+        writer.write(
+            f'HTTP/1.1 {status} {reason}\r\n'
+            f'Content-Type: application/json; charset=utf-8\r\n'
+            f'Content-Length: {len(body)}\r\n'
+            f'X-Elapsed-Ms: {elapsed:.3f}\r\n'
+            f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode('latin-1') + body
+        )
+        await writer.drain()
+
+    async def serve(self, host='127.0.0.1', port=8765, socket_path=None):
+        """
+        启动服务并一直运行
+
+        Args:
+            host (str): 监听地址，默认只接受本机连接
+            port (int): 监听端口
+            socket_path (str): 可选，改为监听Unix套接字
+        """
+        start = time.perf_counter()
+        snapshot = await self.load()
+        print(f'分析结果快照已就绪：{len(snapshot.output_cells)} 个输出单元格，用时 {time.perf_counter() - start:.2f} 秒')
+        if socket_path:
+            server = await asyncio.start_unix_server(self.handle_connection, socket_path, limit=MAX_REQUEST_SIZE)
+            address = socket_path
+        else:
+            server = await asyncio.start_server(self.handle_connection, host, port, limit=MAX_REQUEST_SIZE)
+            address = f'http://{host}:{port}'
+        print(f'\n分析服务已启动: {address}')
+        print(f"可用请求: {', '.join(f'/{method}' for method in self.methods)}")
+        async with server:
+            await server.serve_forever()
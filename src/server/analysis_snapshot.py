@@ -0,0 +1,247 @@
+"""分析结果的不可变快照，只包含元组和只读映射，可以在多个线程或协程中不加锁地并发查询"""
+
+import time
+from types import MappingProxyType
+from openpyxl.utils import coordinate_to_tuple
+from ..extractors.formula_extractor import formula_to_json
+
+
+def _freeze(value):
+    """把字典和列表逐层转换为只读映射和元组"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value):
+    """_freeze的逆操作，返回给调用方可以修改、可以JSON序列化的副本"""
+    if isinstance(value, MappingProxyType):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+def normalize_cell_name(name):
+    """
+    把单元格名称规范为'工作表!A1'
+
+    Args:
+        name (str): 单元格名称，可以带$和工作表名两侧的单引号，如"'参数'!$b$3"
+
+    Returns:
+        tuple: (规范化的名称, 工作表名, 单元格地址)
+
+    Raises:
+        ValueError: 未包含工作表或地址无效
+    """
+    sheet_name, separator, address = (name or '').rpartition('!')
+    if not separator:
+        raise ValueError(f'单元格名称需要包含工作表: {name}')
+    sheet_name = sheet_name.strip("'")
+    address = address.replace('$', '').upper()
+    try:
+        coordinate_to_tuple(address)
+    except ValueError:
+        raise ValueError(f'无效的单元格地址: {name}')
+    return f'{sheet_name}!{address}', sheet_name, address
+
+
+class AnalysisSnapshot:
+    __slots__ = (
+        'version', 'created', 'sheet_names', 'input_cells', 'output_cells', 'inputs', 'outputs',
+        'headers', 'traces', 'header_index',
+    )
+
+    def __init__(self, version, sheet_names, input_cells, output_cells, headers, traces, header_index):
+        """
+        创建快照，之后不能再修改属性
+
+        构建时逐层复制为元组和只读映射（MappingProxyType），不引用openpyxl对象和依赖树节点，
+        之后任何调用方都无法修改；查询方法返回可修改的副本，不打印、不写缓存
+
+        Args:
+            version (str): 工作簿版本标识，如文件修改时间
+            sheet_names (iterable): 工作表名称
+            input_cells (iterable): 输入单元格信息（不含单元格对象）
+            output_cells (iterable): 输出单元格信息（不含单元格对象）
+            headers (dict): 工作表名 -> {单元格地址: (行标题, 列标题, 组合标题, 当前值)}
+            traces (dict): 单元格名称 -> 可以JSON序列化的依赖分析结果
+            header_index (HeaderIndex): 输入/输出单元格的标题索引，构建后只读
+        """
+        values = {
+            'version': version,
+            'created': time.time(),
+            'sheet_names': frozenset(sheet_names),
+            'input_cells': tuple(map(_freeze, input_cells)),
+            'output_cells': tuple(map(_freeze, output_cells)),
+            'headers': _freeze(headers),
+            'traces': _freeze(traces),
+            'header_index': header_index,
+        }
+        values['inputs'] = MappingProxyType(
+            {f"{item['工作表']}!{item['单元格']}": item for item in values['input_cells']}
+        )
+        values['outputs'] = MappingProxyType(
+            {f"{item['工作表']}!{item['单元格']}": item for item in values['output_cells']}
+        )
+        for key, value in values.items():
+            object.__setattr__(self, key, value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('AnalysisSnapshot不能修改，重新加载时创建新的快照')
+
+    __delattr__ = __setattr__
+
+    @classmethod
+    def from_extractor(cls, formula_extractor, formula_infos, version=''):
+        """
+        从完成扫描的FormulaExtractor和输出单元格的依赖分析结果构建快照
+
+        Args:
+            formula_extractor (FormulaExtractor): 已扫描输入/输出单元格的提取器
+            formula_infos (iterable): 依赖分析结果，如iter_formula_dependencies的返回值
+            version (str): 工作簿版本标识
+
+        Returns:
+            AnalysisSnapshot: 新的快照
+        """
+        strip = lambda item: {key: value for key, value in item.items() if key != 'cell'}
+        traces = {}
+        for formula_info in formula_infos:
+            traces[f"{formula_info['工作表']}!{formula_info['单元格']}"] = formula_to_json(formula_info)
+        headers = {
+            sheet_name: {
+                address: (entry['row_header'], entry['col_header'], entry['combined_header'], entry['actual_value'])
+                for address, entry in sheet_cache.items()
+            }
+            for sheet_name, sheet_cache in formula_extractor.header_cache.items()
+        }
+        return cls(
+            version, formula_extractor.workbook.sheetnames,
+            map(strip, formula_extractor.input_cells), map(strip, formula_extractor.output_cells),
+            headers, traces, formula_extractor.get_header_index()
+        )
+
+    def list_inputs(self, table=None):
+        """
+        列出输入单元格
+
+        Args:
+            table (str): 可选，只列出表格名称包含该文本的输入单元格
+
+        Returns:
+            list: 输入单元格信息
+        """
+        return self._filter_table(self.input_cells, table)
+
+    def list_outputs(self, table=None):
+        """
+        列出输出单元格
+
+        Args:
+            table (str): 可选，只列出表格名称包含该文本的输出单元格
+
+        Returns:
+            list: 输出单元格信息
+        """
+        return self._filter_table(self.output_cells, table)
+
+    @staticmethod
+    def _filter_table(items, table):
+        return [_thaw(item) for item in items if table is None or table in (item['表格名称'] or '')]
+
+    def search(self, query, limit=10, kind=None):
+        """
+        按标题名称查找输入/输出单元格
+
+        Args:
+            query (str): 查询文本，如'营业收入 2025'
+            limit (int): 最多返回的单元格数
+            kind (str): 可选，'输入'或'输出'
+
+        Returns:
+            list: 单元格信息和得分，按得分从高到低排列
+        """
+        return self.header_index.search(query, limit, kind)
+
+    def get_headers(self, name):
+        """
+        获取单元格的标题
+
+        Args:
+            name (str): 规范化的单元格名称
+
+        Returns:
+            tuple: (行标题, 列标题, 组合标题, 当前值)，不在标题缓存中（空白单元格）时返回None
+        """
+        sheet_name, _, address = name.rpartition('!')
+        sheet_headers = self.headers.get(sheet_name)
+        return sheet_headers.get(address) if sheet_headers is not None else None
+
+    def get_trace(self, name):
+        """
+        获取输出单元格的依赖分析结果
+
+        Args:
+            name (str): 规范化的单元格名称
+
+        Returns:
+            dict: 与--jsonl输出的一行相同（副本），不是输出单元格时返回None
+        """
+        trace = self.traces.get(name)
+        return _thaw(trace) if trace is not None else None
+
+    def explain(self, name, trace=None):
+        """
+        用标题解释一个公式单元格：它的含义、公式、依赖的输入单元格及其当前值
+
+        Args:
+            name (str): 规范化的单元格名称
+            trace (dict): 可选，不是输出单元格时另外追踪得到的依赖分析结果
+
+        Returns:
+            dict: 单元格名称、表格名称、标题、当前值、公式，以及依赖的输入单元格（含标题和当前值）
+                  和其他基础单元格；没有依赖分析结果时返回None
+        """
+        trace = trace or self.traces.get(name)
+        if trace is None:
+            return None
+        headers = self.get_headers(name) or (None, None, None, None)
+        inputs, others = [], []
+        for basic_cell in trace['基础单元格']:
+            item = self.inputs.get(basic_cell)
+            if item is not None:
+                inputs.append({
+                    '单元格': basic_cell, '表格名称': item['表格名称'],
+                    '标题组合': item['标题组合'], '当前值': item['当前值'],
+                })
+            else:
+                others.append(basic_cell)
+        output = self.outputs.get(name)
+        return {
+            '单元格': name,
+            '表格名称': output['表格名称'] if output else None,
+            '标题组合': headers[2],
+            '当前值': output['当前值'] if output else headers[3],
+            '原始公式': trace['原始公式'],
+            '合并公式': trace['合并公式'],
+            '变量公式': trace['变量公式'],
+            '输入单元格': inputs,
+            '其他基础单元格': others,
+        }
+
+    def summary(self):
+        """
+        Returns:
+            dict: 版本、创建时间和各部分的数量
+        """
+        return {
+            'version': self.version,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.created)),
+            'inputs': len(self.input_cells),
+            'outputs': len(self.output_cells),
+            'traced': len(self.traces),
+        }
@@ -79,6 +79,38 @@ def is_valid_cell_reference(cell_ref):
     except:
         return False
 
+def get_cell_value(worksheet, row, col):
+    """
+    读取单元格的值，不会像worksheet.cell()那样为空白位置创建单元格对象
+    
+    Args:
+        worksheet: openpyxl工作表对象
+        row (int): 行号
+        col (int): 列号
+        
+    Returns:
+        单元格的值，单元格不存在时返回None
+    """
+    cell = worksheet._cells.get((row, col))
+    return cell.value if cell is not None else None
+
+def iter_populated_cells(worksheet):
+    """
+    按行主序遍历工作表中实际存在（有值或有样式）的单元格
+    
+    与按max_row × max_column遍历不同，耗时和内存只与真实单元格数量有关，
+    也不会为空白位置创建单元格对象
+    
+    Args:
+        worksheet: openpyxl工作表对象
+        
+    Yields:
+        单元格对象，按行号、列号升序排列
+    """
+    cells = worksheet._cells
+    for key in sorted(cells):
+        yield cells[key]
+
 def is_yellow_cell(cell):
     """
     检查单元格是否有黄色背景
@@ -89,10 +121,22 @@ def is_yellow_cell(cell):
     Returns:
         bool: 是否是黄色背景
     """
-    if cell.fill.start_color.index:
+    return is_yellow_fill(cell.fill)
+
+def is_yellow_fill(fill):
+    """
+    检查填充样式是否为黄色背景，供没有单元格对象的流式扫描使用
+    
+    Args:
+        fill: openpyxl填充样式对象
+        
+    Returns:
+        bool: 是否是黄色背景
+    """
+    if fill.start_color.index:
         # 检查是否是黄色背景（可能需要根据实际使用的黄色色值调整）
         yellow_colors = ['FFFF00', 'FFFFE0', 'FFFFD7', 'FFFFF0', 'FFFFFF00','FFFFFFF0']  # 可能的黄色色值
-        return cell.fill.start_color.index in yellow_colors
+        return fill.start_color.index in yellow_colors
     return False
 
 
@@ -0,0 +1,161 @@
+"""标题名称的倒排索引，按字符n-gram匹配，不需要中文分词即可按名称查找单元格"""
+
+import re
+import math
+import numpy as np
+
+# 文字的n-gram长度：单字保证任意片段都能匹配，双字区分相近的名称；连续的数字（如年份）整体作为一项
+NGRAM_SIZES = (1, 2)
+# 各字段中匹配的权重，一个n-gram在同一单元格的多个字段中出现时取最大值
+FIELD_WEIGHTS = (
+    ('行标题', 1.0),
+    ('列标题', 1.0),
+    ('标题组合', 0.8),
+    ('表格名称', 0.6),
+)
+# 把连续的数字和连续的文字（汉字、字母）分开，标题中的'.'、'_'、空格等分隔符不跨越
+_TOKEN = re.compile(r'\d+|[^\W\d_]+')
+
+
+def iter_ngrams(text):
+    """
+    产出文本中的字符n-gram，英文字母统一为小写，连续的数字作为一项，如'项目_2025'中的'2025'
+
+    Args:
+        text: 标题文本，None时不产出
+
+    Yields:
+        str: n-gram，可能重复
+    """
+    if text is None:
+        return
+    for token in _TOKEN.findall(str(text).lower()):
+        if token.isdigit():
+            yield token
+            continue
+        for size in NGRAM_SIZES:
+            for start in range(len(token) - size + 1):
+                yield token[start:start + size]
+
+
+class HeaderIndex:
+    def __init__(self, cells):
+        """
+        按单元格的行标题、列标题、标题组合和表格名称构建倒排索引
+
+        倒排表按n-gram连续存放在数组中（offsets给出每个n-gram的起止位置），
+        权重已乘以逆文档频率，查询只需要对命中的倒排表做数组累加
+
+        Args:
+            cells (list): 单元格信息，包含工作表、单元格、类型、表格名称、行标题、列标题、标题组合、当前值
+        """
+        self.cells = tuple(cells)
+        postings = {}  # n-gram -> {单元格序号: 权重}
+        for doc, record in enumerate(self.cells):
+            for field, weight in FIELD_WEIGHTS:
+                for gram in set(iter_ngrams(record.get(field))):
+                    docs = postings.setdefault(gram, {})
+                    if weight > docs.get(doc, 0):
+                        docs[doc] = weight
+
+        count = len(self.cells)
+        self.grams = {}  # n-gram -> 序号
+        self.idf = np.zeros(len(postings))
+        offsets = np.zeros(len(postings) + 1, dtype=np.int64)
+        for index, (gram, docs) in enumerate(postings.items()):
+            self.grams[gram] = index
+            self.idf[index] = math.log(1 + count / len(docs))
+            offsets[index + 1] = offsets[index] + len(docs)
+        self.offsets = offsets
+        self.docs = np.fromiter(
+            (doc for docs in postings.values() for doc in docs), dtype=np.int32, count=int(offsets[-1])
+        )
+        self.weights = np.fromiter(
+            (weight * self.idf[index] for index, docs in enumerate(postings.values()) for weight in docs.values()),
+            dtype=np.float64, count=int(offsets[-1])
+        )
+        # 得分相同时标题较短（更具体）的单元格在前
+        self.lengths = np.array([len(record.get('标题组合') or '') for record in self.cells], dtype=np.int32)
+        self.kinds = np.array([record.get('类型') or '' for record in self.cells], dtype=str)
+        # 索引构建后只读，可以在多个线程中并发查询
+        for values in (self.idf, self.offsets, self.docs, self.weights, self.lengths, self.kinds):
+            values.setflags(write=False)
+
+    @classmethod
+    def from_cells(cls, input_cells, output_cells, header_cache=None):
+        """
+        由输入/输出单元格信息构建索引
+
+        Args:
+            input_cells (list): 输入单元格信息
+            output_cells (list): 输出单元格信息
+            header_cache (dict): 可选，标题缓存，用于补充行标题和列标题；
+                                 未提供时（如读取旧的缓存结果）只索引标题组合和表格名称
+
+        Returns:
+            HeaderIndex: 标题索引
+        """
+        header_cache = header_cache or {}
+        cells = []
+        for kind, items in (('输入', input_cells), ('输出', output_cells)):
+            for item in items:
+                headers = header_cache.get(item['工作表'], {}).get(item['单元格']) or {}
+                cells.append({
+                    '工作表': item['工作表'],
+                    '单元格': item['单元格'],
+                    '类型': kind,
+                    '表格名称': item['表格名称'],
+                    '行标题': headers.get('row_header'),
+                    '列标题': headers.get('col_header'),
+                    '标题组合': item['标题组合'],
+                    '当前值': item['当前值'],
+                })
+        return cls(cells)
+
+    def __len__(self):
+        return len(self.cells)
+
+    def search(self, query, limit=10, kind=None):
+        """
+        按名称查找单元格
+
+        得分为查询中各n-gram（按逆文档频率加权）在单元格标题中命中的比例，
+        索引中不存在的n-gram也计入分母，查询中的内容越多在标题中出现，得分越高
+
+        Args:
+            query (str): 查询文本，如'营业收入 2025'
+            limit (int): 最多返回的单元格数
+            kind (str): 可选，'输入'或'输出'，只返回该类型的单元格
+
+        Returns:
+            list: 单元格信息和得分（0到1之间），按得分从高到低排列
+        """
+        grams = set(iter_ngrams(query))
+        if not grams or not self.cells or limit <= 0:
+            return []
+        total = 0.0
+        unknown_idf = math.log(1 + len(self.cells))
+        docs, weights = [], []
+        for gram in grams:
+            index = self.grams.get(gram)
+            if index is None:
+                total += unknown_idf
+                continue
+            total += self.idf[index]
+            start, end = self.offsets[index], self.offsets[index + 1]
+            docs.append(self.docs[start:end])
+            weights.append(self.weights[start:end])
+        if not docs:
+            return []
+        # 命中的倒排表拼接后一次累加
+        scores = np.bincount(np.concatenate(docs), np.concatenate(weights), minlength=len(self.cells))
+        if kind is not None:
+            scores[self.kinds != kind] = 0
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > limit:
+            # 保留得分不低于第limit高得分的全部单元格，与第limit名同分的单元格再按标题长度取舍
+            threshold = np.partition(scores[candidates], len(candidates) - limit)[len(candidates) - limit]
+            candidates = candidates[scores[candidates] >= threshold]
+        candidates = candidates[np.lexsort((self.lengths[candidates], -scores[candidates]))][:limit]
+        return [dict(self.cells[doc], 得分=round(float(scores[doc] / total), 4)) for doc in candidates]
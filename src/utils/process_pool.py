@@ -0,0 +1,93 @@
+"""基于fork的进程池工具，子进程直接共享主进程中已构建的只读数据"""
+
+import gc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from itertools import islice
+
+_forked_owner = None  # 创建进程池前设置，fork出的子进程通过它访问主进程中的对象
+
+
+def get_fork_context():
+    """获取fork方式的多进程上下文，平台不支持fork时返回None"""
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        return None
+    return multiprocessing.get_context('fork')
+
+
+def _call_forked_owner(method_name, argument):
+    return getattr(_forked_owner, method_name)(argument)
+
+
+def split_into_chunks(count, workers):
+    """
+    把0到count-1按顺序切分为连续的批次，批次数约为进程数的4倍，使各进程的负载较为均衡
+    
+    Args:
+        count (int): 任务数量
+        workers (int): 进程数
+        
+    Returns:
+        list: range列表
+    """
+    chunk_size = -(-count // (workers * 4))
+    return [range(start, min(start + chunk_size, count)) for start in range(0, count, chunk_size)]
+
+
+def run_in_forked_pool(owner, method_name, arguments, workers):
+    """
+    在fork出的进程池中对每个参数调用owner的方法，结果按arguments的顺序返回
+    
+    Args:
+        owner: 提供方法的对象
+        method_name (str): 方法名
+        arguments: 可迭代的参数，每个参数调用一次方法
+        workers (int): 进程数
+        
+    Returns:
+        list: 各次调用的返回值
+    """
+    return list(iter_in_forked_pool(owner, method_name, arguments, workers))
+
+
+def iter_in_forked_pool(owner, method_name, arguments, workers, prefetch=2):
+    """
+    在fork出的进程池中对每个参数调用owner的方法，按arguments的顺序逐个产出结果
+    
+    子进程创建时复制主进程的内存，owner及其引用的工作簿、依赖图等只读数据无需pickle，
+    只有参数和返回值在进程间传递。同时最多提交workers * prefetch个任务，
+    调用方处理结果较慢时，已完成但未取走的结果不会随任务数增长
+    
+    Args:
+        owner: 提供方法的对象
+        method_name (str): 方法名
+        arguments: 可迭代的参数，每个参数调用一次方法
+        workers (int): 进程数
+        prefetch (int): 每个进程预先提交的任务数
+        
+    Yields:
+        各次调用的返回值
+    """
+    global _forked_owner
+    _forked_owner = owner
+    # 已有对象移出垃圾回收的追踪范围，避免子进程的垃圾回收遍历继承的对象，
+    # 使本可共享的内存页被逐页复制
+    gc.freeze()
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_fork_context())
+    try:
+        arguments = iter(arguments)
+        futures = deque(
+            executor.submit(_call_forked_owner, method_name, argument)
+            for argument in islice(arguments, workers * prefetch)
+        )
+        while futures:
+            result = futures.popleft().result()
+            for argument in islice(arguments, 1):
+                futures.append(executor.submit(_call_forked_owner, method_name, argument))
+            yield result
+    finally:
+        # 调用方提前停止迭代时取消尚未开始的任务
+        executor.shutdown(cancel_futures=True)
+        gc.unfreeze()
+        _forked_owner = None
@@ -0,0 +1,147 @@
+"""工作表索引结构，用于加速合并单元格等按位置的查询"""
+
+from bisect import bisect_right
+
+
+class MergedCellIndex:
+    def __init__(self, merged_ranges=()):
+        """
+        按列构建合并单元格的行区间索引，打开工作表时构建一次
+
+        Args:
+            merged_ranges: 合并区域集合，元素可以是openpyxl的CellRange，
+                           也可以是(min_row, min_col, max_row, max_col)元组
+        """
+        columns = {}
+        count = 0
+        for merged_range in merged_ranges:
+            if isinstance(merged_range, tuple):
+                min_row, min_col, max_row, max_col = merged_range
+            else:
+                min_row, min_col = merged_range.min_row, merged_range.min_col
+                max_row, max_col = merged_range.max_row, merged_range.max_col
+            count += 1
+            for col in range(min_col, max_col + 1):
+                columns.setdefault(col, []).append((min_row, max_row, min_row, min_col))
+
+        # 每列的区间按起始行排序，合并区域互不重叠，因此可以二分查找
+        self._intervals = {}
+        self._starts = {}
+        for col, intervals in columns.items():
+            intervals.sort()
+            self._intervals[col] = intervals
+            self._starts[col] = [interval[0] for interval in intervals]
+        self._count = count
+
+    @classmethod
+    def from_worksheet(cls, worksheet):
+        """
+        从openpyxl工作表构建索引
+
+        Args:
+            worksheet: openpyxl工作表对象
+
+        Returns:
+            MergedCellIndex: 合并单元格索引
+        """
+        return cls(worksheet.merged_cells.ranges)
+
+    def __len__(self):
+        return self._count
+
+    def find(self, row, col):
+        """
+        查找单元格所在的合并区域
+
+        Args:
+            row (int): 行号
+            col (int): 列号
+
+        Returns:
+            tuple: 合并区域左上角单元格的(行号, 列号)，不在合并区域内则返回None
+        """
+        starts = self._starts.get(col)
+        if not starts:
+            return None
+        pos = bisect_right(starts, row) - 1
+        if pos < 0:
+            return None
+        min_row, max_row, anchor_row, anchor_col = self._intervals[col][pos]
+        if row <= max_row:
+            return anchor_row, anchor_col
+        return None
+
+    def is_merged(self, row, col):
+        """判断单元格是否位于合并区域内"""
+        return self.find(row, col) is not None
+
+    def nearest_above(self, row, col):
+        """
+        在同一列中向上查找最近的合并单元格（不含当前行）
+
+        Args:
+            row (int): 当前行号
+            col (int): 列号
+
+        Returns:
+            tuple: (最近的合并行号, 左上角行号, 左上角列号)，未找到则返回None
+        """
+        starts = self._starts.get(col)
+        if not starts or row <= 1:
+            return None
+        pos = bisect_right(starts, row - 1) - 1
+        if pos < 0:
+            return None
+        min_row, max_row, anchor_row, anchor_col = self._intervals[col][pos]
+        return min(max_row, row - 1), anchor_row, anchor_col
+
+
+class SheetOccupancy:
+    def __init__(self, coordinates=(), track_rows=True):
+        """
+        统计每行、每列中非空单元格的数量，用于O(1)判断行列是否为空
+
+        Args:
+            coordinates: 可迭代的非空单元格(行号, 列号)
+            track_rows: 是否统计行，流式处理超大工作表时可关闭以保持内存与行数无关
+        """
+        self.track_rows = track_rows
+        self.row_counts = {}
+        self.column_counts = {}
+        for row, col in coordinates:
+            if track_rows:
+                self.row_counts[row] = self.row_counts.get(row, 0) + 1
+            self.column_counts[col] = self.column_counts.get(col, 0) + 1
+
+    @classmethod
+    def from_worksheet(cls, worksheet):
+        """
+        从openpyxl工作表已加载的单元格构建占用统计，不会创建新的单元格
+
+        值为空、空字符串或0的单元格视为空，与`if cell.value`的判断一致
+
+        Args:
+            worksheet: openpyxl工作表对象
+
+        Returns:
+            SheetOccupancy: 行列占用统计
+        """
+        return cls(coordinate for coordinate, cell in worksheet._cells.items() if cell.value)
+
+    def is_row_empty(self, row):
+        """判断某一行是否没有非空单元格"""
+        if not self.track_rows:
+            raise ValueError('未统计行占用，无法判断行是否为空')
+        return row not in self.row_counts
+
+    def is_column_empty(self, col):
+        """判断某一列是否没有非空单元格"""
+        return col not in self.column_counts
+
+    def row_count(self, row):
+        """返回某一行中非空单元格的数量"""
+        return self.row_counts.get(row, 0)
+
+    def column_count(self, col):
+        """返回某一列中非空单元格的数量"""
+        return self.column_counts.get(col, 0)
@@ -0,0 +1,44 @@
+"""分析结果快照构建后不能被修改，查询返回的是副本"""
+
+import pytest
+
+from src.server.analysis_snapshot import AnalysisSnapshot
+
+
+@pytest.fixture
+def snapshot():
+    input_item = {'工作表': '参数', '单元格': 'B2', '表格名称': '假设', '标题组合': '单价', '当前值': 10}
+    output_item = {'工作表': '测算结果输出', '单元格': 'B2', '表格名称': None, '标题组合': '收入', '当前值': 50}
+    trace = {
+        '工作表': '测算结果输出', '单元格': 'B2', '原始公式': '=参数!B2*5', '合并公式': '(参数!B2*5)',
+        '变量公式': '= ( 单价 * 5 )', '基础单元格': ['参数!B2'], '依赖树': [{'单元格': '测算结果输出!B2'}],
+    }
+    headers = {'参数': {'B2': ('单价', None, '单价', 10)}}
+    return AnalysisSnapshot('v1', ['参数', '测算结果输出'], [input_item], [output_item], headers,
+                            {'测算结果输出!B2': trace}, None)
+
+
+def test_internal_state_is_read_only(snapshot):
+    with pytest.raises(AttributeError):
+        snapshot.traces = {}
+    with pytest.raises(TypeError):
+        snapshot.traces['测算结果输出!B3'] = {}
+    with pytest.raises(TypeError):
+        snapshot.inputs['参数!B2']['当前值'] = 0
+    with pytest.raises(TypeError):
+        snapshot.headers['参数']['C2'] = ()
+    with pytest.raises(TypeError):
+        snapshot.output_cells[0]['当前值'] = 0
+
+
+def test_queries_return_copies(snapshot):
+    trace = snapshot.get_trace('测算结果输出!B2')
+    trace['基础单元格'].append('参数!B9')
+    trace['依赖树'][0]['单元格'] = None
+    assert snapshot.get_trace('测算结果输出!B2')['基础单元格'] == ['参数!B2']
+    assert snapshot.get_trace('测算结果输出!B2')['依赖树'] == [{'单元格': '测算结果输出!B2'}]
+
+    inputs = snapshot.list_inputs()
+    inputs[0]['当前值'] = 0
+    assert snapshot.list_inputs('假设')[0]['当前值'] == 10
+    assert snapshot.explain('测算结果输出!B2')['输入单元格'][0]['当前值'] == 10
@@ -0,0 +1,72 @@
+"""批量情景计算与重算引擎逐个情景计算的结果一致，包括被IF排除的分支出错的公式"""
+
+import contextlib
+import io
+import math
+
+import pytest
+from openpyxl import Workbook
+from openpyxl.styles import PatternFill
+
+from src.analyzers.batch_engine import BatchEngine
+from src.analyzers.excel_functions import ExcelError
+from src.extractors.formula_extractor import FormulaExtractor
+from src.loaders.workbook_loader import load_workbook_with_values
+
+# 参数!B2随情景变化，参数!B3固定为0；不被选取的分支在标量计算时会出错
+GUARDED_FORMULAS = [
+    '=IF(参数!B2>2,1,1/参数!B3)',
+    '=IF(参数!B2<=2,1/参数!B3,参数!B2*2)',
+    '=IF(参数!B2>2,LN(参数!B3),参数!B2)',
+    '=IF(参数!B2>0,100/参数!B2,0)',
+    '=IF(参数!B2>2,IF(参数!B2>4,参数!B2,1/参数!B3),-1)',
+    '=IFERROR(IF(参数!B2>2,1,1/参数!B3),-2)',
+]
+SCENARIOS = [0, 1, 3, 5]
+
+
+@pytest.fixture
+def engine(tmp_path):
+    yellow = PatternFill('solid', fgColor='FFFFFF00')
+    wb = Workbook()
+    params = wb.active
+    params.title = '参数'
+    params['A1'], params['B1'] = '项目', '数值'
+    for row, (name, value) in enumerate([('系数', 1), ('基数', 0)], start=2):
+        params.cell(row, 1, name)
+        params.cell(row, 2, value).fill = yellow
+    output = wb.create_sheet('测算结果输出')
+    output['A1'], output['B1'] = '指标', '数值'
+    for row, formula in enumerate(GUARDED_FORMULAS, start=2):
+        output.cell(row, 1, f'指标{row}')
+        output.cell(row, 2, formula)
+    path = tmp_path / 'guarded_if.xlsx'
+    wb.save(path)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        loaded = load_workbook_with_values(path)
+        extractor = FormulaExtractor(loaded.workbook, str(path), loaded.cached_values)
+        return extractor.get_recalc_engine()
+
+
+def same_value(expected, actual):
+    """批量结果中数值数组的错误为NaN，object数组保留错误值"""
+    if isinstance(expected, ExcelError):
+        return actual == expected or (isinstance(actual, float) and math.isnan(actual))
+    return isinstance(actual, (int, float)) and math.isclose(expected, actual)
+
+
+def test_batch_matches_what_if_on_guarded_if(engine):
+    assert len(engine.outputs) == len(GUARDED_FORMULAS)
+    results = BatchEngine(engine).evaluate({'参数!B2': SCENARIOS})
+    for index, value in enumerate(SCENARIOS):
+        expected = engine.what_if({'参数!B2': value})
+        for name, column in results.items():
+            assert same_value(expected[name], column[index]), (name, value, expected[name], column[index])
+
+
+def test_untaken_error_branch_does_not_spread(engine):
+    results = BatchEngine(engine).evaluate({'参数!B2': [1, 3, 5]})
+    column = results['测算结果输出!B2']
+    assert same_value(engine.what_if({'参数!B2': 1})['测算结果输出!B2'], column[0])
+    assert list(column[1:]) == [1, 1]
@@ -0,0 +1,54 @@
+"""按工作表并行计算的标题缓存与串行结果一致"""
+
+import contextlib
+import io
+
+import pytest
+from openpyxl import Workbook
+from openpyxl.styles import PatternFill
+
+from src.extractors.formula_extractor import FormulaExtractor
+from src.loaders.workbook_loader import load_workbook_with_values
+
+
+@pytest.fixture
+def multi_sheet_workbook(tmp_path):
+    """三个带合并表格名称、行列标题、数字序号和公式的工作表，以及输出表"""
+    yellow = PatternFill('solid', fgColor='FFFFFF00')
+    wb = Workbook()
+    wb.remove(wb.active)
+    for s in range(3):
+        ws = wb.create_sheet(f'表{s + 1}')
+        ws['A1'] = f'表格{s + 1}'
+        ws.merge_cells('A1:D1')
+        ws['B2'], ws['C2'], ws['D2'] = '2024年', '2025年', '万元'
+        for row in range(3, 12 + 4 * s):
+            ws.cell(row, 1, f'项目{row}')
+            ws.cell(row, 2, row * 10).fill = yellow
+            ws.cell(row, 3, f'=B{row}*1.1')
+        ws['F3'], ws['F4'], ws['F5'] = 1, 2, '=F3+F4'
+    output = wb.create_sheet('测算结果输出')
+    output['A1'], output['B1'] = '指标', '数值'
+    output['A2'], output['B2'] = '合计', '=表1!C3+表2!C4+表3!C5'
+    path = tmp_path / 'multi_sheet.xlsx'
+    wb.save(path)
+    return path
+
+
+def extract(path, workers):
+    with contextlib.redirect_stdout(io.StringIO()):
+        loaded = load_workbook_with_values(path)
+        extractor = FormulaExtractor(loaded.workbook, str(path), loaded.cached_values, workers=workers)
+    strip = lambda items: [{k: v for k, v in item.items() if k != 'cell'} for item in items]
+    return (
+        [(sheet, list(cache.items())) for sheet, cache in extractor.header_cache.items()],
+        strip(extractor.input_cells),
+        strip(extractor.output_cells),
+    )
+
+
+@pytest.mark.parametrize('workers', [2, 3])
+def test_parallel_header_cache_matches_serial(multi_sheet_workbook, workers):
+    serial = extract(multi_sheet_workbook, 1)
+    assert sum(len(cache) for _, cache in serial[0]) > 0
+    assert extract(multi_sheet_workbook, workers) == serial
@@ -0,0 +1,58 @@
+"""远处有带格式空白单元格的工作表：扫描的耗时和单元格数只与实际存在的单元格有关"""
+
+import time
+
+import pytest
+from openpyxl import Workbook
+from openpyxl.styles import Font, PatternFill
+
+from src.extractors.formula_extractor import FormulaExtractor
+from src.loaders.workbook_loader import load_workbook_with_values
+
+# 只设置了格式、没有值的单元格；按max_row × max_column遍历时要访问数十亿个位置
+FAR_CELLS = ('Z500', 'XFD1048576')
+
+
+@pytest.fixture
+def far_formatted_workbook(tmp_path):
+    """参数表和测算结果输出表各有几个单元格，另在远处有只设置了格式的单元格"""
+    yellow = PatternFill('solid', fgColor='FFFFFF00')
+    wb = Workbook()
+    params = wb.active
+    params.title = '参数'
+    params['A1'], params['B1'] = '项目', '数值'
+    for row, (name, value) in enumerate([('单价', 10), ('数量', 5)], start=2):
+        params.cell(row, 1, name)
+        params.cell(row, 2, value).fill = yellow
+    output = wb.create_sheet('测算结果输出')
+    output['A1'], output['B1'] = '指标', '2025'
+    output['A2'], output['B2'] = '收入', '=参数!B2*参数!B3'
+    for ws in (params, output):
+        for address in FAR_CELLS:
+            ws[address].font = Font(bold=True)
+    path = tmp_path / 'far_formatted.xlsx'
+    wb.save(path)
+    return path
+
+
+def test_scan_is_bounded_by_populated_cells(far_formatted_workbook):
+    loaded = load_workbook_with_values(far_formatted_workbook)
+    sheets = {ws.title: ws for ws in loaded.workbook.worksheets}
+    populated = {title: len(ws._cells) for title, ws in sheets.items()}
+
+    start = time.perf_counter()
+    extractor = FormulaExtractor(loaded.workbook, str(far_formatted_workbook), loaded.cached_values)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 5
+    # 扫描不为空白位置创建单元格对象，标题缓存也只包含实际存在的单元格
+    for title, ws in sheets.items():
+        assert len(ws._cells) == populated[title]
+        assert len(extractor.header_cache[title]) <= populated[title]
+    assert [item['单元格'] for item in extractor.input_cells] == ['B2', 'B3']
+    assert [item['单元格'] for item in extractor.output_cells] == ['B2']
+
+    # 范围内的空白单元格按需计算标题，同样不创建单元格对象
+    row_header, col_header, _, _ = extractor._get_cached_headers('参数', 'C3')
+    assert row_header == '数量'
+    assert len(sheets['参数']._cells) == populated['参数']